@@ -1,5 +1,6 @@
 # app.py
 import logging
+import time
 from flask import Flask, redirect, url_for, render_template, request
 from routes.tc import tc_bp
 from routes.logs import logs_bp
@@ -12,6 +13,7 @@ import atexit
 from services.db import ensure_schema
 from services.session_repository import close_all_active_sessions_on_boot
 from services.auth_repository import list_user_tc_ids, user_can_control_tc
+from services.model_warmup import model_warmup, warmup_enabled
 
 def create_app():
     # ---- LOGGING ----
@@ -20,6 +22,7 @@ def create_app():
         format="%(asctime)s %(levelname)s [%(name)s] %(message)s"
     )
     log = logging.getLogger("app")
+    started = time.perf_counter()
 
     app = Flask(__name__)
     # Em produção, use variável de ambiente segura:
@@ -37,6 +40,13 @@ def create_app():
     except Exception as e:
         log.warning(f"Falha ao finalizar sessões remanescentes no boot: {e}")
 
+    # Opcional: carrega e aquece os modelos das TCs em segundo plano (START sem partida a frio)
+    if warmup_enabled():
+        try:
+            model_warmup.start(list_tcs())
+        except Exception as e:
+            log.warning(f"Falha ao iniciar o aquecimento dos modelos: {e}")
+
     # Blueprints
     app.register_blueprint(auth_bp)        # /login, /logout
     app.register_blueprint(tc_bp)          # /tc/<id>, start/stop/SSE etc.
@@ -88,6 +98,8 @@ def create_app():
     def acompanhamento():
         return redirect(url_for("index"))
 
+    # PyTorch/OpenCV/NumPy ficam fora do boot: entram quando uma TC inicia (scripts/import_report.py)
+    log.info("App pronto em %.0f ms", (time.perf_counter() - started) * 1000.0)
     return app
 
 
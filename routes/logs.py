@@ -11,11 +11,6 @@ from services.auth_repository import user_can_view_tc
 from services.db import query_all, query_one
 from services.tc_repository import list_tcs
 
-# Excel
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-
 
 logs_bp = Blueprint("logs", __name__, url_prefix="")
 
@@ -386,6 +381,11 @@ def log_export_xlsx(session_id: int):
 
     total_final = sess.get("total_final", 0) or (rows[-1]["total_atual"] if rows else 0)
 
+    # Excel: openpyxl so e importado na primeira exportacao (fora do boot do app)
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+
     wb = Workbook()
     ws = wb.active
     sheet_title = _safe_sheet_title(sess.get("ct_name") or f"TC {sess['ct_id']}")
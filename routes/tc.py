@@ -1,11 +1,14 @@
 import time
 import json
-import cv2
-from flask import Blueprint, render_template, Response, request, redirect, url_for, flash
+from flask import Blueprint, render_template, Response, request, redirect, url_for, flash, jsonify
 from services.capture_point import CapturePoint
 from services.tc_repository import get_tc, list_tcs
 from services.session_repository import get_active_session_by_ct
 from services.runtime import tc_runtime
+from services.inference_engine import get_inference_engine
+from services.cpu_budget import get_cpu_budget
+from services.model_warmup import model_warmup
+from services.source_pool import source_pool
 from routes.auth import current_user, login_required
 from services.auth_repository import user_can_view_tc, user_can_control_tc
 from services.session_repository import get_active_session_by_ct
@@ -38,6 +41,20 @@ def _ensure_cp(tc_row):
         "match_dist": float(tc_row.get("match_dist", 150) or 150),
         "min_conf": float(tc_row.get("min_conf", 0.8) or 0.8),
         "missed_frame_dir": (tc_row.get("missed_frame_dir") or "").strip(),
+        "infer_mode": tc_row.get("infer_mode") or "quadro",
+        "infer_margin": tc_row.get("infer_margin", 32),
+        "infer_size": tc_row.get("infer_size", 640),
+        "motion_threshold": float(tc_row.get("motion_threshold") or 0),
+        "motion_pixel_delta": tc_row.get("motion_pixel_delta", 25),
+        "idle_fps": float(tc_row.get("idle_fps") or 0),
+        "max_fps": float(tc_row.get("max_fps") or 0),
+        "tracker_mode": tc_row.get("tracker_mode") or "centroide",
+        "model_precision": tc_row.get("model_precision") or "fp32",
+        "record_detections": bool(tc_row.get("record_detections")),
+        "frame_policy": tc_row.get("frame_policy") or "ultimo",
+        "frame_policy_param": float(tc_row.get("frame_policy_param") or 0),
+        "decode_backend": tc_row.get("decode_backend") or "opencv",
+        "decode_process": bool(tc_row.get("decode_process")),
     }
     cp = CapturePoint(tc_row, cfg)
     tc_runtime[tc_id] = cp
@@ -266,42 +283,89 @@ def tc_video(tc_id):
         return "Nenhuma sessão ativa para esta TC.", 404
 
     def gen():
+        import cv2      # OpenCV so quando alguem assiste o video (boot rapido do painel)
         frame = None
-        raw = None
-        while True:
-            # Encerra imediatamente o streaming quando a sessão parar
-            if not cp.session_active:
-                break
-            try:
-                frame = cp.last_vis_frame
-                if frame is None and cp.camera is not None:
-                    ret, raw = cp.camera.get_frame()
-                    if not ret or raw is None:
+        reader = None       # consumidor do anel de frames da camera
+        last_vis = None
+        try:
+            while True:
+                # Encerra imediatamente o streaming quando a sessão parar
+                if not cp.session_active:
+                    break
+                try:
+                    camera = cp.camera
+                    if camera is None:
                         time.sleep(0.02)
                         continue
-                    frame = raw
-
-                if frame is None:
-                    time.sleep(0.02)
-                    continue
-
-                text = f"TOTAL: {int(cp.current_session_count)}"
-                cv2.putText(frame, text, (15, 45), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
-
-                ok, buffer = cv2.imencode('.jpg', frame)
-                if ok:
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
-                time.sleep(0.01)
-            except Exception as e:
-                if frame is not None:
-                    cv2.putText(frame, f"ERRO: {e}", (15, 120),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+                    if reader is None or reader.source is not camera:
+                        if reader is not None:
+                            reader.close()
+                        reader = camera.reader()
+                    # Espera o próximo frame da câmera em vez de reenviar o mesmo
+                    ret, raw, _seq, _ts = reader.next(timeout=0.5)
+                    if not ret:
+                        continue
+
+                    vis = cp.last_vis_frame
+                    if vis is not None:
+                        if vis is last_vis:
+                            # O detector ainda não anotou um frame novo
+                            continue
+                        frame = last_vis = vis
+                    else:
+                        # View somente leitura do anel: o texto é desenhado em uma cópia
+                        frame = raw.copy()
+
+                    text = f"TOTAL: {int(cp.current_session_count)}"
+                    cv2.putText(frame, text, (15, 45), cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
+
                     ok, buffer = cv2.imencode('.jpg', frame)
                     if ok:
                         yield (b'--frame\r\n'
                                b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
-                time.sleep(0.1)
+                except Exception as e:
+                    if frame is not None:
+                        cv2.putText(frame, f"ERRO: {e}", (15, 120),
+                                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+                        ok, buffer = cv2.imencode('.jpg', frame)
+                        if ok:
+                            yield (b'--frame\r\n'
+                                   b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+                    time.sleep(0.1)
+        finally:
+            if reader is not None:
+                reader.close()
+
+    def subscribed():
+        # Inscreve o espectador: o detector so desenha enquanto houver alguem assistindo
+        cp.add_viewer()
+        try:
+            yield from gen()
+        finally:
+            cp.remove_viewer()
 
     # Stream MJPEG com boundary 'frame'
-    return Response(gen(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    return Response(subscribed(), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+@tc_bp.route("/tc/<int:tc_id>/metrics")
+@login_required
+def tc_metrics(tc_id):
+    # Métricas de desempenho (JSON) para ajuste fino; somente admin
+    u = current_user()
+    if u["role"] != "admin":
+        return "forbidden", 403
+
+    # Imports tardios: registro de modelos (NumPy) e escritor de snapshots (OpenCV)
+    from services.model_registry import model_registry
+    from services.snapshot_writer import get_snapshot_writer
+    cp = tc_runtime.get(tc_id)
+    engine = get_inference_engine()
+    return jsonify({
+        "tc": cp.get_metrics() if cp else None,
+        "inference_engine": engine.stats() if engine else None,
+        "models": model_registry.stats(),
+        "sources": source_pool.stats(),
+        "warmup": model_warmup.status(tc_id),
+        "snapshot_writer": get_snapshot_writer().stats(),
+        "cpu_budget": get_cpu_budget().stats(),
+    })
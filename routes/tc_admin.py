@@ -1,6 +1,11 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
-from services.tc_repository import list_tcs, get_tc, create_tc, update_tc, delete_tc
+from services.tc_repository import (
+    list_tcs, get_tc, create_tc, update_tc, delete_tc, normalize_infer_settings, normalize_motion_settings,
+    normalize_rate_settings, normalize_tracker_mode, normalize_model_precision, normalize_frame_policy,
+    normalize_decode_backend,
+)
 from services.runtime import drop_tc_runtime
+from services.model_warmup import model_warmup, warmup_enabled
 from routes.auth import role_required
 
 tc_admin_bp = Blueprint("tc_admin", __name__)
@@ -31,22 +36,11 @@ def tc_admin_list():
     tcs = list_tcs()
     return render_template("tc_admin_list.html", tcs=tcs)
 
-@tc_admin_bp.route("/tc-admin/<int:tc_id>/edit", methods=["GET", "POST"])
-def tc_admin_edit(tc_id):
-    tc = get_tc(tc_id)
-    if request.method == "GET":
-        return render_template("tc_admin_edit.html", ct=tc)
-    name = request.form.get("name","").strip()
-    source_path = request.form.get("source_path","").strip()
-    roi = request.form.get("roi","").strip()
-    model_path = request.form.get("model_path","").strip()
-    line_offset_red = _parse_int(request.form.get("line_offset_red"), 40)
-    line_offset_blue = _parse_int(request.form.get("line_offset_blue"), -40)
-    flow_mode = _normalize_flow(request.form.get("flow_mode"))
+def _read_tc_form() -> dict:
+    """Le e normaliza os campos do formulario de TC (usado em criar/editar)."""
     max_lost = _parse_int(request.form.get("max_lost"), 2)
     match_dist = _parse_float(request.form.get("match_dist"), 150)
     min_conf = _parse_float(request.form.get("min_conf"), 0.8)
-    missed_frame_dir = (request.form.get("missed_frame_dir") or "").strip()
     if max_lost < 0:
         max_lost = 0
     if match_dist <= 0:
@@ -56,10 +50,80 @@ def tc_admin_edit(tc_id):
         min_conf = 0.0
     if min_conf > 1:
         min_conf = 1.0
-    update_tc(tc_id, name, source_path, roi, model_path,
-              line_offset_red, line_offset_blue, flow_mode,
-              max_lost, match_dist, min_conf, missed_frame_dir)
+    infer_mode, infer_margin, infer_size = normalize_infer_settings(
+        request.form.get("infer_mode"),
+        _parse_int(request.form.get("infer_margin"), 32),
+        _parse_int(request.form.get("infer_size"), 640),
+    )
+    motion_threshold, motion_pixel_delta = normalize_motion_settings(
+        _parse_float(request.form.get("motion_threshold"), 0.0),
+        _parse_int(request.form.get("motion_pixel_delta"), 25),
+    )
+    idle_fps, max_fps = normalize_rate_settings(
+        _parse_float(request.form.get("idle_fps"), 0.0),
+        _parse_float(request.form.get("max_fps"), 0.0),
+    )
+    frame_policy, frame_policy_param = normalize_frame_policy(
+        request.form.get("frame_policy"),
+        _parse_float(request.form.get("frame_policy_param"), 0.0),
+    )
+    return {
+        "name": request.form.get("name","").strip(),
+        "source_path": request.form.get("source_path","").strip(),
+        "roi": request.form.get("roi","").strip(),
+        "model_path": request.form.get("model_path","").strip(),
+        "line_offset_red": _parse_int(request.form.get("line_offset_red"), 40),
+        "line_offset_blue": _parse_int(request.form.get("line_offset_blue"), -40),
+        "flow_mode": _normalize_flow(request.form.get("flow_mode")),
+        "max_lost": max_lost,
+        "match_dist": match_dist,
+        "min_conf": min_conf,
+        "missed_frame_dir": (request.form.get("missed_frame_dir") or "").strip(),
+        "infer_mode": infer_mode,
+        "infer_margin": infer_margin,
+        "infer_size": infer_size,
+        "motion_threshold": motion_threshold,
+        "motion_pixel_delta": motion_pixel_delta,
+        "idle_fps": idle_fps,
+        "max_fps": max_fps,
+        "tracker_mode": normalize_tracker_mode(request.form.get("tracker_mode")),
+        "model_precision": normalize_model_precision(request.form.get("model_precision")),
+        "record_detections": bool(request.form.get("record_detections")),
+        "frame_policy": frame_policy,
+        "frame_policy_param": frame_policy_param,
+        "decode_backend": normalize_decode_backend(request.form.get("decode_backend")),
+        "decode_process": bool(request.form.get("decode_process")),
+    }
+
+def _check_int8(form: dict, tc_id: int | None):
+    """So deixa a TC trocar para int8 com validacao aprovada (scripts/quantize_int8.py)."""
+    if form["model_precision"] != "int8":
+        return
+    # Imports tardios: registro de modelos e quantizacao trazem NumPy
+    from services.model_registry import resolve_model_path
+    from services.quantization import approved_int8_model
+    reason = "valide a TC depois de criada"
+    if tc_id is not None:
+        resolved, exists, _for_load = resolve_model_path(form["model_path"] or "sacaria_yolov5n.pt")
+        int8_path, reason = approved_int8_model(resolved, tc_id) if exists else (None, "modelo fp32 nao encontrado")
+        if int8_path:
+            return
+    form["model_precision"] = "fp32"
+    flash(f"Modelo int8 nao liberado ({reason}); a TC continua em fp32. "
+          f"Execute scripts/quantize_int8.py --tc {tc_id or '<id>'} com um video da TC.", "error")
+
+@tc_admin_bp.route("/tc-admin/<int:tc_id>/edit", methods=["GET", "POST"])
+def tc_admin_edit(tc_id):
+    tc = get_tc(tc_id)
+    if request.method == "GET":
+        return render_template("tc_admin_edit.html", ct=tc)
+    form = _read_tc_form()
+    _check_int8(form, tc_id)
+    update_tc(tc_id, **form)
     drop_tc_runtime(tc_id)
+    model_warmup.forget(tc_id)
+    if warmup_enabled():
+        model_warmup.start([get_tc(tc_id)])
     flash("TC atualizada.", "success")
     return redirect(url_for("tc_admin.tc_admin_list"))
 
@@ -67,34 +131,15 @@ def tc_admin_edit(tc_id):
 def tc_admin_new():
     if request.method == "GET":
         return render_template("tc_admin_edit.html", ct=None)
-    name = request.form.get("name","").strip()
-    source_path = request.form.get("source_path","").strip()
-    roi = request.form.get("roi","").strip()
-    model_path = request.form.get("model_path","").strip()
-    line_offset_red = _parse_int(request.form.get("line_offset_red"), 40)
-    line_offset_blue = _parse_int(request.form.get("line_offset_blue"), -40)
-    flow_mode = _normalize_flow(request.form.get("flow_mode"))
-    max_lost = _parse_int(request.form.get("max_lost"), 2)
-    match_dist = _parse_float(request.form.get("match_dist"), 150)
-    min_conf = _parse_float(request.form.get("min_conf"), 0.8)
-    missed_frame_dir = (request.form.get("missed_frame_dir") or "").strip()
-    if max_lost < 0:
-        max_lost = 0
-    if match_dist <= 0:
-        match_dist = 1.0
-    match_dist = int(round(match_dist))
-    if min_conf < 0:
-        min_conf = 0.0
-    if min_conf > 1:
-        min_conf = 1.0
-    create_tc(name, source_path, roi, model_path,
-              line_offset_red, line_offset_blue, flow_mode,
-              max_lost, match_dist, min_conf, missed_frame_dir)
+    form = _read_tc_form()
+    _check_int8(form, None)
+    create_tc(**form)
     flash("TC criada.", "success")
     return redirect(url_for("tc_admin.tc_admin_list"))
 
 @tc_admin_bp.route("/tc-admin/<int:tc_id>/delete", methods=["POST"])
 def tc_admin_delete(tc_id):
     delete_tc(tc_id)
+    model_warmup.forget(tc_id)
     flash("TC removida.", "info")
     return redirect(url_for("tc_admin.tc_admin_list"))
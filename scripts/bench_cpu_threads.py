@@ -0,0 +1,106 @@
+"""
+Vazao de inferencia com 1..N cameras simultaneas em cada politica de CPU.
+
+Cada "camera" e uma thread que roda o modelo sem parar sobre o mesmo frame
+(como uma TC com INFERENCE_BATCH_ENABLED=0). Para cada politica de
+services/cpu_budget.py (global, split, pin) e cada quantidade de cameras,
+mede o fps total, o fps por camera e a latencia p50/p95 de cada inferencia.
+
+Uso:
+    python scripts/bench_cpu_threads.py sacaria_yolov5n.pt [--cameras 4] [--seconds 10]
+        [--size 640] [--image frame.jpg] [--policies global split pin] [--cores 0-7]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from services.cpu_budget import CpuBudget, THREAD_POLICIES, parse_cores
+
+
+def camera(key, model, frame, size, budget, deadline, latencies):
+    budget.register(key)
+    try:
+        while time.perf_counter() < deadline:
+            budget.apply(key)
+            started = time.perf_counter()
+            model.predict([frame], size=size)
+            latencies.append(time.perf_counter() - started)
+    finally:
+        budget.unregister(key)
+
+
+def run(model, frame, size, policy, cores, n_cams, seconds, default_threads):
+    import torch
+    torch.set_num_threads(default_threads)     # cada rodada parte do padrao do processo
+    budget = CpuBudget(policy, cores)
+    # Aquecimento fora da medicao (primeira passada aloca buffers)
+    model.predict([frame], size=size)
+    latencies = [[] for _ in range(n_cams)]
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=camera, args=(i, model, frame, size, budget, deadline, latencies[i]))
+               for i in range(n_cams)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    flat = np.array([v for lat in latencies for v in lat]) * 1000.0
+    total = len(flat)
+    return {
+        "policy": budget.policy,
+        "fps_total": total / elapsed,
+        "fps_min_cam": min(len(lat) for lat in latencies) / elapsed,
+        "p50_ms": float(np.percentile(flat, 50)) if total else 0.0,
+        "p95_ms": float(np.percentile(flat, 95)) if total else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("weights", help="modelo (.pt/.onnx, caminho ou relativo a raiz do projeto)")
+    parser.add_argument("--cameras", type=int, default=4, help="mede de 1 ate N cameras simultaneas")
+    parser.add_argument("--seconds", type=float, default=10.0, help="duracao de cada medicao")
+    parser.add_argument("--size", type=int, default=640)
+    parser.add_argument("--image", help="frame de exemplo (padrao: ruido 1080x1920)")
+    parser.add_argument("--policies", nargs="+", default=list(THREAD_POLICIES), choices=THREAD_POLICIES)
+    parser.add_argument("--cores", help="nucleos a dividir (ex.: 0-7); padrao: todos do processo")
+    args = parser.parse_args()
+
+    import torch
+    from services.model_registry import model_registry
+
+    if args.image:
+        import cv2
+        frame = cv2.imread(args.image)
+        if frame is None:
+            sys.exit(f"[CPU] Nao foi possivel ler a imagem: {args.image}")
+    else:
+        frame = np.random.default_rng(0).integers(0, 255, (1080, 1920, 3), dtype=np.uint8)
+    cores = parse_cores(args.cores)
+    default_threads = torch.get_num_threads()
+    handle = model_registry.acquire(args.weights)
+    model = handle.model
+    print(f"[CPU] modelo={args.weights} backend={model.name} nucleos={len(cores)} "
+          f"torch.get_num_threads()={default_threads} size={args.size}")
+    print(f"{'cameras':>7} {'politica':<8} {'fps total':>10} {'fps/cam min':>12} {'p50 (ms)':>9} {'p95 (ms)':>9}")
+    try:
+        for n in range(1, max(1, args.cameras) + 1):
+            for policy in args.policies:
+                r = run(model, frame, args.size, policy, cores, n, args.seconds, default_threads)
+                print(f"{n:>7} {r['policy']:<8} {r['fps_total']:>10.2f} {r['fps_min_cam']:>12.2f} "
+                      f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f}")
+    finally:
+        handle.release()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Suite de referencia (golden): contagem e desempenho do pipeline completo.
+
+Le um manifesto JSON com clipes curtos, a contagem conferida de cada um e os
+parametros da TC, e roda cada clipe pelo pipeline completo (VideoSource ->
+IndustrialTagDetector -> annotate, sem ritmo; ver scripts/replay_bench.py)
+para cada modelo/backend (.pt = PyTorch, .onnx = ONNX Runtime) e tamanho de
+entrada. Cada rodada acontece em um processo novo, para medir o pico de
+memoria (RSS) dela.
+
+O horario de captura vem do fps do clipe (ver replay_bench), entao a contagem
+e deterministica tambem com o rastreador kalman. Clipes com portao de
+movimento (`motion_threshold` > 0) sao recusados: o portao forca uma
+inferencia por tempo de relogio (keepalive), e os frames analisados passariam
+a depender da velocidade da maquina.
+
+Falha (codigo de saida 1) quando:
+  - a contagem de algum clipe se afasta da esperada mais que `count_tolerance`;
+  - com --baseline, o fps de uma rodada cai mais que `fps_tolerance` (fracao)
+    em relacao ao resultado anterior da mesma combinacao clipe/modelo/tamanho.
+
+Manifesto (caminhos relativos a pasta do manifesto; exemplo em
+scripts/golden_manifest.example.json):
+    {
+      "models": ["sacaria_yolov5n.pt", "sacaria_yolov5n.onnx"],
+      "sizes": [640],
+      "count_tolerance": 0,
+      "fps_tolerance": 0.15,
+      "clips": [
+        {"name": "tc3_manha", "video": "golden/tc3_manha.mp4", "expected": 37,
+         "tc": {"roi": "800,100,310,900", "flow_mode": "baixo", "min_conf": 0.8}}
+      ]
+    }
+
+Uso:
+    python scripts/bench_golden.py golden/manifest.json [--models a.pt b.onnx] [--sizes 640 480]
+        [--clips tc3_manha] [--baseline golden_ultimo.json] [--save golden_atual.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+if SCRIPTS not in sys.path:
+    sys.path.insert(0, SCRIPTS)
+
+os.environ.setdefault('YOLOV5_NO_AUTOINSTALL', '1')
+
+
+def peak_rss_mb() -> float | None:
+    """Pico de memoria residente do processo atual (MB)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux informa em KB, macOS em bytes
+        return round(peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0, 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        peak = getattr(info, "peak_wset", None) or info.rss     # Windows: pico do working set
+        return round(peak / (1024.0 * 1024.0), 1)
+    except Exception:
+        return None
+
+
+def _run_once(video: str, cfg: dict) -> dict:
+    """Executado em um processo novo: uma rodada do pipeline + pico de RSS."""
+    from replay_bench import replay
+    try:
+        r = replay(video, cfg)
+    except SystemExit as err:
+        return {"error": str(err)}
+    r["peak_rss_mb"] = peak_rss_mb()
+    return r
+
+
+def run_isolated(video: str, cfg: dict) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(_run_once, video, cfg).result()
+
+
+def load_manifest(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as fh:
+        manifest = json.load(fh)
+    base = os.path.dirname(os.path.abspath(path))
+    for clip in manifest.get("clips") or []:
+        if not os.path.isabs(clip["video"]):
+            clip["video"] = os.path.join(base, clip["video"])
+        clip.setdefault("name", os.path.splitext(os.path.basename(clip["video"]))[0])
+    return manifest
+
+
+def run_key(run: dict) -> str:
+    return f"{run['clip']}|{os.path.basename(run['model'])}|{run['size']}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("manifest", help="manifesto JSON dos clipes de referencia")
+    parser.add_argument("--models", nargs="+", help="substitui os modelos do manifesto")
+    parser.add_argument("--sizes", nargs="+", type=int, help="substitui os tamanhos de entrada do manifesto")
+    parser.add_argument("--clips", nargs="+", help="roda somente estes clipes (nome)")
+    parser.add_argument("--baseline", help="resultado anterior (--save) para comparar o fps")
+    parser.add_argument("--save", help="grava o resultado desta execucao")
+    parser.add_argument("--count-tolerance", type=int, help="diferenca de contagem aceita (padrao do manifesto ou 0)")
+    parser.add_argument("--fps-tolerance", type=float, help="queda de fps aceita, fracao (padrao do manifesto ou 0.15)")
+    args = parser.parse_args()
+
+    from replay_bench import DEFAULTS
+
+    manifest = load_manifest(args.manifest)
+    models = args.models or manifest.get("models") or [DEFAULTS["model"]]
+    sizes = args.sizes or manifest.get("sizes") or [DEFAULTS["infer_size"]]
+    count_tol = args.count_tolerance if args.count_tolerance is not None else int(manifest.get("count_tolerance", 0))
+    fps_tol = args.fps_tolerance if args.fps_tolerance is not None else float(manifest.get("fps_tolerance", 0.15))
+    clips = [c for c in manifest.get("clips") or [] if not args.clips or c["name"] in args.clips]
+    if not clips:
+        sys.exit("[GOLDEN] Nenhum clipe no manifesto")
+    # Portao de movimento usa time.monotonic() (keepalive): contagem dependeria da velocidade do replay
+    gated = [c["name"] for c in clips if float((c.get("tc") or {}).get("motion_threshold") or 0) > 0]
+    if gated:
+        sys.exit(f"[GOLDEN] motion_threshold > 0 nao e deterministico no replay; use 0 nos clipes: {', '.join(gated)}")
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as fh:
+            baseline = {run_key(r): r for r in json.load(fh).get("runs", []) if "fps" in r}
+
+    print(f"[GOLDEN] {len(clips)} clipe(s) x {len(models)} modelo(s) x {len(sizes)} tamanho(s) | "
+          f"tolerancia contagem={count_tol} fps={fps_tol:.0%}")
+    print(f"{'clipe':<18} {'modelo':<24} {'size':>5} {'backend':<8} {'esperado':>8} {'contagem':>8} "
+          f"{'erro':>5} {'fps':>8} {'base':>8} {'RSS MB':>8}  status")
+    runs, failures = [], []
+    for clip in clips:
+        for model in models:
+            for size in sizes:
+                cfg = dict(DEFAULTS)
+                cfg.update(clip.get("tc") or {})
+                cfg["model"] = model
+                cfg["infer_size"] = size
+                r = run_isolated(clip["video"], cfg)
+                run = {"clip": clip["name"], "model": model, "size": size, "expected": int(clip["expected"])}
+                if "error" in r:
+                    run["error"] = r["error"]
+                    runs.append(run)
+                    failures.append(f"{run_key(run)}: {r['error']}")
+                    print(f"{clip['name']:<18} {os.path.basename(model):<24} {size:>5} {'-':<8} {'':>8} {'':>8} "
+                          f"{'':>5} {'':>8} {'':>8} {'':>8}  ERRO")
+                    continue
+                run.update(
+                    backend=r["backend"],
+                    count=r["count"],
+                    error_count=r["count"] - run["expected"],
+                    frames=r["frames"],
+                    fps=r["fps"],
+                    peak_rss_mb=r["peak_rss_mb"],
+                    stages=r["stages"],
+                )
+                status = []
+                if abs(run["error_count"]) > count_tol:
+                    status.append("CONTAGEM")
+                    failures.append(f"{run_key(run)}: contagem {run['count']} (esperado {run['expected']})")
+                ref = baseline.get(run_key(run))
+                if ref and run["fps"] < ref["fps"] * (1.0 - fps_tol):
+                    status.append("FPS")
+                    failures.append(f"{run_key(run)}: fps {run['fps']:.2f} < {ref['fps']:.2f} - {fps_tol:.0%}")
+                runs.append(run)
+                base_txt = f"{ref['fps']:.2f}" if ref else "-"
+                rss_txt = f"{run['peak_rss_mb']:.0f}" if run["peak_rss_mb"] is not None else "-"
+                print(f"{clip['name']:<18} {os.path.basename(model):<24} {size:>5} {run['backend']:<8} "
+                      f"{run['expected']:>8} {run['count']:>8} {run['error_count']:>+5} {run['fps']:>8.2f} "
+                      f"{base_txt:>8} {rss_txt:>8}  {'/'.join(status) or 'ok'}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as fh:
+            json.dump({"when": datetime.now().isoformat(timespec="seconds"), "manifest": os.path.abspath(args.manifest),
+                       "count_tolerance": count_tol, "fps_tolerance": fps_tol, "runs": runs},
+                      fh, ensure_ascii=False, indent=2)
+        print(f"[GOLDEN] Resultado gravado em {args.save}")
+    if failures:
+        print(f"[GOLDEN] FALHOU ({len(failures)}):")
+        for item in failures:
+            print(f"  - {item}")
+        sys.exit(1)
+    print("[GOLDEN] OK")
+
+
+if __name__ == "__main__":
+    main()
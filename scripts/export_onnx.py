@@ -0,0 +1,58 @@
+"""
+Exporta um modelo YOLOv5 (.pt) para ONNX usando o export.py do YOLOv5 local.
+
+O arquivo gerado (.onnx, ao lado do .pt) pode ser informado diretamente no
+campo "Modelo" da TC; o detector passa a usar o ONNX Runtime (CPU).
+
+Uso:
+    python scripts/export_onnx.py sacaria_yolov5n.pt [--size 640] [--dynamic]
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ.setdefault('YOLOV5_NO_AUTOINSTALL', '1')
+
+from services.inference_backends import YOLO_DIR
+from services.model_registry import resolve_model_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("weights", help="arquivo .pt (caminho ou relativo a raiz do projeto)")
+    parser.add_argument("--size", type=int, default=640, help="tamanho de entrada (multiplo de 32)")
+    parser.add_argument("--dynamic", action="store_true",
+                        help="lote e dimensoes dinamicos (necessario para lote > 1 e 'Somente ROI' em tamanhos variados)")
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+
+    resolved, exists, _for_load = resolve_model_path(args.weights)
+    if not exists:
+        sys.exit(f"[EXPORT] Modelo nao encontrado: {args.weights}")
+    if not os.path.isdir(YOLO_DIR):
+        sys.exit(f"[EXPORT] Diretorio YOLOv5 nao encontrado: {YOLO_DIR}")
+    if YOLO_DIR not in sys.path:
+        sys.path.insert(0, YOLO_DIR)
+    import export as yolov5_export
+
+    print(f"[EXPORT] {resolved} -> ONNX (size={args.size}, dynamic={args.dynamic})")
+    yolov5_export.run(
+        weights=resolved,
+        imgsz=(args.size, args.size),
+        include=("onnx",),
+        dynamic=args.dynamic,
+        opset=args.opset,
+        device="cpu",
+    )
+    onnx_path = f"{os.path.splitext(resolved)[0]}.onnx"
+    if not os.path.isfile(onnx_path):
+        sys.exit("[EXPORT] Exportacao falhou (veja as mensagens do YOLOv5 acima)")
+    print(f"[EXPORT] Gerado: {onnx_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Tempo de import do app web e dependencias pesadas carregadas no boot.
+
+Roda `python -X importtime -c "import <modulo>"` em um processo novo (sem cache
+de modulos) e mostra o tempo total, os imports mais caros e quais pacotes
+pesados (PyTorch, OpenCV, NumPy, SciPy, openpyxl, ONNX Runtime...) entraram.
+O painel web so deve carregar essas bibliotecas quando uma TC inicia, alguem
+assiste o video ou exporta um Excel.
+
+Uso:
+    python scripts/import_report.py [app] [--top 15] [--strict]
+
+Com --strict sai com codigo 1 se algum pacote pesado for importado.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+HEAVY = ("torch", "torchvision", "cv2", "numpy", "scipy", "openpyxl", "onnxruntime", "onnx", "pandas", "PIL", "yolov5")
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def import_times(module: str) -> list[tuple[str, int, float, float]]:
+    """[(modulo, profundidade, proprio_ms, acumulado_ms)] na ordem do -X importtime."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        tail = proc.stderr.strip().splitlines()[-1:] or ["?"]
+        sys.exit(f"[IMPORT] Falha ao importar '{module}': {tail[0]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            depth = (len(m.group(3)) - 1) // 2
+            rows.append((m.group(4), depth, int(m.group(1)) / 1000.0, int(m.group(2)) / 1000.0))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("module", nargs="?", default="app", help="modulo importado (padrao: app)")
+    parser.add_argument("--top", type=int, default=15, help="imports mais caros exibidos")
+    parser.add_argument("--strict", action="store_true", help="falha se algum pacote pesado for importado")
+    args = parser.parse_args()
+
+    rows = import_times(args.module)
+    total = next((cumulative for name, depth, _own, cumulative in rows if depth == 0 and name == args.module),
+                 sum(cumulative for _name, depth, _own, cumulative in rows if depth == 0))
+    print(f"[IMPORT] import {args.module}: {total:.0f} ms ({len(rows)} modulos)")
+
+    print(f"{'acumulado (ms)':>14} {'proprio (ms)':>12}  modulo")
+    # Somente os primeiros niveis: cada linha ja inclui o custo dos sub-imports
+    shallow = [r for r in rows if r[1] <= 2]
+    for name, depth, own, cumulative in sorted(shallow, key=lambda r: -r[3])[:max(1, args.top)]:
+        print(f"{cumulative:>14.1f} {own:>12.1f}  {'  ' * depth}{name}")
+
+    # Custo de cada pacote pesado = maior acumulado entre os seus modulos (ex.: scipy.optimize)
+    loaded = {}
+    for name, _depth, _own, cumulative in rows:
+        root = name.split(".", 1)[0]
+        if root in HEAVY:
+            loaded[root] = max(loaded.get(root, 0.0), cumulative)
+    if loaded:
+        print("[IMPORT] Pacotes pesados importados: "
+              + ", ".join(f"{name} ({ms:.0f} ms)" for name, ms in sorted(loaded.items(), key=lambda kv: -kv[1])))
+    else:
+        print("[IMPORT] Nenhum pacote pesado importado.")
+    if args.strict and loaded:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Mede o tempo de carga do modelo com e sem o cache TorchScript.
+
+Cada medicao roda em um processo Python novo (imports incluidos):
+  - fria: artefatos do .pt removidos -> torch.hub + YOLOv5 + trace + gravacao;
+  - quente: apenas torch.jit.load do artefato gravado na medicao fria.
+
+Uso:
+    python scripts/model_load_times.py sacaria_yolov5n.pt [--size 640] [--frame 1080x1920] [--runs 3]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def child(weights, size, frame_hw):
+    """Executado no processo filho: carrega, faz a 1a inferencia e imprime JSON."""
+    started = time.perf_counter()
+    import numpy as np
+    import torch  # noqa: F401  (entra no tempo de import)
+    imported = time.perf_counter()
+    from services.model_registry import model_registry
+    handle = model_registry.acquire(weights)
+    loaded = time.perf_counter()
+    frame = np.zeros((frame_hw[0], frame_hw[1], 3), dtype=np.uint8)
+    handle.model.predict([frame], size=size)
+    first = time.perf_counter()
+    backend = handle.model
+    print(json.dumps({
+        "backend": backend.name,
+        "import_s": imported - started,
+        "load_s": loaded - imported,
+        "first_predict_s": first - loaded,
+        "total_s": first - started,
+        "yolov5_imported": "hubconf" in sys.modules or "models.yolo" in sys.modules,
+    }))
+
+
+def run_child(weights, size, frame, env_extra=None):
+    env = dict(os.environ)
+    env.setdefault('YOLOV5_NO_AUTOINSTALL', '1')
+    env.update(env_extra or {})
+    cmd = [sys.executable, os.path.abspath(__file__), weights, "--size", str(size), "--frame", frame, "--child"]
+    out = subprocess.run(cmd, env=env, cwd=ROOT, capture_output=True, text=True)
+    if out.returncode != 0:
+        sys.stderr.write(out.stderr)
+        raise SystemExit(f"[LOAD] Processo filho falhou ({out.returncode})")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def print_row(label, r):
+    print(f"{label:<10} {r['backend']:<12} {r['import_s']:>9.2f} {r['load_s']:>9.2f} "
+          f"{r['first_predict_s']:>11.2f} {r['total_s']:>9.2f}  {'sim' if r['yolov5_imported'] else 'nao':>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("weights", help="arquivo .pt (caminho ou relativo a raiz do projeto)")
+    parser.add_argument("--size", type=int, default=640, help="tamanho de entrada do modelo (como na TC)")
+    parser.add_argument("--frame", default="1080x1920", help="resolucao do frame (AxL) usada na 1a inferencia")
+    parser.add_argument("--runs", type=int, default=3, help="repeticoes da medicao quente")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    frame_hw = tuple(int(v) for v in args.frame.lower().split("x"))
+
+    if args.child:
+        child(args.weights, args.size, frame_hw)
+        return
+
+    from services.model_cache import remove_artifacts
+    from services.model_registry import resolve_model_path
+    resolved, exists, _for_load = resolve_model_path(args.weights)
+    if not exists or not resolved.lower().endswith(".pt"):
+        sys.exit(f"[LOAD] Informe um arquivo .pt existente: {args.weights}")
+
+    print(f"[LOAD] {resolved} (size={args.size}, frame={args.frame})")
+    print(f"{'medicao':<10} {'backend':<12} {'import(s)':>9} {'carga(s)':>9} {'1a infer(s)':>11} {'total(s)':>9}  {'YOLOv5':>6}")
+    print_row("sem cache", run_child(resolved, args.size, args.frame, {"MODEL_CACHE_ENABLED": "0"}))
+    removed = remove_artifacts(resolved)
+    if removed:
+        print(f"[LOAD] {removed} artefato(s) removido(s) para a medicao fria")
+    cold = run_child(resolved, args.size, args.frame, {"MODEL_CACHE_ENABLED": "1"})
+    print_row("fria", cold)
+    warm = [run_child(resolved, args.size, args.frame, {"MODEL_CACHE_ENABLED": "1"}) for _ in range(max(1, args.runs))]
+    for i, r in enumerate(warm, 1):
+        print_row(f"quente {i}", r)
+    best = min(r["total_s"] for r in warm)
+    print(f"[LOAD] Ganho (fria / melhor quente): {cold['total_s'] / best:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
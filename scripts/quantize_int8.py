@@ -0,0 +1,230 @@
+"""
+Gera o modelo int8 (ONNX Runtime) de uma TC e valida contra o fp32 no mesmo video.
+
+Etapas:
+  1. roda o detector da TC (configuracao do banco) com o modelo fp32 atual em
+     todos os frames do video, guardando as entradas do modelo e as deteccoes;
+  2. calibra a quantizacao estatica (QDQ, pesos int8 / ativacoes uint8) com
+     frames desse video, pre-processados exatamente como na inferencia;
+  3. roda o mesmo video com o modelo int8 e compara contagem final e
+     deteccoes (recall/precisao com IoU >= 0.5 acima do min_conf da TC);
+  4. grava `<modelo>.int8.onnx` e o relatorio `<modelo>.int8.json`. A TC so pode
+     usar "Precisao do modelo = int8" com a validacao aprovada.
+
+Se o modelo da TC for .pt, o ONNX fp32 (`<modelo>.onnx`, dinamico) e exportado antes.
+
+Uso:
+    python scripts/quantize_int8.py --tc 3 [--video gravacao_tc3.mp4] [--calib-frames 100]
+        [--max-frames 0] [--max-count-diff 0] [--min-recall 0.95] [--min-precision 0.95]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ.setdefault('YOLOV5_NO_AUTOINSTALL', '1')
+
+from services.inference_backends import autoshape_input_shape, letterbox
+from services.model_cache import weights_hash
+from services.model_registry import resolve_model_path
+from services.quantization import DetectionComparison, int8_paths, quantize_onnx, record_validation
+
+
+class _Recorder:
+    """Envolve o backend do detector: guarda deteccoes por frame e, a cada `keep_every`, a entrada do modelo."""
+
+    def __init__(self, backend, size, keep_every=0):
+        self.backend = backend
+        self.name = backend.name
+        self.size = size
+        self.keep_every = keep_every
+        self.outputs = []
+        self.inputs = []
+        self.infer_s = 0.0
+
+    def predict(self, images, size=640):
+        started = time.perf_counter()
+        out = self.backend.predict(images, size=size)
+        self.infer_s += time.perf_counter() - started
+        if self.keep_every and len(self.outputs) % self.keep_every == 0:
+            image = images[0]
+            # Mesmo letterbox do backend ONNX (forma retangular do AutoShape)
+            self.inputs.append(letterbox(image, autoshape_input_shape([image], size))[0])
+        self.outputs.extend(out)
+        return out
+
+
+def detector_kwargs(tc: dict) -> dict:
+    from services.tc_repository import normalize_infer_settings, normalize_tracker_mode
+    roi = tuple(int(p) for p in str(tc.get("roi") or "0,0,0,0").split(","))
+    infer_mode, infer_margin, infer_size = normalize_infer_settings(
+        tc.get("infer_mode"), tc.get("infer_margin", 32), tc.get("infer_size", 640))
+    return dict(
+        roi=roi,
+        cross_point_mode='meio',
+        line_offset_red=tc.get("line_offset_red", 40),
+        line_offset_blue=tc.get("line_offset_blue", -40),
+        flow_mode=tc.get("flow_mode") or "cima",
+        max_lost=int(tc.get("max_lost", 2) or 0),
+        match_dist=float(tc.get("match_dist", 150) or 150),
+        min_conf=float(tc.get("min_conf", 0.8) or 0.8),
+        infer_mode=infer_mode,
+        infer_margin=infer_margin,
+        infer_size=infer_size,
+        tracker_mode=normalize_tracker_mode(tc.get("tracker_mode")),
+        # Todos os frames passam pelo modelo, sem snapshots nem motor em lote
+        motion_threshold=0.0,
+        missed_frame_dir=None,
+        inference_engine=None,
+        ct_id=tc["id"],
+        ct_name=tc.get("name"),
+    )
+
+
+def run_clip(model_path, kwargs, video, max_frames=0, keep_every=0):
+    import cv2
+    from services.industrial_tag_detector import IndustrialTagDetector
+    detector = IndustrialTagDetector(model_path, **kwargs)
+    if detector.model is None:
+        sys.exit(f"[INT8] Falha ao carregar o modelo: {model_path}")
+    recorder = _Recorder(detector.model, detector.infer_size, keep_every)
+    detector.model = recorder
+    cap = cv2.VideoCapture(video)
+    if not cap.isOpened():
+        sys.exit(f"[INT8] Nao foi possivel abrir o video: {video}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frames = 0
+    try:
+        while not max_frames or frames < max_frames:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            detector.process(frame, captured_at=frames / fps)
+            frames += 1
+    finally:
+        cap.release()
+        detector.release()
+    return {
+        "frames": frames,
+        "count": detector.counter,
+        "outputs": recorder.outputs,
+        "inputs": recorder.inputs,
+        "infer_ms": recorder.infer_s * 1000.0 / max(1, len(recorder.outputs)),
+        "backend": recorder.name,
+        "min_conf": detector.min_conf,
+    }
+
+
+def ensure_fp32_onnx(model_path: str) -> str:
+    if model_path.lower().endswith(".onnx"):
+        return model_path
+    onnx_path = os.path.splitext(model_path)[0] + ".onnx"
+    if not os.path.isfile(onnx_path) or os.path.getmtime(onnx_path) < os.path.getmtime(model_path):
+        print(f"[INT8] Exportando ONNX fp32 (dinamico): {onnx_path}")
+        cmd = [sys.executable, os.path.join(ROOT, "scripts", "export_onnx.py"), model_path, "--dynamic"]
+        if subprocess.run(cmd, cwd=ROOT).returncode != 0 or not os.path.isfile(onnx_path):
+            sys.exit("[INT8] Falha ao exportar o ONNX fp32")
+    return onnx_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tc", type=int, required=True, help="id da TC (configuracao lida do banco)")
+    parser.add_argument("--video", help="video gravado da TC (padrao: fonte da TC, se for arquivo)")
+    parser.add_argument("--calib-frames", type=int, default=100, help="frames usados na calibracao")
+    parser.add_argument("--max-frames", type=int, default=0, help="limita os frames do video (0 = todos)")
+    parser.add_argument("--max-count-diff", type=int, default=0, help="diferenca maxima aceita na contagem")
+    parser.add_argument("--min-recall", type=float, default=0.95, help="fracao minima das deteccoes fp32 reproduzidas")
+    parser.add_argument("--min-precision", type=float, default=0.95, help="fracao minima das deteccoes int8 presentes no fp32")
+    args = parser.parse_args()
+
+    from services.tc_repository import get_tc
+    tc = get_tc(args.tc)
+    if not tc:
+        sys.exit(f"[INT8] TC {args.tc} nao encontrada")
+    video = args.video or tc.get("source_path")
+    if not video or not os.path.isfile(video):
+        sys.exit("[INT8] Informe --video com uma gravacao da TC (a fonte cadastrada nao e um arquivo)")
+    resolved, exists, _for_load = resolve_model_path(tc.get("model_path") or "sacaria_yolov5n.pt")
+    if not exists:
+        sys.exit(f"[INT8] Modelo da TC nao encontrado: {resolved}")
+    int8_path, report_path = int8_paths(resolved)
+    kwargs = detector_kwargs(tc)
+
+    # 1. Referencia fp32 (modelo atual da TC) + entradas para calibracao
+    total = args.max_frames
+    if not total:
+        import cv2
+        cap = cv2.VideoCapture(video)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        cap.release()
+    keep_every = max(1, total // max(1, args.calib_frames)) if total else 1
+    print(f"[INT8] TC {args.tc} | modelo={resolved} | video={video}")
+    ref = run_clip(resolved, kwargs, video, args.max_frames, keep_every)
+    calib = ref["inputs"][:max(1, args.calib_frames)]
+    print(f"[INT8] fp32 ({ref['backend']}): {ref['frames']} frames, contagem={ref['count']}, "
+          f"{ref['infer_ms']:.1f} ms/inferencia, {len(calib)} frames de calibracao")
+
+    # 2. Calibracao e quantizacao
+    fp32_onnx = ensure_fp32_onnx(resolved)
+    blobs = (img.transpose(2, 0, 1).astype(np.float32) / 255.0 for img in calib)
+    started = time.perf_counter()
+    quant = quantize_onnx(fp32_onnx, int8_path, blobs)
+    print(f"[INT8] Quantizado em {time.perf_counter() - started:.1f}s -> {int8_path} "
+          f"({quant['excluded_nodes']} nos da camada Detect mantidos em float)")
+
+    # 3. Mesmo video com o int8
+    test = run_clip(int8_path, kwargs, video, args.max_frames)
+    comparison = DetectionComparison(min_conf=ref["min_conf"])
+    for a, b in zip(ref["outputs"], test["outputs"]):
+        comparison.add(np.asarray(a), np.asarray(b))
+    summary = comparison.summary()
+    count_diff = abs(int(test["count"]) - int(ref["count"]))
+    passed = (count_diff <= args.max_count_diff
+              and summary["recall"] >= args.min_recall
+              and summary["precision"] >= args.min_precision)
+
+    # 4. Relatorio
+    validation = {
+        "passed": passed,
+        "video": os.path.abspath(video),
+        "frames": ref["frames"],
+        "fp32_count": int(ref["count"]),
+        "int8_count": int(test["count"]),
+        "count_diff": count_diff,
+        "detections": summary,
+        "fp32_infer_ms": round(ref["infer_ms"], 2),
+        "int8_infer_ms": round(test["infer_ms"], 2),
+        "calibration": quant,
+        "thresholds": {
+            "max_count_diff": args.max_count_diff,
+            "min_recall": args.min_recall,
+            "min_precision": args.min_precision,
+        },
+        "int8_hash": weights_hash(int8_path),
+    }
+    record_validation(resolved, args.tc, validation, weights_hash(resolved))
+
+    print(f"{'':<22} {'fp32':>10} {'int8':>10}")
+    print(f"{'contagem':<22} {ref['count']:>10} {test['count']:>10}")
+    print(f"{'deteccoes':<22} {summary['fp32_detections']:>10} {summary['int8_detections']:>10}")
+    print(f"{'ms/inferencia':<22} {ref['infer_ms']:>10.1f} {test['infer_ms']:>10.1f}")
+    print(f"[INT8] recall={summary['recall']} precisao={summary['precision']} "
+          f"IoU medio={summary['mean_iou']} delta conf={summary['mean_conf_delta']}")
+    print(f"[INT8] Relatorio: {report_path}")
+    if passed:
+        print(f"[INT8] APROVADO: a TC {args.tc} pode usar 'Precisao do modelo = int8'.")
+    else:
+        print(f"[INT8] REPROVADO: a TC {args.tc} continua em fp32.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+Replay offline de um video pelo pipeline de contagem, sem ritmo de tempo real.
+
+Le o video com VideoSource (realtime=False: cada frame e decodificado sob
+demanda, sem delay e sem reiniciar no fim) e passa todos os frames pelo
+IndustrialTagDetector com a configuracao da TC. Mede por frame:
+
+  - decode:  leitura/decodificacao do frame;
+  - infer:   execucao do modelo (somente frames enviados ao modelo);
+  - track:   filtro, rastreamento e contagem (process() sem a inferencia);
+  - draw:    desenho de ROI, linhas e caixas (annotate()).
+
+Mostra a contagem final, o fps e p50/p95/p99 de cada etapa; com --json grava
+o resultado para comparar execucoes. O horario de captura de cada frame vem do
+fps do arquivo (frame / fps), como na gravacao: a contagem nao depende da
+velocidade da maquina (dt do rastreador kalman).
+
+A configuracao vem das opcoes abaixo ou, com --tc, do banco (as opcoes
+informadas sobrescrevem as da TC).
+
+Uso:
+    python scripts/replay_bench.py gravacao.mp4 --roi 800,100,310,900 --flow-mode baixo
+        [--model sacaria_yolov5n.pt] [--line-offset-red 40] [--line-offset-blue -40]
+        [--max-lost 2] [--match-dist 150] [--min-conf 0.8] [--infer-mode quadro|roi]
+        [--tracker-mode centroide|kalman] [--decode-backend opencv|ffmpeg] [--tc 3]
+        [--max-frames 0] [--no-draw] [--json resultado.json]
+
+Com --decode-backend ffmpeg o video e decodificado por um processo ffmpeg (com
+--infer-mode roi, ja recortado na ROI + margem); a etapa decode passa a medir
+a espera pelo pipe.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ.setdefault('YOLOV5_NO_AUTOINSTALL', '1')
+
+from services.video_source import VideoSource
+
+STAGES = ("decode", "infer", "track", "draw")
+
+DEFAULTS = {
+    "model": "sacaria_yolov5n.pt",
+    "roi": "0,0,0,0",
+    "line_offset_red": 40,
+    "line_offset_blue": -40,
+    "flow_mode": "cima",
+    "max_lost": 2,
+    "match_dist": 150.0,
+    "min_conf": 0.8,
+    "infer_mode": "quadro",
+    "infer_margin": 32,
+    "infer_size": 640,
+    "tracker_mode": "centroide",
+    "motion_threshold": 0.0,
+    "decode_backend": "opencv",
+}
+
+
+class _TimedModel:
+    """Envolve o backend do detector e acumula o tempo de inferencia do frame atual."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.name = backend.name
+        self.elapsed = 0.0
+
+    def predict(self, images, size=640):
+        started = time.perf_counter()
+        try:
+            return self.backend.predict(images, size=size)
+        finally:
+            self.elapsed += time.perf_counter() - started
+
+
+def tc_config(tc_id: int) -> dict:
+    from services.tc_repository import get_tc
+    tc = get_tc(tc_id)
+    if not tc:
+        sys.exit(f"[REPLAY] TC {tc_id} nao encontrada")
+    cfg = {key: tc.get(key) for key in DEFAULTS if tc.get(key) is not None}
+    if tc.get("model_path"):
+        cfg["model"] = tc["model_path"]
+    return cfg
+
+
+def build_config(args) -> dict:
+    cfg = dict(DEFAULTS)
+    if args.tc is not None:
+        cfg.update(tc_config(args.tc))
+    for key in DEFAULTS:
+        value = getattr(args, key)
+        if value is not None:
+            cfg[key] = value
+    return cfg
+
+
+def percentiles(values) -> dict:
+    arr = np.asarray(values, dtype=np.float64) * 1000.0
+    if not arr.size:
+        return {"n": 0, "mean_ms": None, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+    p50, p95, p99 = np.percentile(arr, (50, 95, 99))
+    return {
+        "n": int(arr.size),
+        "mean_ms": round(float(arr.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+    }
+
+
+def _video_fps(source) -> float:
+    """fps do arquivo (OpenCV ou consulta do ffmpeg); 30 se o container nao informar."""
+    if getattr(source, "cap", None) is not None:
+        fps = source.cap.get(cv2.CAP_PROP_FPS)
+    else:
+        fps = getattr(source, "video_fps", None)
+    return float(fps) if fps and fps > 0 else 30.0
+
+
+def replay(video: str, cfg: dict, max_frames: int = 0, draw: bool = True) -> dict:
+    from services.industrial_tag_detector import IndustrialTagDetector
+    from services.tc_repository import normalize_infer_settings, normalize_tracker_mode
+
+    roi = tuple(int(p) for p in str(cfg["roi"]).split(","))
+    infer_mode, infer_margin, infer_size = normalize_infer_settings(
+        cfg["infer_mode"], cfg["infer_margin"], cfg["infer_size"])
+    if cfg.get("decode_backend") == "ffmpeg":
+        from services.ffmpeg_source import FfmpegVideoSource, roi_crop, translate_roi
+        crop = roi_crop(roi, infer_margin) if infer_mode == "roi" else None
+        source = FfmpegVideoSource(video, realtime=False, crop=crop)
+        roi = translate_roi(roi, source.offset)
+    else:
+        source = VideoSource(video, realtime=False)
+    if not source.is_opened():
+        sys.exit(f"[REPLAY] Nao foi possivel abrir o video: {video}")
+    video_fps = _video_fps(source)
+    detector = IndustrialTagDetector(
+        cfg["model"],
+        roi=roi,
+        line_offset_red=int(cfg["line_offset_red"]),
+        line_offset_blue=int(cfg["line_offset_blue"]),
+        flow_mode=cfg["flow_mode"],
+        max_lost=int(cfg["max_lost"]),
+        match_dist=float(cfg["match_dist"]),
+        min_conf=float(cfg["min_conf"]),
+        infer_mode=infer_mode,
+        infer_margin=infer_margin,
+        infer_size=infer_size,
+        tracker_mode=normalize_tracker_mode(cfg["tracker_mode"]),
+        motion_threshold=float(cfg["motion_threshold"] or 0),
+        missed_frame_dir=None,
+    )
+    if detector.model is None:
+        source.release()
+        sys.exit(f"[REPLAY] Falha ao carregar o modelo: {cfg['model']}")
+    timed = _TimedModel(detector.model)
+    detector.model = timed
+
+    times = {stage: [] for stage in STAGES}
+    frames = 0
+    started = time.perf_counter()
+    try:
+        while not max_frames or frames < max_frames:
+            t0 = time.perf_counter()
+            ok, frame = source.read_next()
+            t1 = time.perf_counter()
+            if not ok:
+                break
+            timed.elapsed = 0.0
+            inferred_before = detector.frames_inferred
+            # Horario de captura pelo fps do arquivo (nao pelo relogio): o dt do rastreador
+            # kalman fica independente da velocidade da maquina
+            result = detector.process(frame, captured_at=frames / video_fps)
+            t2 = time.perf_counter()
+            if draw:
+                detector.annotate(frame, result)
+            t3 = time.perf_counter()
+            times["decode"].append(t1 - t0)
+            if detector.frames_inferred != inferred_before:
+                times["infer"].append(timed.elapsed)
+            times["track"].append((t2 - t1) - timed.elapsed)
+            if draw:
+                times["draw"].append(t3 - t2)
+            frames += 1
+    finally:
+        elapsed = time.perf_counter() - started
+        source.release()
+        detector.release()
+
+    return {
+        "video": os.path.abspath(video),
+        "when": datetime.now().isoformat(timespec="seconds"),
+        "config": cfg,
+        "backend": timed.name,
+        "frames": frames,
+        "video_fps": video_fps,
+        "frames_inferred": detector.frames_inferred,
+        "count": int(detector.counter),
+        "elapsed_s": round(elapsed, 3),
+        "fps": round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+        "stages": {stage: percentiles(values) for stage, values in times.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video", help="arquivo de video gravado")
+    parser.add_argument("--tc", type=int, help="le a configuracao da TC no banco")
+    parser.add_argument("--model", help="modelo (.pt/.onnx); padrao: o da TC ou sacaria_yolov5n.pt")
+    parser.add_argument("--roi", help="x,y,largura,altura")
+    parser.add_argument("--line-offset-red", type=int)
+    parser.add_argument("--line-offset-blue", type=int)
+    parser.add_argument("--flow-mode", choices=("cima", "baixo", "sem_fluxo"))
+    parser.add_argument("--max-lost", type=int)
+    parser.add_argument("--match-dist", type=float)
+    parser.add_argument("--min-conf", type=float)
+    parser.add_argument("--infer-mode", choices=("quadro", "roi"))
+    parser.add_argument("--infer-margin", type=int)
+    parser.add_argument("--infer-size", type=int)
+    parser.add_argument("--tracker-mode", choices=("centroide", "kalman"))
+    parser.add_argument("--motion-threshold", type=float, help="portao de movimento (0 = desligado)")
+    parser.add_argument("--decode-backend", choices=("opencv", "ffmpeg"), help="decodificacao do video")
+    parser.add_argument("--max-frames", type=int, default=0, help="limita os frames (0 = video inteiro)")
+    parser.add_argument("--no-draw", action="store_true", help="nao mede o desenho (annotate)")
+    parser.add_argument("--json", help="grava o resultado neste arquivo")
+    args = parser.parse_args()
+
+    cfg = build_config(args)
+    r = replay(args.video, cfg, args.max_frames, draw=not args.no_draw)
+
+    print(f"[REPLAY] video={r['video']} modelo={cfg['model']} backend={r['backend']}")
+    print(f"[REPLAY] contagem={r['count']} frames={r['frames']} (modelo em {r['frames_inferred']}) "
+          f"tempo={r['elapsed_s']:.2f}s fps={r['fps']:.2f}")
+    print(f"{'etapa':<8} {'n':>6} {'media':>9} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)")
+    for stage in STAGES:
+        s = r["stages"][stage]
+        if not s["n"]:
+            print(f"{stage:<8} {0:>6} {'-':>9} {'-':>9} {'-':>9} {'-':>9}")
+            continue
+        print(f"{stage:<8} {s['n']:>6} {s['mean_ms']:>9.2f} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(r, fh, ensure_ascii=False, indent=2)
+        print(f"[REPLAY] Resultado gravado em {args.json}")
+
+
+if __name__ == "__main__":
+    main()
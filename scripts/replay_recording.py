@@ -0,0 +1,55 @@
+"""
+Reexecuta o rastreamento e a contagem de uma sessao gravada, sem o modelo.
+
+Le a pasta `deteccoes_<data>` gravada na pasta de snapshots do lote (TC com
+"Gravar deteccoes da sessao") e passa as deteccoes de cada frame pelo mesmo
+rastreador/contador do detector, com os parametros da TC no inicio da sessao.
+As opcoes abaixo trocam parametros para comparar o resultado.
+
+Uso:
+    python scripts/replay_recording.py \\\\servidor\\sacarias\\LOTE123\\deteccoes_20250101_080000
+        [--line-offset-red 40] [--line-offset-blue -40] [--max-lost 2] [--match-dist 150]
+        [--min-conf 0.8] [--tracker-mode centroide|kalman] [--events]
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from services.detection_recorder import replay_recording
+
+OVERRIDES = ("line_offset_red", "line_offset_blue", "flow_mode", "max_lost", "match_dist", "min_conf", "tracker_mode")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="pasta deteccoes_<data> da sessao")
+    parser.add_argument("--line-offset-red", type=int)
+    parser.add_argument("--line-offset-blue", type=int)
+    parser.add_argument("--flow-mode", choices=("cima", "baixo", "sem_fluxo"))
+    parser.add_argument("--max-lost", type=int)
+    parser.add_argument("--match-dist", type=float)
+    parser.add_argument("--min-conf", type=float, help="so pode subir: a gravacao ja vem filtrada pelo min_conf da TC")
+    parser.add_argument("--tracker-mode", choices=("centroide", "kalman"))
+    parser.add_argument("--events", action="store_true", help="lista os eventos de contagem")
+    args = parser.parse_args()
+
+    overrides = {key: getattr(args, key) for key in OVERRIDES if getattr(args, key) is not None}
+    r = replay_recording(args.recording, **overrides)
+    meta = r["meta"]
+    print(f"[REPLAY] TC {meta.get('tc')} lote='{meta.get('lote')}' inicio={meta.get('started_at')} "
+          f"fim={meta.get('finished_at') or '-'} frames={r['frames']}")
+    if overrides:
+        print(f"[REPLAY] Parametros alterados: {overrides}")
+    recorded = r["recorded_count"]
+    print(f"[REPLAY] contagem replay={r['count']} | contagem da sessao={recorded if recorded is not None else '-'}")
+    if args.events:
+        for event in r["events"]:
+            print(f"  {event.message}")
+
+
+if __name__ == "__main__":
+    main()
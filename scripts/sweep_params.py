@@ -0,0 +1,271 @@
+"""
+Varredura de parametros de contagem sobre deteccoes em cache.
+
+1. Roda o modelo uma unica vez no video de referencia e grava as deteccoes
+   brutas da ROI (min_conf = 0) no formato de services/detection_recorder.py,
+   em `<video>.deteccoes/`. O cache e reaproveitado enquanto video, modelo e
+   area de inferencia nao mudarem (--refresh refaz).
+   Com --recording, usa uma sessao gravada pela TC ("Gravar deteccoes").
+2. Reexecuta somente o rastreamento e a contagem para cada combinacao de
+   line_offset_red, line_offset_blue, max_lost, match_dist e min_conf, em
+   paralelo (ProcessPoolExecutor), e ordena pelo erro contra a contagem real.
+
+Cada parametro aceita um valor, uma lista (20,40,60) ou uma faixa
+inicio:fim:passo (fim incluido); valores negativos no inicio vao com '='
+(--line-offset-blue=-80:0:20). O restante da configuracao (ROI, fluxo,
+rastreador, inferencia) vem das opcoes ou, com --tc, do banco.
+
+Uso:
+    python scripts/sweep_params.py gravacao.mp4 --expected 37 --tc 3 \\
+        --line-offset-red 0:80:20 --line-offset-blue=-80:0:20 --max-lost 1:4:1 \\
+        --match-dist 100,150,200 --min-conf 0.5:0.9:0.1 [--workers 8] [--top 20] [--csv sweep.csv]
+    python scripts/sweep_params.py --recording <pasta deteccoes_...> --expected 37 --max-lost 1:4:1
+"""
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ.setdefault('YOLOV5_NO_AUTOINSTALL', '1')
+
+from services.detection_recorder import DetectionRecorder, iter_recorded_frames, load_meta, replay_detections
+
+SWEPT = ("line_offset_red", "line_offset_blue", "max_lost", "match_dist", "min_conf")
+CASTS = {"line_offset_red": int, "line_offset_blue": int, "max_lost": int, "match_dist": float, "min_conf": float}
+
+DEFAULTS = {
+    "model": "sacaria_yolov5n.pt",
+    "roi": "0,0,0,0",
+    "line_offset_red": 40,
+    "line_offset_blue": -40,
+    "flow_mode": "cima",
+    "max_lost": 2,
+    "match_dist": 150.0,
+    "min_conf": 0.8,
+    "infer_mode": "quadro",
+    "infer_margin": 32,
+    "infer_size": 640,
+    "tracker_mode": "centroide",
+}
+
+
+def parse_values(spec: str, cast):
+    """'20' | '20,40,60' | '0:80:20' (fim incluido) -> lista de valores."""
+    spec = str(spec).strip()
+    if ":" in spec:
+        start, stop, step = (float(p) for p in spec.split(":"))
+        if step <= 0:
+            raise ValueError(f"passo invalido em '{spec}'")
+        count = int(np.floor((stop - start) / step + 1e-9)) + 1
+        values = [round(start + i * step, 6) for i in range(max(0, count))]
+    else:
+        values = [float(p) for p in spec.split(",") if p.strip()]
+    return [cast(v) for v in dict.fromkeys(values)]
+
+
+def base_config(args) -> dict:
+    cfg = dict(DEFAULTS)
+    if args.tc is not None:
+        from services.tc_repository import get_tc
+        tc = get_tc(args.tc)
+        if not tc:
+            sys.exit(f"[SWEEP] TC {args.tc} nao encontrada")
+        cfg.update({key: tc[key] for key in DEFAULTS if tc.get(key) is not None})
+        if tc.get("model_path"):
+            cfg["model"] = tc["model_path"]
+    for key in DEFAULTS:
+        if key in SWEPT:
+            continue
+        value = getattr(args, key, None)
+        if value is not None:
+            cfg[key] = value
+    return cfg
+
+
+# ---------- cache de deteccoes ----------
+def _cache_source(video: str, cfg: dict) -> dict:
+    from services.model_registry import resolve_model_path
+    resolved, _exists, _for_load = resolve_model_path(cfg["model"])
+    stat = os.stat(video)
+    return {
+        "video": os.path.abspath(video),
+        "video_size": stat.st_size,
+        "video_mtime": int(stat.st_mtime),
+        "model": resolved,
+        "model_mtime": int(os.path.getmtime(resolved)) if os.path.isfile(resolved) else None,
+        "roi": str(cfg["roi"]),
+        "infer_mode": cfg["infer_mode"],
+        "infer_margin": int(cfg["infer_margin"]),
+        "infer_size": int(cfg["infer_size"]),
+    }
+
+
+def build_cache(video: str, cfg: dict, refresh: bool = False) -> str:
+    """Roda o modelo uma vez no video e grava as deteccoes brutas da ROI; devolve a pasta do cache."""
+    import cv2
+    from services.industrial_tag_detector import IndustrialTagDetector
+    from services.tc_repository import normalize_infer_settings
+    from services.video_source import VideoSource
+
+    directory = os.path.splitext(video)[0] + ".deteccoes"
+    source = _cache_source(video, cfg)
+    if not refresh and os.path.isfile(os.path.join(directory, "meta.json")):
+        meta = load_meta(directory)
+        if meta.get("source") == source and meta.get("finished_at"):
+            print(f"[SWEEP] Usando deteccoes em cache: {directory}")
+            return directory
+    for name in os.listdir(directory) if os.path.isdir(directory) else ():
+        if name.startswith("chunk_") or name == "meta.json":
+            os.remove(os.path.join(directory, name))
+
+    infer_mode, infer_margin, infer_size = normalize_infer_settings(
+        cfg["infer_mode"], cfg["infer_margin"], cfg["infer_size"])
+    detector = IndustrialTagDetector(
+        cfg["model"],
+        roi=tuple(int(p) for p in str(cfg["roi"]).split(",")),
+        flow_mode=cfg["flow_mode"],
+        min_conf=0.0,       # todas as deteccoes do modelo; min_conf e aplicado no replay
+        infer_mode=infer_mode,
+        infer_margin=infer_margin,
+        infer_size=infer_size,
+        missed_frame_dir=None,
+    )
+    if detector.model is None:
+        sys.exit(f"[SWEEP] Falha ao carregar o modelo: {cfg['model']}")
+    meta = {"source": source, "model": cfg["model"], "config": detector.tracking_config(),
+            "counter_start": 0, "frame_index_start": 0}
+    recorder = DetectionRecorder(directory, meta, chunk_frames=5000, chunk_seconds=3600)
+    detector.recorder = recorder
+    camera = VideoSource(video, realtime=False)
+    if camera.cap is None:
+        sys.exit(f"[SWEEP] Nao foi possivel abrir o video: {video}")
+    fps = camera.cap.get(cv2.CAP_PROP_FPS) or 30.0
+    print(f"[SWEEP] Rodando o modelo em {video} (uma unica vez)...")
+    started = time.perf_counter()
+    frames = 0
+    try:
+        while True:
+            ok, frame = camera.read_next()
+            if not ok:
+                break
+            # horario de captura pelo fps do arquivo (velocidade real para o rastreador kalman)
+            detector.process(frame, captured_at=source["video_mtime"] + frames / fps)
+            frames += 1
+    finally:
+        camera.release()
+        recorder.close(counter_end=int(detector.counter))
+        detector.release()
+    print(f"[SWEEP] {frames} frames em {time.perf_counter() - started:.1f}s -> {directory}")
+    return directory
+
+
+# ---------- replay em paralelo ----------
+_META = None
+_FRAMES = None
+_BASE = None
+
+
+def _init_worker(directory: str, base: dict):
+    global _META, _FRAMES, _BASE
+    _META = load_meta(directory)
+    _FRAMES = list(iter_recorded_frames(directory))
+    _BASE = base
+
+
+def _run_combo(params: dict) -> dict:
+    overrides = dict(_BASE, **params)
+    r = replay_detections(_META, _FRAMES, **overrides)
+    adjustments = sum(1 for event in r["events"] if event.kind != "RECONHECIMENTO" or event.delta < 0)
+    return dict(params, count=int(r["count"]), adjustments=adjustments)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video", nargs="?", help="video de referencia")
+    parser.add_argument("--recording", help="usa uma sessao gravada (pasta deteccoes_...) em vez do video")
+    parser.add_argument("--expected", type=int, required=True, help="contagem real (conferida) do video")
+    parser.add_argument("--tc", type=int, help="configuracao base lida do banco")
+    parser.add_argument("--model")
+    parser.add_argument("--roi", help="x,y,largura,altura")
+    parser.add_argument("--flow-mode", choices=("cima", "baixo", "sem_fluxo"))
+    parser.add_argument("--infer-mode", choices=("quadro", "roi"))
+    parser.add_argument("--infer-margin", type=int)
+    parser.add_argument("--infer-size", type=int)
+    parser.add_argument("--tracker-mode", choices=("centroide", "kalman"))
+    for key in SWEPT:
+        parser.add_argument("--" + key.replace("_", "-"), dest=key, help="valor, lista a,b,c ou faixa inicio:fim:passo")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--top", type=int, default=20, help="linhas do ranking")
+    parser.add_argument("--csv", help="grava todas as combinacoes neste arquivo")
+    parser.add_argument("--refresh", action="store_true", help="refaz o cache de deteccoes")
+    args = parser.parse_args()
+    if not args.video and not args.recording:
+        parser.error("informe o video ou --recording")
+
+    cfg = base_config(args)
+    if args.recording:
+        directory = args.recording
+        # Base = parametros da TC no inicio da sessao gravada
+        cfg.update(load_meta(directory).get("config") or {})
+    else:
+        directory = build_cache(args.video, cfg, refresh=args.refresh)
+
+    grid = {}
+    for key in SWEPT:
+        spec = getattr(args, key)
+        grid[key] = parse_values(spec, CASTS[key]) if spec is not None else [CASTS[key](cfg[key])]
+    combos = [dict(zip(SWEPT, values)) for values in itertools.product(*(grid[k] for k in SWEPT))]
+    # Parametros fixos da varredura (fluxo, rastreador); ROI ja vem da gravacao
+    fixed = {"flow_mode": cfg["flow_mode"], "tracker_mode": cfg["tracker_mode"]}
+    workers = max(1, min(args.workers, len(combos)))
+    print(f"[SWEEP] {len(combos)} combinacoes em {workers} processo(s) | contagem real={args.expected}")
+
+    started = time.perf_counter()
+    if workers == 1:
+        _init_worker(directory, fixed)
+        rows = [_run_combo(c) for c in combos]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(directory, fixed)) as pool:
+            rows = list(pool.map(_run_combo, combos, chunksize=max(1, len(combos) // (workers * 4))))
+    elapsed = time.perf_counter() - started
+
+    base = {key: CASTS[key](cfg[key]) for key in SWEPT}
+    for row in rows:
+        row["error"] = row["count"] - args.expected
+        # desempate: menos ajustes (-1/retornos/cancelamentos) e mais perto da configuracao atual
+        row["distance"] = sum(abs(row[k] - base[k]) / (abs(base[k]) or 1.0) for k in SWEPT)
+    rows.sort(key=lambda r: (abs(r["error"]), r["adjustments"], r["distance"]))
+    exact = sum(1 for r in rows if r["error"] == 0)
+    print(f"[SWEEP] {elapsed:.1f}s ({len(rows) / max(elapsed, 1e-9):.0f} combinacoes/s); "
+          f"{exact} com a contagem exata")
+
+    header = f"{'#':>4} {'red':>6} {'azul':>6} {'max_lost':>8} {'match':>7} {'min_conf':>8} {'contagem':>8} {'erro':>5} {'ajustes':>7}"
+    print(header)
+    for rank, r in enumerate(rows[:max(1, args.top)], 1):
+        mark = " <- atual" if all(r[k] == base[k] for k in SWEPT) else ""
+        print(f"{rank:>4} {r['line_offset_red']:>6} {r['line_offset_blue']:>6} {r['max_lost']:>8} "
+              f"{r['match_dist']:>7.0f} {r['min_conf']:>8.2f} {r['count']:>8} {r['error']:>+5} {r['adjustments']:>7}{mark}")
+    current = next((i for i, r in enumerate(rows, 1) if all(r[k] == base[k] for k in SWEPT)), None)
+    if current and current > args.top:
+        r = rows[current - 1]
+        print(f"[SWEEP] Configuracao atual em #{current}: contagem={r['count']} erro={r['error']:+d}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as fh:
+            writer = csv.DictWriter(fh, fieldnames=list(SWEPT) + ["count", "error", "adjustments"], extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"[SWEEP] Tabela completa em {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# services/adaptive_rate.py
+import time
+import logging
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+MIN_SLEEP_S = 0.005     # mesma pausa minima que o laco de captura sempre usou
+
+
+class AdaptiveRate:
+    """
+    Ritmo de inferencia de uma TC conforme a atividade da esteira.
+
+    - ativo: ha deteccoes ou rastros (sacaria na ROI ou perto das linhas) ->
+      ate `max_fps` (0 = sem limite, so a pausa minima);
+    - ocioso: sem nada ha `hold_s` segundos -> `idle_fps`.
+
+    O intervalo ocioso nunca passa do tempo que a sacaria mais rapida ja vista
+    leva para ir da borda de entrada da ROI ate a primeira linha de portao
+    (dividido por `safety`), entao a primeira deteccao sempre acontece antes do
+    cruzamento. Enquanto nenhuma sacaria tiver sido medida a TC fica no ritmo ativo.
+    """
+
+    def __init__(self, idle_fps: float = 0.0, max_fps: float = 0.0, hold_s: float = 1.0,
+                 safety: float = 2.0, name: str = ""):
+        self.idle_fps = max(0.0, float(idle_fps or 0))
+        self.max_fps = max(0.0, float(max_fps or 0))
+        if self.max_fps > 0 and self.idle_fps > self.max_fps:
+            self.idle_fps = self.max_fps
+        self.hold_s = max(0.0, float(hold_s))
+        self.safety = max(1.0, float(safety))
+        self.name = name
+        self.enabled = self.idle_fps > 0
+        self.mode = "ativo"
+        self.rate_changes = 0
+        self._last_active = 0.0
+        self._frame_times = deque(maxlen=64)
+        self._speeds = deque(maxlen=256)            # px/s observados (rastros)
+        self._last_seen = {}                        # id -> (cy, t)
+        self.approach_px = None
+
+    # ---------- intervalo ----------
+    def active_interval(self) -> float:
+        return 1.0 / self.max_fps if self.max_fps > 0 else 0.0
+
+    def peak_speed(self) -> float | None:
+        return max(self._speeds) if self._speeds else None
+
+    def idle_interval(self) -> float:
+        interval = 1.0 / self.idle_fps if self.idle_fps > 0 else self.active_interval()
+        speed = self.peak_speed()
+        if self.approach_px and speed:
+            interval = min(interval, self.approach_px / (speed * self.safety))
+        return max(self.active_interval(), interval)
+
+    def _observe_tracks(self, result, now):
+        seen = {}
+        for track_id, (_cx, cy) in zip(result.track_ids.tolist(), result.track_centers.tolist()):
+            prev = self._last_seen.get(track_id)
+            if prev is not None and now > prev[1]:
+                self._speeds.append(abs(cy - prev[0]) / (now - prev[1]))
+            seen[track_id] = (cy, now)
+        self._last_seen = seen
+
+    def after_frame(self, result, started: float, approach_px: float | None = None) -> float:
+        """Registra o frame processado (iniciado em `started`) e retorna quanto dormir."""
+        now = time.monotonic()
+        self._frame_times.append(now)
+        self.approach_px = approach_px
+        if not self.enabled:
+            return MIN_SLEEP_S if self.max_fps <= 0 else max(MIN_SLEEP_S, started + self.active_interval() - now)
+        if len(result.track_ids):
+            self._observe_tracks(result, now)
+        elif self._last_seen:
+            self._last_seen = {}
+        busy = len(result.track_ids) > 0 or len(result.detections) > 0
+        if busy:
+            self._last_active = now
+        # Sem nenhuma velocidade medida ainda nao ha como garantir o intervalo ocioso
+        idle = (not busy and now - self._last_active >= self.hold_s and self.peak_speed() is not None)
+        mode = "ocioso" if idle else "ativo"
+        if mode != self.mode:
+            self.mode = mode
+            self.rate_changes += 1
+            log.info("[CT%s] Ritmo de inferencia: %s (%.1f fps alvo)", self.name, mode, self.target_fps())
+        interval = self.idle_interval() if idle else self.active_interval()
+        return max(MIN_SLEEP_S, started + interval - now)
+
+    # ---------- metricas ----------
+    def target_fps(self) -> float:
+        interval = self.idle_interval() if self.mode == "ocioso" else self.active_interval()
+        return round(1.0 / interval, 2) if interval > 0 else 0.0
+
+    def effective_fps(self) -> float:
+        times = [t for t in self._frame_times if t >= time.monotonic() - 5.0]
+        if len(times) < 2 or times[-1] <= times[0]:
+            return 0.0
+        return round((len(times) - 1) / (times[-1] - times[0]), 2)
+
+    def stats(self) -> dict:
+        speed = self.peak_speed()
+        return {
+            "enabled": self.enabled,
+            "mode": self.mode,
+            "idle_fps": self.idle_fps,
+            "max_fps": self.max_fps,
+            "target_fps": self.target_fps(),
+            "effective_fps": self.effective_fps(),
+            "rate_changes": self.rate_changes,
+            "peak_speed_px_s": round(speed, 1) if speed is not None else None,
+            "approach_px": self.approach_px,
+        }
@@ -1,7 +1,5 @@
 # services/capture_point.py
 
-import cv2
-
 import time
 
 import threading
@@ -10,12 +8,20 @@ import logging
 
 from datetime import datetime
 
-from services.industrial_tag_detector import IndustrialTagDetector
-
-from services.video_source import VideoSource
+from services.inference_engine import get_inference_engine
 
 from services.session_repository import create_session, insert_log, finish_session
 
+from services.tc_repository import normalize_infer_settings, normalize_motion_settings, normalize_rate_settings, normalize_tracker_mode, normalize_model_precision, normalize_frame_policy, normalize_decode_backend
+
+from services.adaptive_rate import AdaptiveRate
+
+from services.event_journal import open_session_journal
+
+from services.cpu_budget import get_cpu_budget
+
+from services.source_pool import source_pool
+
 log = logging.getLogger(__name__)
 
 class CapturePoint:
@@ -94,6 +100,62 @@ class CapturePoint:
 
             self.min_conf = 1.0
 
+        self.infer_mode, self.infer_margin, self.infer_size = normalize_infer_settings(
+
+            config.get("infer_mode", "quadro"),
+
+            config.get("infer_margin", 32),
+
+            config.get("infer_size", 640),
+
+        )
+
+        self.motion_threshold, self.motion_pixel_delta = normalize_motion_settings(
+
+            config.get("motion_threshold", 0.0),
+
+            config.get("motion_pixel_delta", 25),
+
+        )
+
+        self.idle_fps, self.max_fps = normalize_rate_settings(
+
+            config.get("idle_fps", 0.0),
+
+            config.get("max_fps", 0.0),
+
+        )
+
+        self.tracker_mode = normalize_tracker_mode(config.get("tracker_mode", "centroide"))
+
+        self.model_precision = normalize_model_precision(config.get("model_precision", "fp32"))
+
+        # grava as deteccoes filtradas de cada sessao (pasta de snapshots do lote)
+
+        self.record_detections = bool(config.get("record_detections", False))
+
+        # frames entregues ao detector quando ele e mais lento que a camera (ultimo/cada_n/fps/todos)
+
+        self.frame_policy, self.frame_policy_param = normalize_frame_policy(
+
+            config.get("frame_policy", "ultimo"),
+
+            config.get("frame_policy_param", 0),
+
+        )
+
+        # decodificacao: OpenCV (padrao) ou processo ffmpeg com recorte/fps no decodificador
+
+        self.decode_backend = normalize_decode_backend(config.get("decode_backend", "opencv"))
+
+        # decodificador em processo separado (anel em memoria compartilhada)
+
+        self.decode_process = bool(config.get("decode_process", False))
+
+        # ritmo de inferencia adaptado a atividade da esteira
+
+        self.rate = AdaptiveRate(self.idle_fps, self.max_fps, name=ct.get("id"))
+
         # fonte atual (pode ser file para testes na sesso corrente)
 
         self.source_type = self.default_source_type
@@ -102,6 +164,10 @@ class CapturePoint:
 
         self.camera = None
 
+        self.camera_handle = None   # referencia no pool de fontes (TCs na mesma camera dividem o decodificador)
+
+        self.frame_reader = None    # consumidor do anel de frames da camera (sem copia, sem repetir frame)
+
         self.detector = None
 
         self.thread = None
@@ -126,6 +192,10 @@ class CapturePoint:
 
         self.session_contagem_alvo = None
 
+        self.journal = None         # diario de eventos da sessao (DETECTOR_JOURNAL_DIR)
+
+        self.recorder = None        # gravacao das deteccoes da sessao (record_detections)
+
         # contadores
 
         self.current_session_count = 0
@@ -134,23 +204,55 @@ class CapturePoint:
 
         self._base_counter_snapshot = 0
 
-        # ltimo frame anotado p/ /video
+        # ltimo frame anotado p/ /video (apenas com espectadores inscritos)
 
         self.last_vis_frame = None
 
+        self.viewer_count = 0
+
+        self._viewers_lock = threading.Lock()
+
     # ---------- recursos ----------
 
     def _open_sources(self):
 
-        if self.camera:
+        # Imports tardios: OpenCV/NumPy/SciPy e o detector so entram quando a TC inicia
 
-            try: self.camera.release()
+        from services.industrial_tag_detector import IndustrialTagDetector
 
-            except Exception: pass
+        self._release_camera()
+
+        # Anel com folga para a fila da politica 'todos' (slots presos ate o detector consumir)
+
+        if self.decode_process:
+
+            from services.shm_source import default_slots
 
-            self.camera = None
+            from services.video_source import queue_size
 
-        self.camera = VideoSource(self.source_path)
+            slots = default_slots() + (queue_size(self.frame_policy_param) if self.frame_policy == 'todos' else 0)
+
+        else:
+
+            from services.video_source import ring_slots
+
+            slots = ring_slots(self.frame_policy, self.frame_policy_param)
+
+        # TCs na mesma camera com a mesma decodificacao assinam um unico decodificador, sempre
+
+        # no frame inteiro: a ROI (infer_mode) e a politica de frames ficam no leitor/detector de cada TC
+
+        self.camera_handle = source_pool.acquire(self.source_path, self.decode_backend, self.decode_process, slots=slots)
+
+        self.camera = self.camera_handle.source
+
+        self.frame_reader = self.camera.reader(self.frame_policy, self.frame_policy_param)
+
+        # Cria o novo detector antes de soltar o anterior: com o mesmo arquivo de
+
+        # modelo o registro apenas incrementa a referencia (sem recarregar pesos)
+
+        previous = self.detector
 
         self.detector = IndustrialTagDetector(
 
@@ -174,12 +276,34 @@ class CapturePoint:
 
             missed_frame_dir=self.missed_frame_dir,
 
+            infer_mode=self.infer_mode,
+
+            infer_margin=self.infer_margin,
+
+            infer_size=self.infer_size,
+
+            motion_threshold=self.motion_threshold,
+
+            motion_pixel_delta=self.motion_pixel_delta,
+
+            tracker_mode=self.tracker_mode,
+
+            model_precision=self.model_precision,
+
             ct_id=self.ct.get('id'),
 
             ct_name=self.ct.get('name'),
 
+            inference_engine=get_inference_engine(),
+
+            journal=self.journal,
+
+            recorder=self.recorder,
+
         )
 
+        self._release_detector(previous)
+
         if self.session_active and self.session_lote:
 
             try:
@@ -192,6 +316,44 @@ class CapturePoint:
 
         self._apply_cross_point_mode()
 
+    def _release_camera(self):
+
+        """Fecha o leitor da TC e devolve a fonte ao pool (o stream fecha com o ultimo assinante)."""
+
+        reader, handle = self.frame_reader, self.camera_handle
+
+        self.camera = None
+
+        self.camera_handle = None
+
+        self.frame_reader = None
+
+        if reader is not None:
+
+            try: reader.close()
+
+            except Exception: pass
+
+        if handle is not None:
+
+            try: handle.release()
+
+            except Exception: pass
+
+    def _release_detector(self, detector):
+
+        if detector is None:
+
+            return
+
+        try:
+
+            detector.release()
+
+        except Exception:
+
+            pass
+
     def _apply_cross_point_mode(self):
 
         """Garante que o ponto de cruzamento permanea central."""
@@ -220,6 +382,36 @@ class CapturePoint:
 
         def loop():
 
+            engine = get_inference_engine()
+
+            # Sem motor em lote o modelo roda nesta thread: entra na divisao de nucleos
+
+            budget = get_cpu_budget() if engine is None else None
+
+            if engine is not None:
+
+                engine.register(self.ct['id'])
+
+            else:
+
+                budget.register(self.ct['id'])
+
+            try:
+
+                run()
+
+            finally:
+
+                if engine is not None:
+
+                    engine.unregister(self.ct['id'])
+
+                else:
+
+                    budget.unregister(self.ct['id'])
+
+        def run():
+
             while not self.stop_event.is_set():
 
                 try:
@@ -232,21 +424,43 @@ class CapturePoint:
 
                         continue
 
-                    ret, frame = self.camera.get_frame()
+                    reader = self.frame_reader
+
+                    if reader is None:
+
+                        # Fonte sendo trocada/devolvida ao pool por outra thread
+
+                        time.sleep(0.05)
+
+                        continue
+
+                    # Bloqueia ate chegar um frame novo (view somente leitura do anel, sem copia)
 
-                    if not ret or frame is None:
+                    ret, frame, _seq, captured_at = reader.next(timeout=0.5)
 
-                        time.sleep(0.01)
+                    if not ret:
 
                         continue
 
-                    vis, total_counter_abs = self.detector.detect_and_tag(frame)
+                    started = time.monotonic()
 
-                    self.last_vis_frame = vis
+                    detector = self.detector
+
+                    result = detector.process(frame, captured_at=captured_at)
+
+                    # Desenha somente quando ha alguem assistindo /tc/<id>/video
+
+                    if self.viewer_count > 0:
+
+                        self.last_vis_frame = detector.annotate(frame, result)
+
+                    else:
+
+                        self.last_vis_frame = None
 
                     if self.session_active:
 
-                        total_abs = getattr(self.detector, "counter", total_counter_abs)
+                        total_abs = result.counter
 
                         rel_total = int(max(0, total_abs - self._base_counter_snapshot))
 
@@ -256,7 +470,7 @@ class CapturePoint:
 
                             self._log_deltas(rel_total)
 
-                    time.sleep(0.005)
+                    self.stop_event.wait(self.rate.after_frame(result, started, detector.approach_distance_px()))
 
                 except Exception as e:
 
@@ -272,6 +486,58 @@ class CapturePoint:
 
         self.thread.start()
 
+    # ---------- espectadores (/video) ----------
+
+    def add_viewer(self):
+
+        with self._viewers_lock:
+
+            self.viewer_count += 1
+
+    def remove_viewer(self):
+
+        with self._viewers_lock:
+
+            self.viewer_count = max(0, self.viewer_count - 1)
+
+            if self.viewer_count == 0:
+
+                self.last_vis_frame = None
+
+    # ---------- metricas ----------
+
+    def get_metrics(self) -> dict:
+
+        """Resumo de estado/desempenho da TC para ajuste fino (exposto em /tc/<id>/metrics)."""
+
+        return {
+
+            "tc_id": self.ct.get("id"),
+
+            "session_active": self.session_active,
+
+            "thread_alive": bool(self.thread and self.thread.is_alive()),
+
+            "source_type": self.source_type,
+
+            "count": int(self.current_session_count),
+
+            "viewers": self.viewer_count,
+
+            "motion": self.detector.motion_stats() if self.detector is not None else None,
+
+            "rate": self.rate.stats(),
+
+            "frames": self.frame_reader.stats() if self.frame_reader is not None else None,
+
+            "decoder": self.camera.stats() if hasattr(self.camera, "stats") else None,
+
+            "journal": self.journal.stats() if self.journal is not None else None,
+
+            "recording": self.recorder.stats() if self.recorder is not None else None,
+
+        }
+
     # ---------- sesso ----------
 
     def start_session(self, lote: str, contagem_alvo: int | None = None):
@@ -308,6 +574,12 @@ class CapturePoint:
 
                     status_txt = "nao encontrado"
 
+                precision = getattr(detector, "model_precision", "fp32")
+
+                if precision != self.model_precision:
+
+                    precision = f"{precision} (solicitada={self.model_precision}, sem validacao)"
+
                 log_msg = (
 
                     f"[CT{self.ct['id']}] START lote='{lote}' modelo='{load_path}' "
@@ -318,7 +590,17 @@ class CapturePoint:
 
                     f"max_lost={self.max_lost}, match_dist={self.match_dist}, min_conf={self.min_conf}, "
 
-                    f"missed_dir='{self.missed_frame_dir or '-'}')"
+                    f"rastreador={self.tracker_mode}, precisao={precision}, "
+
+                    f"inferencia={self.infer_mode}@{self.infer_size} (margem={self.infer_margin}), "
+
+                    f"movimento={self.motion_threshold}%/{self.motion_pixel_delta}, "
+
+                    f"fps(ocioso={self.idle_fps or '-'}, max={self.max_fps or '-'}), "
+
+                    f"decodificador={self.decode_backend}{' (processo)' if self.decode_process else ''}, frames={self.frame_policy}{'' if self.frame_policy == 'ultimo' else f'({self.frame_policy_param:g})'}, "
+
+                    f"missed_dir='{self.missed_frame_dir or '-'}', gravar_deteccoes={'sim' if self.record_detections else 'nao'})"
 
                 )
 
@@ -372,6 +654,24 @@ class CapturePoint:
 
                     log.warning("[CT%s] Falha ao definir contexto da sessao para snapshots (%s)", self.ct.get('id'), log_err)
 
+            self.journal = open_session_journal(self.ct["id"], lote)
+
+            if self.journal is not None:
+
+                self.journal.write(f"INICIO lote='{lote}'", evento="INICIO", contador=base)
+
+                if self.detector:
+
+                    self.detector.journal = self.journal
+
+            if self.record_detections and self.detector:
+
+                from services.detection_recorder import open_session_recording
+
+                self.recorder = open_session_recording(self.detector.current_session_dir, self.ct["id"], lote, self.detector)
+
+                self.detector.recorder = self.recorder
+
             self._base_counter_snapshot = base
 
             self.current_session_count = 0
@@ -450,6 +750,8 @@ class CapturePoint:
 
         agora = datetime.now()
 
+        quantidade_final = int(self.current_session_count)
+
         try:
 
             if self.session_active:
@@ -520,21 +822,49 @@ class CapturePoint:
 
             self.thread = None
 
-        # Encerra a fonte de vdeo (isso para a thread interna do VideoSource)
+        # Fecha o diario de eventos apos a thread parar (grava o que estiver na fila)
 
-        if self.camera:
+        journal, self.journal = self.journal, None
 
-            try:
+        if self.detector is not None:
 
-                self.camera.release()
+            self.detector.journal = None
 
-            except Exception:
+        if journal is not None:
 
-                pass
+            journal.write("FIM", evento="FIM", quantidade=quantidade_final)
 
-        self.camera = None
+            journal.close()
+
+        recorder, self.recorder = self.recorder, None
+
+        if recorder is not None:
+
+            counter_end = None
+
+            if self.detector is not None:
+
+                self.detector.recorder = None
+
+                counter_end = int(self.detector.counter)
 
-        # Solta o detector para liberar memria GPU/CPU
+            recorder.close(counter_end=counter_end)
+
+        # Garante que os snapshots da sessao chegaram ao disco (gravados em segundo plano)
+
+        from services.snapshot_writer import get_snapshot_writer
+
+        if not get_snapshot_writer().flush(timeout=2.0):
+
+            log.warning("[CT%s] STOP com snapshots ainda pendentes na fila de gravacao", self.ct.get('id'))
+
+        # Devolve a fonte de vdeo ao pool (fecha o stream se nenhuma outra TC o assina)
+
+        self._release_camera()
+
+        # Solta o detector para liberar memria GPU/CPU (o registro descarrega o modelo no ultimo release)
+
+        self._release_detector(self.detector)
 
         self.detector = None
 
@@ -582,13 +912,9 @@ class CapturePoint:
 
             pass
 
-        if self.camera:
-
-            try: self.camera.release()
+        self._release_camera()
 
-            except Exception: pass
-
-        self.camera = None
+        self._release_detector(self.detector)
 
         self.detector = None
 
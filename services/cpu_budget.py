@@ -0,0 +1,156 @@
+# services/cpu_budget.py
+import os
+import threading
+import logging
+
+log = logging.getLogger(__name__)
+
+THREAD_POLICIES = ("global", "split", "pin")
+
+
+def parse_cores(spec: str | None) -> list[int]:
+    """'0-3,6' -> [0, 1, 2, 3, 6]; vazio -> nucleos disponiveis para o processo."""
+    spec = (spec or "").strip()
+    if not spec:
+        if hasattr(os, "sched_getaffinity"):
+            return sorted(os.sched_getaffinity(0))
+        return list(range(os.cpu_count() or 1))
+    cores = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            cores.update(range(int(first), int(last) + 1))
+        else:
+            cores.add(int(part))
+    return sorted(cores)
+
+
+class CpuBudget:
+    """
+    Divide os nucleos da maquina entre as threads que executam o modelo.
+
+    Cada thread de inferencia (loop da TC sem motor em lote, ou a thread do
+    motor em lote) se registra com `register()` e chama `apply()` antes de cada
+    inferencia. Quando o conjunto de threads muda, as fatias sao recalculadas e
+    cada thread aplica a sua na proxima chamada (a configuracao de threads do
+    PyTorch/OpenMP e a afinidade valem para a thread que chama):
+
+      - global: nada e alterado (pool de threads do PyTorch compartilhado);
+      - split:  `torch.set_num_threads(n)` com n = nucleos / threads ativas;
+      - pin:    como split, e a thread fica presa a sua fatia de nucleos
+                (`os.sched_setaffinity`, somente Linux).
+    """
+
+    def __init__(self, policy: str = "global", cores: list[int] | None = None):
+        policy = (policy or "global").strip().lower()
+        self.policy = policy if policy in THREAD_POLICIES else "global"
+        self.cores = list(cores) if cores else parse_cores(None)
+        self.can_pin = hasattr(os, "sched_setaffinity")
+        if self.policy == "pin" and not self.can_pin:
+            log.warning("[CPU] Afinidade de nucleos indisponivel neste sistema; usando a politica 'split'.")
+            self.policy = "split"
+        self._lock = threading.Lock()
+        self._members = []          # chaves na ordem de registro
+        self._slices = {}           # chave -> lista de nucleos
+        self._generation = 0
+        self._local = threading.local()
+        self.rebalances = 0
+        self.applied = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.policy != "global"
+
+    # ---------- membros ----------
+    def register(self, key):
+        with self._lock:
+            if key in self._members:
+                return
+            self._members.append(key)
+            self._rebalance()
+
+    def unregister(self, key):
+        with self._lock:
+            if key not in self._members:
+                return
+            self._members.remove(key)
+            self._rebalance()
+
+    def _rebalance(self):
+        self._slices = {}
+        n = len(self._members)
+        if n:
+            # Fatias contiguas; com mais threads que nucleos, as fatias se repetem
+            per, extra = divmod(len(self.cores), n)
+            start = 0
+            for i, key in enumerate(self._members):
+                size = max(1, per + (1 if i < extra else 0))
+                if start + size > len(self.cores):
+                    start = 0
+                self._slices[key] = self.cores[start:start + size]
+                start += size
+        self._generation += 1
+        self.rebalances += 1
+        if self.enabled:
+            log.info("[CPU] Politica '%s': %d thread(s) de inferencia, nucleos %s", self.policy, n,
+                     {k: f"{v[0]}-{v[-1]}" for k, v in self._slices.items()})
+
+    # ---------- thread de inferencia ----------
+    def apply(self, key):
+        """Aplica a fatia de `key` na thread atual (so quando a divisao mudou)."""
+        if not self.enabled:
+            return
+        local = self._local
+        if getattr(local, "generation", None) == self._generation and getattr(local, "key", None) == key:
+            return
+        with self._lock:
+            generation = self._generation
+            cores = self._slices.get(key)
+        local.generation = generation
+        local.key = key
+        if not cores:
+            return
+        try:
+            import torch
+            torch.set_num_threads(len(cores))
+        except Exception as err:
+            log.warning("[CPU] Falha ao ajustar threads do PyTorch (%s): %s", key, err)
+        if self.policy == "pin":
+            try:
+                os.sched_setaffinity(0, cores)
+            except OSError as err:
+                log.warning("[CPU] Falha ao fixar nucleos %s (%s): %s", cores, key, err)
+        self.applied += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "policy": self.policy,
+                "cores": len(self.cores),
+                "threads": {str(k): {"num_threads": len(v), "cores": v} for k, v in self._slices.items()},
+                "rebalances": self.rebalances,
+                "applied": self.applied,
+            }
+
+
+_budget = None
+_budget_lock = threading.Lock()
+
+
+def get_cpu_budget() -> CpuBudget:
+    """Orcamento compartilhado do processo (INFERENCE_THREAD_POLICY / INFERENCE_CPU_CORES)."""
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            try:
+                cores = parse_cores(os.getenv("INFERENCE_CPU_CORES"))
+            except ValueError:
+                log.warning("[CPU] INFERENCE_CPU_CORES invalido; usando todos os nucleos.")
+                cores = parse_cores(None)
+            _budget = CpuBudget(os.getenv("INFERENCE_THREAD_POLICY", "global"), cores)
+            if _budget.enabled:
+                log.info("[CPU] Orcamento de threads ativo: politica '%s', %d nucleo(s)", _budget.policy, len(_budget.cores))
+        return _budget
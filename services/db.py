@@ -152,6 +152,20 @@ def ensure_schema() -> None:
     execute("ALTER TABLE tc ADD COLUMN IF NOT EXISTS match_dist INTEGER DEFAULT 150;")
     execute("ALTER TABLE tc ADD COLUMN IF NOT EXISTS min_conf NUMERIC(6,4) DEFAULT 0.8000;")
     execute("ALTER TABLE tc ADD COLUMN IF NOT EXISTS missed_frame_dir TEXT;")
+    execute("ALTER TABLE tc ADD COLUMN IF NOT EXISTS infer_mode TEXT DEFAULT 'quadro';")
+    execute("ALTER TABLE tc ADD COLUMN IF NOT EXISTS infer_margin INTEGER DEFAULT 32;")
+    execute("ALTER TABLE tc ADD COLUMN IF NOT EXISTS infer_size INTEGER DEFAULT 640;")
+    execute("ALTER TABLE tc ADD COLUMN IF NOT EXISTS motion_threshold NUMERIC(6,3) DEFAULT 0;")
+    execute("ALTER TABLE tc ADD COLUMN IF NOT EXISTS motion_pixel_delta INTEGER DEFAULT 25;")
+    execute("ALTER TABLE tc ADD COLUMN IF NOT EXISTS idle_fps NUMERIC(6,2) DEFAULT 0;")
+    execute("ALTER TABLE tc ADD COLUMN IF NOT EXISTS max_fps NUMERIC(6,2) DEFAULT 0;")
+    execute("ALTER TABLE tc ADD COLUMN IF NOT EXISTS tracker_mode TEXT DEFAULT 'centroide';")
+    execute("ALTER TABLE tc ADD COLUMN IF NOT EXISTS model_precision TEXT DEFAULT 'fp32';")
+    execute("ALTER TABLE tc ADD COLUMN IF NOT EXISTS record_detections BOOLEAN DEFAULT FALSE;")
+    execute("ALTER TABLE tc ADD COLUMN IF NOT EXISTS frame_policy TEXT DEFAULT 'ultimo';")
+    execute("ALTER TABLE tc ADD COLUMN IF NOT EXISTS frame_policy_param NUMERIC(8,2) DEFAULT 0;")
+    execute("ALTER TABLE tc ADD COLUMN IF NOT EXISTS decode_backend TEXT DEFAULT 'opencv';")
+    execute("ALTER TABLE tc ADD COLUMN IF NOT EXISTS decode_process BOOLEAN DEFAULT FALSE;")
     execute("UPDATE tc SET line_offset_red = 40 WHERE line_offset_red IS NULL;")
     execute("UPDATE tc SET line_offset_blue = -40 WHERE line_offset_blue IS NULL;")
     execute("UPDATE tc SET flow_mode = 'cima' WHERE flow_mode IS NULL OR TRIM(flow_mode) = '';")
@@ -159,6 +173,20 @@ def ensure_schema() -> None:
     execute("UPDATE tc SET match_dist = 150 WHERE match_dist IS NULL;")
     execute("UPDATE tc SET min_conf = 0.8000 WHERE min_conf IS NULL;")
     execute("UPDATE tc SET missed_frame_dir = '' WHERE missed_frame_dir IS NULL;")
+    execute("UPDATE tc SET infer_mode = 'quadro' WHERE infer_mode IS NULL OR TRIM(infer_mode) = '';")
+    execute("UPDATE tc SET infer_margin = 32 WHERE infer_margin IS NULL;")
+    execute("UPDATE tc SET infer_size = 640 WHERE infer_size IS NULL;")
+    execute("UPDATE tc SET motion_threshold = 0 WHERE motion_threshold IS NULL;")
+    execute("UPDATE tc SET motion_pixel_delta = 25 WHERE motion_pixel_delta IS NULL;")
+    execute("UPDATE tc SET idle_fps = 0 WHERE idle_fps IS NULL;")
+    execute("UPDATE tc SET max_fps = 0 WHERE max_fps IS NULL;")
+    execute("UPDATE tc SET tracker_mode = 'centroide' WHERE tracker_mode IS NULL OR TRIM(tracker_mode) = '';")
+    execute("UPDATE tc SET model_precision = 'fp32' WHERE model_precision IS NULL OR TRIM(model_precision) = '';")
+    execute("UPDATE tc SET record_detections = FALSE WHERE record_detections IS NULL;")
+    execute("UPDATE tc SET frame_policy = 'ultimo' WHERE frame_policy IS NULL OR TRIM(frame_policy) = '';")
+    execute("UPDATE tc SET frame_policy_param = 0 WHERE frame_policy_param IS NULL;")
+    execute("UPDATE tc SET decode_backend = 'opencv' WHERE decode_backend IS NULL OR TRIM(decode_backend) = '';")
+    execute("UPDATE tc SET decode_process = FALSE WHERE decode_process IS NULL;")
     execute("CREATE INDEX IF NOT EXISTS idx_tc_active ON tc(active);")
 
     # ---------- user_tc (vínculo N:N) ----------
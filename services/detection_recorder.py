@@ -0,0 +1,256 @@
+# services/detection_recorder.py
+"""
+Gravacao compacta das deteccoes de uma sessao, para auditar contagens.
+
+Cada frame que passa pelo rastreador (depois do filtro de confianca, classe e
+ROI) vira uma linha em arrays colunares; a cada `chunk_frames` frames (ou
+`chunk_seconds`) o bloco e entregue a uma thread que grava um `.npz` na pasta
+da gravacao. Na thread de frames ha apenas append em listas.
+
+Pasta `<pasta da sessao>/deteccoes_<data>/`:
+  - meta.json:          TC, lote, parametros do detector, contador no inicio/fim;
+  - chunk_000000.npz:   frame (int64), ts (float64), n (uint16, deteccoes por frame),
+                        boxes (float32 Dx4: x1, y1, x2, y2), conf (float32 D).
+
+`replay_recording()` passa as deteccoes gravadas pelo mesmo rastreador e
+contador do detector, sem carregar o modelo.
+"""
+import glob
+import json
+import os
+import threading
+import time
+import logging
+from datetime import datetime
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+META_FILE = "meta.json"
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except Exception:
+        return default
+
+
+def _write_json(path: str, data: dict):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def open_session_recording(session_dir: str | None, tc_id, lote: str | None, detector):
+    """Abre a gravacao da sessao em `session_dir` (pasta de snapshots do lote); None se indisponivel."""
+    if not session_dir:
+        log.warning("[Gravacao] TC %s sem pasta de snapshots; deteccoes da sessao nao serao gravadas.", tc_id)
+        return None
+    path = os.path.join(session_dir, f"deteccoes_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    meta = {
+        "tc": tc_id,
+        "lote": lote,
+        "model": getattr(detector, "model_path_for_load", None),
+        "config": detector.tracking_config(),
+        "counter_start": int(detector.counter),
+        "frame_index_start": int(detector.frame_index),
+    }
+    try:
+        recorder = DetectionRecorder(
+            path, meta,
+            chunk_frames=_env_int("DETECTOR_RECORDING_CHUNK_FRAMES", 3000),
+            chunk_seconds=_env_int("DETECTOR_RECORDING_CHUNK_S", 300),
+        )
+    except Exception as err:
+        log.error("[Gravacao] Nao foi possivel abrir a gravacao de deteccoes (%s): %s", path, err)
+        return None
+    log.info("[Gravacao] Deteccoes da TC %s gravadas em %s", tc_id, path)
+    return recorder
+
+
+class DetectionRecorder:
+    """Arrays colunares por bloco de frames, gravados como .npz por uma thread propria."""
+
+    def __init__(self, directory: str, meta: dict, chunk_frames: int = 3000, chunk_seconds: float = 300.0):
+        self.directory = directory
+        self.chunk_frames = max(1, int(chunk_frames))
+        self.chunk_seconds = max(1.0, float(chunk_seconds))
+        os.makedirs(directory, exist_ok=True)
+        self.meta = dict(meta, started_at=datetime.now().isoformat(timespec="seconds"))
+        _write_json(os.path.join(directory, META_FILE), self.meta)
+        self._reset_chunk()
+        self._chunk_index = 0
+        self._lock = threading.Lock()      # record() (thread de frames) x close() (STOP)
+        self._queue = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self.frames = 0
+        self.detections = 0
+        self.chunks = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="detection-recorder", daemon=True)
+        self._thread.start()
+
+    def _reset_chunk(self):
+        self._frame = []
+        self._ts = []
+        self._n = []
+        self._dets = []
+        self._chunk_started = time.monotonic()
+
+    # ---------- thread de frames ----------
+    def record(self, frame_index: int, captured_at: float | None, detections: np.ndarray, frame_shape=None):
+        """Acrescenta as deteccoes filtradas (Nx5) de um frame ao bloco atual."""
+        with self._lock:
+            if self._closed:
+                return
+            if frame_shape is not None and "frame_shape" not in self.meta:
+                self.meta["frame_shape"] = [int(v) for v in frame_shape[:2]]
+            self._frame.append(frame_index)
+            self._ts.append(captured_at if captured_at is not None else time.time())
+            self._n.append(len(detections))
+            if len(detections):
+                self._dets.append(detections)
+            self.frames += 1
+            self.detections += len(detections)
+            if len(self._frame) >= self.chunk_frames or time.monotonic() - self._chunk_started >= self.chunk_seconds:
+                self._submit_chunk()
+
+    def _submit_chunk(self):
+        if not self._frame:
+            return
+        chunk = (self._chunk_index, self._frame, self._ts, self._n, self._dets)
+        self._chunk_index += 1
+        self._reset_chunk()
+        with self._cond:
+            self._queue.append(chunk)
+            self._cond.notify()
+
+    def close(self, counter_end: int | None = None):
+        """Grava o bloco pendente e fecha a gravacao (chamado no STOP da sessao)."""
+        with self._lock:
+            if self._closed:
+                return
+            self._submit_chunk()
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5.0)
+        self.meta.update(
+            finished_at=datetime.now().isoformat(timespec="seconds"),
+            counter_end=counter_end,
+            frames=self.frames,
+            detections=self.detections,
+            chunks=self.chunks,
+        )
+        try:
+            _write_json(os.path.join(self.directory, META_FILE), self.meta)
+        except Exception as err:
+            log.error("[Gravacao] Falha ao atualizar %s: %s", META_FILE, err)
+
+    def stats(self) -> dict:
+        with self._cond:
+            pending = len(self._queue)
+        return {
+            "path": self.directory,
+            "frames": self.frames,
+            "detections": self.detections,
+            "chunks": self.chunks,
+            "pending": pending,
+            "errors": self.errors,
+        }
+
+    # ---------- thread de gravacao ----------
+    def _write_chunk(self, chunk):
+        index, frames, ts, counts, dets = chunk
+        boxes = np.concatenate(dets).astype(np.float32, copy=False) if dets else np.zeros((0, 5), np.float32)
+        path = os.path.join(self.directory, f"chunk_{index:06d}.npz")
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "wb") as fh:
+                np.savez(
+                    fh,
+                    frame=np.asarray(frames, dtype=np.int64),
+                    ts=np.asarray(ts, dtype=np.float64),
+                    n=np.asarray(counts, dtype=np.uint16),
+                    boxes=np.ascontiguousarray(boxes[:, :4]),
+                    conf=np.ascontiguousarray(boxes[:, 4]),
+                )
+            os.replace(tmp, path)
+            self.chunks += 1
+        except Exception as err:
+            self.errors += 1
+            log.error("[Gravacao] Falha ao gravar %s: %s", path, err)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                queue, self._queue = self._queue, []
+                closed = self._closed
+            for chunk in queue:
+                self._write_chunk(chunk)
+            if closed and not queue:
+                return
+
+
+# ---------- leitura / replay ----------
+def load_meta(directory: str) -> dict:
+    with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def iter_recorded_frames(directory: str):
+    """(frame, ts, deteccoes Nx5) de cada frame gravado, na ordem."""
+    for path in sorted(glob.glob(os.path.join(directory, "chunk_*.npz"))):
+        with np.load(path) as data:
+            frames, ts, counts = data["frame"], data["ts"], data["n"]
+            dets = np.concatenate((data["boxes"], data["conf"][:, None]), axis=1)
+        offsets = np.concatenate(([0], np.cumsum(counts, dtype=np.int64)))
+        for i in range(frames.size):
+            yield int(frames[i]), float(ts[i]), dets[offsets[i]:offsets[i + 1]]
+
+
+def replay_recording(directory: str, **overrides) -> dict:
+    """
+    Reexecuta rastreamento e contagem sobre as deteccoes gravadas (sem modelo).
+    `overrides` troca parametros do detector (ex.: max_lost=3) para comparar.
+    """
+    return replay_detections(load_meta(directory), list(iter_recorded_frames(directory)), **overrides)
+
+
+def replay_detections(meta: dict, frames: list, **overrides) -> dict:
+    """Replay sobre frames ja carregados (`iter_recorded_frames`), para varias rodadas no mesmo processo."""
+    from services.industrial_tag_detector import IndustrialTagDetector
+
+    config = dict(meta.get("config") or {})
+    config.update(overrides)
+    config["roi"] = tuple(int(v) for v in config.get("roi") or (0, 0, 0, 0))
+    detector = IndustrialTagDetector(meta.get("model") or "sacaria_yolov5n.pt", load_model=False,
+                                     missed_frame_dir=None, ct_id=meta.get("tc"), **config)
+    counter_start = int(meta.get("counter_start") or 0)
+    detector.counter = counter_start
+    frame_shape = tuple(meta.get("frame_shape") or (0, 0))
+    events = []
+    for frame_index, ts, dets in frames:
+        detector.frame_index = frame_index
+        # Deteccoes gravadas ja sao da classe alvo: completa a coluna de classe (0)
+        raw = np.zeros((dets.shape[0], 6), dtype=np.float32)
+        raw[:, :5] = dets
+        result = detector.track(raw, frame_shape, captured_at=ts)
+        events.extend(result.events)
+    detector.release()
+    recorded_end = meta.get("counter_end")
+    return {
+        "frames": len(frames),
+        "count": detector.counter - counter_start,
+        "recorded_count": (int(recorded_end) - counter_start) if recorded_end is not None else None,
+        "events": events,
+        "config": config,
+        "meta": meta,
+    }
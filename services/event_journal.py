@@ -0,0 +1,169 @@
+# services/event_journal.py
+import json
+import os
+import threading
+import time
+import logging
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+JOURNAL_FORMATS = ("jsonl", "text")
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except Exception:
+        return default
+
+
+def _json_default(value):
+    # escalares numpy (ids de rastro, contadores) viram numeros nativos
+    item = getattr(value, "item", None)
+    return item() if callable(item) else str(value)
+
+
+def journal_dir() -> str | None:
+    """Pasta dos diarios de eventos por sessao (DETECTOR_JOURNAL_DIR); None = desativado."""
+    path = (os.getenv("DETECTOR_JOURNAL_DIR") or "").strip()
+    return path or None
+
+
+def open_session_journal(tc_id, lote: str | None):
+    """Abre o diario da sessao em DETECTOR_JOURNAL_DIR (tc<id>_<lote>_<data>.jsonl); None se desativado/falhar."""
+    base = journal_dir()
+    if not base:
+        return None
+    fmt = (os.getenv("DETECTOR_JOURNAL_FORMAT") or "jsonl").strip().lower()
+    if fmt not in JOURNAL_FORMATS:
+        fmt = "jsonl"
+    safe = "".join(ch if ch.isalnum() or ch in ("-", "_") else "_" for ch in (lote or "").strip()).strip("_")
+    name = f"tc{tc_id}_{safe or 'sem_lote'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    path = os.path.join(base, name + (".jsonl" if fmt == "jsonl" else ".log"))
+    try:
+        journal = EventJournal(path, fmt=fmt, flush_interval_s=_env_float("DETECTOR_JOURNAL_FLUSH_S", 1.0),
+                               context={"tc": tc_id, "lote": lote})
+    except Exception as err:
+        log.error("[Journal] Nao foi possivel abrir o diario de eventos (%s): %s", path, err)
+        return None
+    log.info("[Journal] Diario de eventos da TC %s em %s", tc_id, path)
+    return journal
+
+
+class EventJournal:
+    """
+    Diario de eventos do detector com um unico arquivo aberto.
+
+    `write()` so enfileira em memoria (nenhuma E/S na thread de frames); uma
+    thread grava o lote quando a fila passa de `flush_bytes` ou a cada
+    `flush_interval_s`. `close()` grava o restante e fecha o arquivo.
+
+    Formatos:
+      - jsonl: um objeto JSON por linha, com o horario de captura do frame (`ts`);
+      - text:  apenas a mensagem, uma por linha (formato antigo do `log_file`).
+    """
+
+    def __init__(self, path: str, fmt: str = "jsonl", flush_bytes: int = 64 * 1024,
+                 flush_interval_s: float = 1.0, context: dict | None = None):
+        self.path = path
+        self.context = dict(context or {})   # campos fixos de cada registro (ex.: tc, lote)
+        self.fmt = fmt if fmt in JOURNAL_FORMATS else "jsonl"
+        self.flush_bytes = max(1, int(flush_bytes))
+        self.flush_interval_s = max(0.05, float(flush_interval_s))
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._fh = open(path, "a", encoding="utf-8", newline="\n")
+        self._pending = []
+        self._pending_bytes = 0
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._closed = False
+        self.events = 0
+        self.late = 0               # eventos recebidos depois do close() (descartados)
+        self.flushes = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name="event-journal", daemon=True)
+        self._thread.start()
+
+    # ---------- API ----------
+    def write(self, message: str, captured_at: float | None = None, **fields):
+        """Enfileira um evento; `captured_at` e o horario (epoch) em que o frame foi capturado."""
+        if self.fmt == "text":
+            line = message + "\n"
+        else:
+            ts = captured_at if captured_at is not None else time.time()
+            record = {"ts": round(ts, 3), "hora": datetime.fromtimestamp(ts).isoformat(timespec="milliseconds")}
+            record.update(self.context)
+            record.update(fields)
+            record["msg"] = message
+            line = json.dumps(record, ensure_ascii=False, default=_json_default) + "\n"
+        with self._cond:
+            # Verificado junto com o append: nada entra na fila depois do flush final do close()
+            if self._closed:
+                self.late += 1
+                if self.late == 1:
+                    log.warning("[Journal] Evento apos o fechamento de %s descartado: %s", self.path, message)
+                return
+            self._pending.append(line)
+            self._pending_bytes += len(line)
+            self.events += 1
+            if self._pending_bytes >= self.flush_bytes:
+                self._cond.notify()
+
+    def flush(self):
+        with self._cond:
+            lines, self._pending = self._pending, []
+            self._pending_bytes = 0
+        if not lines:
+            return
+        with self._io_lock:
+            if self._fh is None:
+                return
+            try:
+                self._fh.write("".join(lines))
+                self._fh.flush()
+                self.flushes += 1
+            except Exception as err:
+                self.errors += 1
+                log.error("[Journal] Falha ao gravar %d evento(s) em %s: %s", len(lines), self.path, err)
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self.flush()
+        with self._io_lock:
+            fh, self._fh = self._fh, None
+        if fh is not None:
+            try:
+                fh.close()
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "path": self.path,
+                "format": self.fmt,
+                "events": self.events,
+                "late": self.late,
+                "pending": len(self._pending),
+                "flushes": self.flushes,
+                "errors": self.errors,
+            }
+
+    # ---------- thread ----------
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and self._pending_bytes < self.flush_bytes:
+                    self._cond.wait(self.flush_interval_s)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
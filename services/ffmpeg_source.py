@@ -0,0 +1,242 @@
+# services/ffmpeg_source.py
+"""
+Fonte de video decodificada por um processo `ffmpeg` (alternativa ao OpenCV).
+
+O ffmpeg le a URL RTSP ou o arquivo e ja aplica no decodificador o recorte
+(ROI + margem), a escala e o limite de fps; a saida `rawvideo` BGR vem pelo
+pipe direto para os buffers do anel de frames (sem alocar um frame por
+leitura). Com cameras de alta resolucao e inferencia na ROI, a conversao de
+cor e a copia passam a tratar so os pixels usados.
+
+Mesma interface do VideoSource (reader(), get_frame(), read_next(), release()).
+Os frames entregues comecam em `offset` (x, y) do frame original: quem usa o
+recorte precisa transladar a ROI (ver `translate_roi`).
+
+Binario: VIDEO_FFMPEG_BIN (padrao `ffmpeg` no PATH).
+"""
+import os
+import re
+import subprocess
+import threading
+import time
+import logging
+from collections import deque
+
+import numpy as np
+
+from services.video_source import VideoSource
+
+log = logging.getLogger(__name__)
+
+_VIDEO_SIZE = re.compile(r"Stream #\S+.*?: Video: .*?\b(\d{2,5})x(\d{2,5})\b")
+_VIDEO_FPS = re.compile(r"Stream #\S+.*?: Video: .*?\b(\d+(?:\.\d+)?) fps\b")
+_NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)     # servico Windows: sem console do ffmpeg
+
+
+def ffmpeg_bin() -> str:
+    return (os.getenv("VIDEO_FFMPEG_BIN") or "ffmpeg").strip()
+
+
+def roi_crop(roi, margin: int):
+    """Recorte pedido ao decodificador para inferencia na ROI: ROI + margem (x, y, w, h); None sem ROI."""
+    if not roi:
+        return None
+    x, y, w, h = (int(v) for v in roi)
+    if w <= 0 or h <= 0:
+        return None
+    return x - margin, y - margin, w + 2 * margin, h + 2 * margin
+
+
+def translate_roi(roi, offset):
+    """ROI no sistema de coordenadas do frame recortado."""
+    x, y, w, h = roi
+    return x - offset[0], y - offset[1], w, h
+
+
+def probe_video(path: str, timeout: float = 20.0):
+    """((largura, altura), fps) do video pela saida de `ffmpeg -i`; (None, None) se nao abrir."""
+    cmd = [ffmpeg_bin(), "-hide_banner"]
+    if path.lower().startswith("rtsp"):
+        cmd += ["-rtsp_transport", "tcp"]
+    cmd += ["-i", path]
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout, creationflags=_NO_WINDOW)
+    except (OSError, subprocess.TimeoutExpired) as err:
+        log.warning("[ffmpeg] Falha ao consultar '%s': %s", path, err)
+        return None, None
+    m = _VIDEO_SIZE.search(proc.stderr or "")
+    f = _VIDEO_FPS.search(proc.stderr or "")
+    return ((int(m.group(1)), int(m.group(2))) if m else None), (float(f.group(1)) if f else None)
+
+
+class FfmpegVideoSource(VideoSource):
+    """
+    VideoSource com decodificacao em um processo ffmpeg.
+
+    crop:  (x, y, w, h) no frame original; limitado ao frame e alinhado em pixels pares.
+    scale: (largura, altura) de saida apos o recorte (None = sem escala). Muda a escala
+           das coordenadas: a ROI e os parametros em pixels da TC deixam de valer.
+    fps:   limite de frames por segundo aplicado no decodificador (None = todos).
+    slots: tamanho do anel de frames (None = VIDEO_RING_SLOTS).
+    paced: arquivo no ritmo nativo e em loop (padrao = realtime); com realtime=False e
+           paced=True o chamador le em ritmo de camera sem a thread de captura.
+    """
+
+    def __init__(self, source_path, realtime=True, crop=None, scale=None, fps=None, slots=None, paced=None):
+        self._init_state(source_path, realtime, slots)
+        self.paced = realtime if paced is None else bool(paced)
+        self.proc = None
+        self.delay = 0
+        self._stderr = deque(maxlen=20)
+        self.input_size, self.input_fps = probe_video(source_path)
+        self.video_fps = self.input_fps     # fps dos frames entregues (None se o ffmpeg nao informar)
+        if self.input_size is None:
+            print(f"[ERRO] Não foi possível abrir a fonte de vídeo (ffmpeg): {source_path}")
+            return
+        filters = []
+        out_w, out_h = self.input_size
+        if crop is not None:
+            x, y, w, h = self._clip_crop(crop, self.input_size)
+            if (x, y, w, h) != (0, 0, out_w, out_h):
+                filters.append(f"crop={w}:{h}:{x}:{y}")
+                self.offset = (x, y)
+                out_w, out_h = w, h
+        if scale is not None:
+            out_w, out_h = (max(2, int(v) // 2 * 2) for v in scale)
+            filters.append(f"scale={out_w}:{out_h}")
+        if fps:
+            self.video_fps = float(fps)
+            filters.append(f"fps={float(fps):g}")
+        self.frame_size = (out_w, out_h)
+        self.frame_bytes = out_w * out_h * 3
+        self.filters = ",".join(filters)
+        self._start_decoder()
+        if self.proc is None:
+            return
+        log.info("[ffmpeg] '%s' %dx%d -> %dx%d (filtros: %s)", source_path, self.input_size[0],
+                 self.input_size[1], out_w, out_h, self.filters or "nenhum")
+        if not realtime:
+            return
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def _clip_crop(crop, size):
+        """Recorte dentro do frame, com x/y/w/h pares (o crop do ffmpeg arredonda x/y no YUV 4:2:0)."""
+        x, y, w, h = (int(v) for v in crop)
+        x1, y1 = min(size[0], x + w), min(size[1], y + h)
+        x, y = max(0, x) // 2 * 2, max(0, y) // 2 * 2
+        w = min(size[0] - x, (x1 - x + 1) // 2 * 2)
+        h = min(size[1] - y, (y1 - y + 1) // 2 * 2)
+        return x, y, w, h
+
+    def is_opened(self) -> bool:
+        return self.proc is not None
+
+    def _command(self):
+        cmd = [ffmpeg_bin(), "-hide_banner", "-loglevel", "error", "-nostdin"]
+        if not self.is_file:
+            cmd += ["-rtsp_transport", "tcp"]
+        elif self.paced:
+            # Arquivo em tempo real: ritmo nativo do video e reinicio no fim (como o VideoSource)
+            cmd += ["-re", "-stream_loop", "-1"]
+        cmd += ["-i", self.source_path, "-an", "-sn"]
+        if self.filters:
+            cmd += ["-vf", self.filters]
+        return cmd + ["-pix_fmt", "bgr24", "-f", "rawvideo", "pipe:1"]
+
+    def _start_decoder(self):
+        try:
+            self.proc = subprocess.Popen(self._command(), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                         stdin=subprocess.DEVNULL, bufsize=self.frame_bytes,
+                                         creationflags=_NO_WINDOW)
+        except OSError as err:
+            print(f"[ERRO] Não foi possível iniciar o ffmpeg ({ffmpeg_bin()}): {err}")
+            self.proc = None
+            return
+        threading.Thread(target=self._drain_stderr, args=(self.proc,), daemon=True).start()
+
+    def _drain_stderr(self, proc):
+        for line in iter(proc.stderr.readline, b""):
+            self._stderr.append(line.decode("utf-8", "replace").strip())
+
+    def _stop_decoder(self):
+        proc, self.proc = self.proc, None
+        if proc is None:
+            return
+        try:
+            proc.kill()
+            proc.wait(timeout=2.0)
+        except Exception:
+            pass
+
+    def _read_into(self, buffer):
+        """Le um frame do pipe direto no buffer (aloca na primeira vez); (False, None) no fim do pipe."""
+        proc = self.proc
+        if proc is None:
+            return False, None
+        w, h = self.frame_size
+        if buffer is None or buffer.shape != (h, w, 3):
+            buffer = np.empty((h, w, 3), dtype=np.uint8)
+        view = memoryview(buffer).cast("B")
+        filled = 0
+        while filled < self.frame_bytes:
+            n = proc.stdout.readinto(view[filled:])
+            if not n:
+                return False, None
+            filled += n
+        return True, buffer
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            slot = self._claim_slot()
+            if slot is None and self.stop_event.is_set():
+                break
+            try:
+                ret, frame = self._read_into(slot.buffer if slot is not None else self._scratch)
+            except Exception as e:
+                if self.stop_event.is_set():
+                    break
+                ret, frame = False, None
+                print(f"[ffmpeg] Exceção na leitura: {e}")
+            with self.lock:
+                self.ret = ret
+                if ret and slot is None:
+                    # Stream com todos os slots presos: o pipe segue sendo esvaziado, o frame e descartado
+                    self._scratch = frame
+                    self.ring_dropped += 1
+                elif ret:
+                    self._publish_locked(slot, frame)
+            if ret or self.stop_event.is_set():
+                continue
+            # Fim do pipe: ffmpeg caiu (camera fora, rede) - reinicia apos uma pausa
+            last = self._stderr[-1] if self._stderr else "sem mensagem"
+            print(f"[ffmpeg] Decodificador encerrado ({last}); reconectando em 1s.")
+            self._stop_decoder()
+            if self.stop_event.wait(1.0):
+                break
+            self._start_decoder()
+
+    def read_next(self):
+        """Decodifica o próximo frame na thread chamadora (somente com realtime=False)."""
+        ret, frame = self._read_into(None)
+        self.ret = ret
+        if ret:
+            self.frame = frame
+            self.frame_time = time.time()
+        return ret, frame
+
+    def release(self):
+        try:
+            self.stop_event.set()
+            with self.cond:
+                self.cond.notify_all()
+        except Exception:
+            pass
+        # Encerra o ffmpeg antes do join: a thread pode estar bloqueada lendo o pipe
+        self._stop_decoder()
+        try:
+            if self.thread and self.thread.is_alive():
+                self.thread.join(timeout=1.0)
+        except Exception:
+            pass
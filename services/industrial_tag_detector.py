@@ -1,17 +1,31 @@
 import cv2
 
-import torch
-
 from datetime import datetime
 
 import os
 
 import numpy as np
 
-import sys
+import time
 
 import logging
 
+from dataclasses import dataclass, field
+
+from services.model_registry import model_registry, resolve_model_path
+
+from services.motion_gate import MotionGate
+
+from services.snapshot_writer import get_snapshot_writer
+
+from services.event_journal import EventJournal
+
+from services.cpu_budget import get_cpu_budget
+
+from services.quantization import approved_int8_model
+
+from services.tracker import make_tracker
+
 # Supressao de avisos do PyTorch/YOLO
 
 import warnings
@@ -20,6 +34,57 @@ warnings.filterwarnings('ignore')
 
 log = logging.getLogger(__name__)
 
+@dataclass
+class CountEvent:
+    track_id: int
+    delta: int      # +1 soma, -1 subtrai, 0 (retorno/cancelamento)
+    kind: str       # RECONHECIMENTO | CICLO | CANCELAMENTO
+    message: str
+
+@dataclass
+class DetectionResult:
+    """Resultado compacto de um frame: deteccoes filtradas, estado dos rastros e eventos de contagem."""
+    counter: int
+    detections: np.ndarray          # Nx5 (x1, y1, x2, y2, conf) ja filtradas
+    track_ids: np.ndarray
+    track_boxes: np.ndarray         # Nx4
+    track_centers: np.ndarray       # Nx2 (cx, cy)
+    track_counted: np.ndarray
+    track_direction: np.ndarray
+    events: list = field(default_factory=list)
+    frame_shape: tuple = ()
+
+    @classmethod
+    def empty(cls, counter: int, frame_shape=()):
+        return cls(
+            counter=counter,
+            detections=np.empty((0, 5), dtype=np.float32),
+            track_ids=np.empty(0, dtype=np.int64),
+            track_boxes=np.empty((0, 4), dtype=np.float32),
+            track_centers=np.empty((0, 2), dtype=np.float32),
+            track_counted=np.empty(0, dtype=np.int8),
+            track_direction=np.empty(0, dtype=np.int8),
+            frame_shape=tuple(frame_shape),
+        )
+
+def _crossed(prev: float, curr: float, line: float, direction: str) -> bool:
+    if line is None:
+        return False
+    if direction == "up":
+        return prev > line >= curr
+    if direction == "down":
+        return prev < line <= curr
+    return False
+
+def _reversed_cross(prev: float, curr: float, line: float, direction: str, margin: float) -> bool:
+    if line is None:
+        return False
+    if direction == "up":
+        return prev < line and curr >= line + margin
+    if direction == "down":
+        return prev > line and curr <= line - margin
+    return False
+
 class IndustrialTagDetector:
 
     def __init__(self, model_path='sacaria_yolov5n.pt', roi=(0, 0, 0, 0), log_file=None, match_dist=150,
@@ -28,7 +93,15 @@ class IndustrialTagDetector:
 
                  flow_mode: str = 'cima', max_lost: int = 2, min_conf: float = 0.8,
 
-                 missed_frame_dir: str | None = None, ct_id: int | None = None, ct_name: str | None = None):
+                 missed_frame_dir: str | None = None, ct_id: int | None = None, ct_name: str | None = None,
+
+                 inference_engine=None, infer_mode: str = 'quadro', infer_margin: int = 32,
+
+                 infer_size: int = 640, motion_threshold: float = 0.0, motion_pixel_delta: int = 25,
+
+                 snapshot_writer=None, journal=None, tracker_mode: str = 'centroide',
+
+                 model_precision: str = 'fp32', recorder=None, load_model: bool = True):
 
         # 1. Configuraaes do Modelo e Ambiente (uso local do YOLOv5)
 
@@ -121,69 +194,25 @@ class IndustrialTagDetector:
 
                 self.missed_frame_dir = None
 
-        try:
-
-            # Evita qualquer tentativa de auto-instalaao de dependaancias pelo YOLOv5
-
-            os.environ.setdefault('YOLOV5_NO_AUTOINSTALL', '1')
-
-            # Caminho local para o repositario YOLOv5 dentro do projeto
-
-            project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-
-            yolo_dir = os.path.join(project_root, 'third_party', 'yolov5')
-
-            if not os.path.isdir(yolo_dir):
+        self._model_handle = None
 
-                raise FileNotFoundError(f"Diretorio YOLOv5 nao encontrado: {yolo_dir}")
+        self.model = None
 
-            model_candidate = model_path or ""
+        self.device = None
 
-            search_candidates = []
+        # Precisao efetiva: 'int8' so com validacao aprovada para esta TC (scripts/quantize_int8.py)
 
-            if model_candidate:
+        self.model_precision = 'fp32'
 
-                if os.path.isabs(model_candidate):
-
-                    search_candidates.append(model_candidate)
-
-                else:
-
-                    search_candidates.append(os.path.join(project_root, model_candidate))
-
-                    search_candidates.append(os.path.abspath(model_candidate))
-
-                    search_candidates.append(model_candidate)
-
-            else:
-
-                search_candidates.append(model_candidate)
-
-            resolved_path = None
-
-            for candidate in search_candidates:
-
-                if candidate and os.path.isfile(candidate):
-
-                    resolved_path = candidate
-
-                    break
-
-            if resolved_path is None:
-
-                resolved_path = search_candidates[0] if search_candidates else model_candidate
-
-            if resolved_path:
-
-                resolved_path = os.path.normpath(resolved_path)
+        try:
 
-            exists = bool(resolved_path and os.path.isfile(resolved_path))
+            resolved_path, exists, path_for_load = resolve_model_path(model_path)
 
             self.model_path_resolved = resolved_path
 
             self.model_path_exists = exists
 
-            self.model_path_for_load = resolved_path if exists else (model_path or resolved_path or "")
+            self.model_path_for_load = path_for_load
 
             log.info(
 
@@ -207,27 +236,33 @@ class IndustrialTagDetector:
 
                 )
 
-            # Carrega o modelo a partir do repositario local
+            if (model_precision or 'fp32').strip().lower() == 'int8':
 
-            # Requer que exista um 'hubconf.py' em yolo_dir (ja presente no repo oficial)
+                int8_path, reason = approved_int8_model(resolved_path, ct_id) if exists else (None, "modelo fp32 nao encontrado")
 
-            self.model = torch.hub.load(
+                if int8_path:
 
-                yolo_dir,
+                    log.info("[Detector] Usando modelo int8 validado: %s", int8_path)
 
-                'custom',
+                    self.model_path_for_load = int8_path
 
-                path=self.model_path_for_load,
+                    self.model_precision = 'int8'
 
-                source='local',
+                else:
 
-                force_reload=False
+                    log.warning("[Detector] Modelo int8 nao liberado para a TC %s (%s); usando fp32.", ct_id, reason)
 
-            )
+            # Modelo compartilhado entre TCs (um carregamento por arquivo/mtime no processo);
+
+            # load_model=False: somente rastreamento/contagem (replay de deteccoes gravadas)
+
+            if load_model:
 
-            self.model.eval()
+                self._model_handle = model_registry.acquire(self.model_path_for_load)
 
-            self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+                self.model = self._model_handle.model
+
+                self.device = self._model_handle.device
 
         except Exception as e:
 
@@ -241,9 +276,12 @@ class IndustrialTagDetector:
 
         self.counter = 0
 
-        self.tracked_objects = {}
+        # Rastros em arrays NumPy com associacao otima (services/tracker.py);
+        # 'kalman' associa pela posicao prevista (velocidade constante)
+
+        self.tracker_mode = (tracker_mode or 'centroide').strip().lower()
 
-        self.next_id = 1
+        self.tracker = make_tracker(self.tracker_mode, match_dist=self.match_dist, max_lost=self.max_lost)
 
         # AJUSTES CRaTICOS DE ESTABILIDADE
 
@@ -285,25 +323,93 @@ class IndustrialTagDetector:
 
         self.cross_point_mode = m
 
-        # Log
+        # Overlay estatico (ROI/linhas) renderizado uma vez por tamanho de frame
+
+        self._overlay_cache = {}
+
+        # Snapshots de nao contadas gravados em segundo plano (services/snapshot_writer.py)
+
+        self.snapshot_writer = snapshot_writer if snapshot_writer is not None else get_snapshot_writer()
+
+        # Log de eventos: diario bufferizado (um arquivo aberto, gravado por thread propria)
 
         self.log_file = log_file
 
-    def _log(self, message):
+        self._owns_journal = journal is None and bool(log_file)
 
-        """Escreve a mensagem no arquivo de log temporario."""
+        self.journal = EventJournal(log_file, fmt="text") if self._owns_journal else journal
 
-        if self.log_file:
+        self._captured_at = None
 
-            try:
+        # Motor de inferencia em lote compartilhado (opcional)
+
+        self.inference_engine = inference_engine
+
+        # Divisao de nucleos entre as threads que rodam o modelo (services/cpu_budget.py)
+
+        self.cpu_budget = get_cpu_budget()
+
+        self.inference_key = ct_id if ct_id is not None else id(self)
+
+        # Area de inferencia: 'quadro' (frame inteiro) ou 'roi' (recorte ROI + margem)
+
+        self.infer_mode = (infer_mode or 'quadro').strip().lower()
+
+        if self.infer_mode not in ('quadro', 'roi'):
+
+            self.infer_mode = 'quadro'
+
+        try:
+
+            self.infer_margin = max(0, int(infer_margin))
+
+        except Exception:
+
+            self.infer_margin = 32
+
+        try:
+
+            self.infer_size = int(infer_size)
+
+        except Exception:
+
+            self.infer_size = 640
+
+        if self.infer_size <= 0:
+
+            self.infer_size = 640
+
+        # Portao de movimento (0 = desativado): pula o modelo com a esteira parada e sem rastros
+
+        try:
+
+            motion_threshold = float(motion_threshold or 0)
+
+        except Exception:
+
+            motion_threshold = 0.0
+
+        self.motion_gate = MotionGate(motion_threshold, motion_pixel_delta) if motion_threshold > 0 else None
 
-                with open(self.log_file, 'a', encoding='utf-8') as f:
+        self.frames_inferred = 0
 
-                    f.write(message + '\n')
+        # Gravacao compacta das deteccoes filtradas da sessao (services/detection_recorder.py)
 
-            except Exception as e:
+        self.recorder = recorder
 
-                print(f"[ERRO LOG] Falha ao escrever no log: {e}")
+        self.frame_index = 0
+
+        self._idle_result = None
+
+    def _log(self, message, **fields):
+
+        """Enfileira a mensagem no diario de eventos (sem E/S na thread de frames)."""
+
+        journal = self.journal
+
+        if journal is not None:
+
+            journal.write(message, captured_at=self._captured_at, **fields)
 
     def set_session_context(self, lote: str | None):
         if lote is None:
@@ -336,28 +442,25 @@ class IndustrialTagDetector:
         self.current_session_dir = session_dir
         log.info("Snapshots de nao contadas ativos em %s", session_dir)
 
-    def _save_not_counted_snapshot(self, frame_with_box, obj, obj_id):
+    @property
+    def tracked_objects(self):
+        """Visao {id: campos} dos rastros atuais (somente leitura)."""
+        return self.tracker.as_dict()
+
+    @property
+    def next_id(self):
+        return self.tracker.next_id
+
+    def _save_not_counted_snapshot(self, frame_with_box, box, obj_id):
+        """Agenda a foto da sacaria nao contada no escritor em segundo plano (nao bloqueia o laco)."""
         if frame_with_box is None:
             log.warning("Snapshot nao salvo (frame vazio) para obj %s", obj_id)
             return
         target_dir = self.current_session_dir or self.missed_frame_dir
         if not target_dir:
             return
-        if obj.get("snapshot_saved"):
-            return
         try:
-            os.makedirs(target_dir, exist_ok=True)
-        except PermissionError as err:
-            log.error("Sem permissao para gravar snapshots (%s): %s", target_dir, err)
-            return
-        except Exception as err:
-            log.warning("Nao foi possivel garantir pasta de snapshots (%s): %s", target_dir, err)
-            return
-        try:
-            x1 = int(obj.get("x1", obj.get("prev_x1", 0)))
-            y1 = int(obj.get("y1", obj.get("prev_y1", 0)))
-            x2 = int(obj.get("x2", obj.get("prev_x2", 0)))
-            y2 = int(obj.get("y2", obj.get("prev_y2", 0)))
+            x1, y1, x2, y2 = (int(v) for v in box)
         except Exception as err:
             log.warning("Snapshot nao salvo (coordenadas invalidas) para obj %s: %s", obj_id, err)
             return
@@ -369,434 +472,334 @@ class IndustrialTagDetector:
         if x2 <= x1 or y2 <= y1:
             log.warning("Snapshot nao salvo (recorte invalido) para obj %s", obj_id)
             return
-        frame_to_save = frame_with_box.copy()
-        try:
-            cv2.rectangle(frame_to_save, (x1, y1), (x2, y2), (255, 0, 0), 2)
-        except Exception:
-            pass
         lote_part = self.current_session_lote or "sem_lote"
         timestamp = datetime.now().strftime("%H%M%S")
-        base_name = f"{lote_part}_{timestamp}_id{obj_id}"
-        suffix = 0
-        while True:
-            name = base_name if suffix == 0 else f"{base_name}_{suffix}"
-            path_file = os.path.join(target_dir, f"{name}.jpg")
-            if not os.path.exists(path_file):
-                break
-            suffix += 1
-        try:
-            cv2.imwrite(path_file, frame_to_save)
-            obj["snapshot_saved"] = True
-            log.info("Snapshot nao contado salvo: %s", path_file)
-        except PermissionError as err:
-            log.error("Sem permissao para gravar snapshots (%s): %s", path_file, err)
-        except Exception as err:
-            log.warning("Falha ao salvar imagem de sacaria nao contada (%s): %s", path_file, err)
-
-    def detect_and_tag(self, frame):
-
-        """Executa a detecao, rastreamento, contagem e desenha no frame."""
-
+        writer = self.snapshot_writer
+        name = writer.next_name(f"{lote_part}_{timestamp}_id{obj_id}")
+        # Copia unica: o escritor desenha nela em outra thread, depois que a captura ja
+        # reaproveitou o buffer do anel (ou o chamador voltou a usar o seu array)
+        writer.submit(target_dir, name, frame_with_box.copy(), (x1, y1, x2, y2), self._apply_static_overlay)
+
+    def release(self):
+        """Devolve o modelo ao registro (libera os pesos quando for o ultimo usuario)."""
+        if self._owns_journal and self.journal is not None:
+            self.journal.close()
+        handle, self._model_handle = self._model_handle, None
+        self.model = None
+        if handle is not None:
+            handle.release()
+
+    def _run_model(self, frame, size=640):
+        """Executa o modelo (direto ou via motor em lote) e retorna array Nx6."""
+        if self.inference_engine is not None:
+            return self.inference_engine.infer(self.inference_key, self.model, frame, size=size)
+        # Inferencia nesta thread: aplica a fatia de CPU da TC (INFERENCE_THREAD_POLICY)
+        self.cpu_budget.apply(self.inference_key)
+        return self.model.predict([frame], size=size)[0]
+
+    def _crop_box(self, frame_shape):
+        """Retangulo (x0, y0, x1, y1) da ROI + margem, limitado ao frame; None se nao houver ROI."""
+        x_roi, y_roi, w_roi, h_roi = self.roi
+        if w_roi <= 0 or h_roi <= 0:
+            return None
+        h_frame, w_frame = frame_shape[:2]
+        m = self.infer_margin
+        x0 = max(0, int(x_roi) - m)
+        y0 = max(0, int(y_roi) - m)
+        x1 = min(w_frame, int(x_roi + w_roi) + m)
+        y1 = min(h_frame, int(y_roi + h_roi) + m)
+        if x1 <= x0 or y1 <= y0:
+            return None
+        return x0, y0, x1, y1
+
+    def _infer(self, frame):
+        """Deteccoes em coordenadas do frame (Nx6), com recorte da ROI quando configurado."""
+        box = self._crop_box(frame.shape) if self.infer_mode == 'roi' else None
+        if box is None:
+            return self._run_model(frame, size=self.infer_size)
+        x0, y0, x1, y1 = box
+        crop = np.ascontiguousarray(frame[y0:y1, x0:x1])
+        detections = self._run_model(crop, size=self.infer_size)
+        if len(detections):
+            # Volta as caixas para o sistema de coordenadas do frame original
+            detections = np.array(detections, copy=True)
+            detections[:, [0, 2]] += x0
+            detections[:, [1, 3]] += y0
+        return detections
+
+    def approach_distance_px(self) -> float | None:
+        """Distancia (px) da borda de entrada da ROI ate a primeira linha de portao; None sem ROI."""
+        x_roi, y_roi, w_roi, h_roi = self.roi
+        if w_roi <= 0 or h_roi <= 0:
+            return None
+        if self.flow_mode == "cima":
+            distance = (y_roi + h_roi) - max(self.line_red_y, self.line_blue_y)
+        elif self.flow_mode == "baixo":
+            distance = min(self.line_red_y, self.line_blue_y) - y_roi
+        else:
+            # sem_fluxo conta na primeira vez que a sacaria aparece dentro da ROI
+            distance = h_roi
+        return float(max(1, distance))
+
+    def tracking_config(self) -> dict:
+        """Parametros de filtro/rastreamento/contagem (recriam o detector no replay sem modelo)."""
+        return {
+            "roi": [int(v) for v in self.roi],
+            "line_offset_red": self.line_offset_red,
+            "line_offset_blue": self.line_offset_blue,
+            "flow_mode": self.flow_mode,
+            "max_lost": self.max_lost,
+            "match_dist": self.match_dist,
+            "min_conf": self.min_conf,
+            "tracker_mode": self.tracker_mode,
+            "cross_point_mode": self.cross_point_mode,
+        }
+
+    def motion_stats(self) -> dict:
+        """Frames enviados ao modelo x pulados pelo portao de movimento."""
+        if self.motion_gate is None:
+            return {"enabled": False, "frames_inferred": self.frames_inferred, "frames_skipped": 0}
+        return {"enabled": True, **self.motion_gate.stats()}
+
+    def _flow_gates(self):
+        """Linhas/sentidos da maquina de estados de duplo cruzamento conforme o fluxo."""
+        if self.flow_mode == "cima":
+            return (self.line_blue_y, "up", self.line_red_y, "up",
+                    self.line_red_y, "down", self.line_blue_y, "down")
+        if self.flow_mode == "baixo":
+            return (self.line_red_y, "down", self.line_blue_y, "down",
+                    self.line_blue_y, "up", self.line_red_y, "up")
+        return (None,) * 8
+
+    def _count_event(self, events, track_id, delta, kind, message):
+        self._log(message, evento=kind, track_id=track_id, delta=delta, contador=self.counter)
+        events.append(CountEvent(track_id=track_id, delta=delta, kind=kind, message=message))
+
+    def process(self, frame, captured_at: float | None = None) -> DetectionResult:
+        """
+        Executa detecao, rastreamento e contagem sem desenhar nada no frame.
+        `captured_at` (epoch) e o horario de captura gravado no diario de eventos.
+        """
+        self._captured_at = captured_at if captured_at is not None else time.time()
+        self.frame_index += 1
         if self.model is None:
-
-             return frame, 0
-
-        raw_frame = frame.copy() if self.missed_frame_dir else frame
-
-        results = self.model(frame, size=640)
-
-        detections = results.pred[0].cpu().numpy()
-
-        filtered_detections = []
-
+            return DetectionResult.empty(self.counter, frame.shape)
+        gate = self.motion_gate
+        if gate is not None:
+            box = self._crop_box(frame.shape)
+            if not gate.check(frame, box, force=len(self.tracker) > 0):
+                # Sem movimento e sem rastros: nada a associar/contar neste frame
+                idle = self._idle_result
+                if idle is None or idle.counter != self.counter or idle.frame_shape != frame.shape:
+                    idle = self._idle_result = DetectionResult.empty(self.counter, frame.shape)
+                return idle
+        self.frames_inferred += 1
+        return self.track(self._infer(frame), frame.shape, frame)
+
+    def track(self, detections, frame_shape, frame=None, captured_at: float | None = None) -> DetectionResult:
+        """
+        Filtro, rastreamento e contagem sobre as deteccoes do modelo (Nx6).
+        Sem `frame` (replay de deteccoes gravadas) nao ha snapshots de nao contadas.
+        """
+        if captured_at is not None:
+            self._captured_at = captured_at
         x_roi, y_roi, w_roi, h_roi = self.roi
-
         x_final, y_final = x_roi + w_roi, y_roi + h_roi
-
-        h_frame, w_frame, _ = frame.shape
-
+        w_frame = frame_shape[1]
         is_roi_active = w_roi > 0 and h_roi > 0
-
-        def crossed(prev: float, curr: float, line: float, direction: str) -> bool:
-
-            if line is None:
-
-                return False
-
-            if direction == "up":
-
-                return prev > line >= curr
-
-            if direction == "down":
-
-                return prev < line <= curr
-
-            return False
-
-        def reversed_cross(prev: float, curr: float, line: float, direction: str, margin: float) -> bool:
-
-            if line is None:
-
-                return False
-
-            if direction == "up":
-
-                return prev < line and curr >= line + margin
-
-            if direction == "down":
-
-                return prev > line and curr <= line - margin
-
-            return False
-
         flow_mode = self.flow_mode
+        (add_primary_line, add_primary_dir, add_secondary_line, add_secondary_dir,
+         sub_primary_line, sub_primary_dir, sub_secondary_line, sub_secondary_dir) = self._flow_gates()
+        events = []
 
-        if flow_mode == "cima":
-
-            add_primary_line = self.line_blue_y
-
-            add_primary_dir = "up"
-
-            add_secondary_line = self.line_red_y
-
-            add_secondary_dir = "up"
-
-            sub_primary_line = self.line_red_y
-
-            sub_primary_dir = "down"
-
-            sub_secondary_line = self.line_blue_y
-
-            sub_secondary_dir = "down"
-
-        elif flow_mode == "baixo":
-
-            add_primary_line = self.line_red_y
-
-            add_primary_dir = "down"
-
-            add_secondary_line = self.line_blue_y
-
-            add_secondary_dir = "down"
-
-            sub_primary_line = self.line_blue_y
-
-            sub_primary_dir = "up"
-
-            sub_secondary_line = self.line_red_y
-
-            sub_secondary_dir = "up"
-
-        else:
-
-            add_primary_line = add_secondary_line = sub_primary_line = sub_secondary_line = None
-
-            add_primary_dir = add_secondary_dir = sub_primary_dir = sub_secondary_dir = None
-
-        # 1. Desenha o ROI e Linhas (Para debug)
-
+        # 1. Filtra Detecoes (por Confianca, Classe e ROI) - vetorizado
+        dets = np.asarray(detections, dtype=np.float32).reshape(-1, 6)
+        keep = (dets[:, 4] >= self.min_conf) & np.isin(dets[:, 5].astype(np.int64), self.target_ids)
         if is_roi_active:
-
-            cv2.rectangle(frame, (x_roi, y_roi), (x_final, y_final), (0, 255, 0), 2)
-
-            cv2.line(frame,
-
-                     (x_roi, self.line_red_y),
-
-                     (x_final, self.line_red_y),
-
-                     (0, 0, 0), 1) # Vermelho (INVISaVEL)
-
-            cv2.line(frame,
-
-                     (x_roi, self.line_blue_y),
-
-                     (x_final, self.line_blue_y),
-
-                     (0, 0, 0), 1) # Azul (INVISaVEL)
-
-            # DEBUG: Mostra os valores das linhas
-
-            cv2.putText(frame, f"Red Y: {self.line_red_y}", (x_final + 10, self.line_red_y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 255), 1)
-
-            cv2.putText(frame, f"Blue Y: {self.line_blue_y}", (x_final + 10, self.line_blue_y + 15), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 0, 0), 1)
-
+            centers_x = (dets[:, 0] + dets[:, 2]) / 2
+            centers_y = (dets[:, 1] + dets[:, 3]) / 2
+            keep &= (centers_x >= x_roi) & (centers_x <= x_final) & (centers_y >= y_roi) & (centers_y <= y_final)
+        filtered_detections = dets[keep, :5]
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.record(self.frame_index, self._captured_at, filtered_detections, frame_shape)
+
+        # 2. Rastreamento (Tracking) - associacao otima com portao match_dist
+        tracker = self.tracker
+        tracker.update(filtered_detections, timestamp=self._captured_at)
+
+        # 3. Descartes: centro fora do ROI ou perdido por mais de max_lost frames
+        if is_roi_active and len(tracker):
+            out_roi = (tracker.cx < x_roi) | (tracker.cx > x_final) | (tracker.cy < y_roi) | (tracker.cy > y_final)
         else:
-
-            crossing_line_x = int(w_frame * 0.50)
-
-            cv2.line(frame, (crossing_line_x, 0), (crossing_line_x, h_frame), (0, 255, 255), 2)
-
-        # 2. Filtra Detecaes (por Confianaa, Classe e ROI)
-
-        for x1, y1, x2, y2, conf, cls_id in detections:
-
-            if conf < self.min_conf or int(cls_id) not in self.target_ids:
-
-                continue
-
-            center_x = (x1 + x2) / 2
-
-            center_y = (y1 + y2) / 2
-
-            if is_roi_active:
-
-                if not (x_roi <= center_x <= x_final and y_roi <= center_y <= y_final):
-
-                    continue
-
-            filtered_detections.append((x1, y1, x2, y2, conf, center_x, center_y))
-
-        # 3. Rastreamento (Tracking)
-
-        matched_ids = []
-
-        for i, (dx1, dy1, dx2, dy2, dconf, dcx, dcy) in enumerate(filtered_detections):
-
-            best_match_id = None
-
-            min_dist = float('inf')
-
-            for obj_id, obj_data in self.tracked_objects.items():
-
-                dist = ((obj_data['cx'] - dcx)**2 + (obj_data['cy'] - dcy)**2)**0.5
-
-                if dist < min_dist and dist < self.match_dist:
-
-                    min_dist = dist
-
-                    best_match_id = obj_id
-
-            if best_match_id is not None and best_match_id not in matched_ids:
-
-                # Atualizaao do Objeto Existente
-
-                prev_cy = self.tracked_objects[best_match_id]['cy']
-
-                prev_cx = self.tracked_objects[best_match_id]['cx']
-
-                self.tracked_objects[best_match_id].update({
-
-                    'x1': dx1, 'y1': dy1, 'x2': dx2, 'y2': dy2,
-
-                    'cx': dcx, 'cy': dcy, 'prev_cy': prev_cy,
-
-                    'lost_frames': 0,
-
-                    'conf': dconf,
-
-                    'prev_cx': prev_cx
-
-                })
-
-                matched_ids.append(best_match_id)
-
-            elif best_match_id is None:
-
-                # Inicializaao de um Novo Objeto
-
-                self.tracked_objects[self.next_id] = {
-
-                    'x1': dx1, 'y1': dy1, 'x2': dx2, 'y2': dy2,
-
-                    'cx': dcx, 'cy': dcy,
-
-                    'prev_cy': dcy,
-
-                    'lost_frames': 0,
-
-                    'counted': 0,     # 0 = Nao contado / -1 = Contagem Anulada
-
-                    'direction': 0,   # 0 = Neutro, 1 = Esperando Vermelha (Subindo), -1 = Esperando Azul (Descendo)
-
-                    'conf': dconf,
-
-                    'prev_cx': dcx
-
-                }
-
-                self.next_id += 1
-
-                matched_ids.append(self.next_id - 1)
-
-        # 4. Atualiza Lost Frames, Conta e Desenha
-
-        for obj_id in list(self.tracked_objects.keys()):
-
-            obj = self.tracked_objects[obj_id]
-
-            # Descarte rapido: se o centro sair do ROI
-            if is_roi_active and (obj['cx'] < x_roi or obj['cx'] > x_final or obj['cy'] < y_roi or obj['cy'] > y_final):
-                if obj.get('counted', 0) == 0:
-                    self._save_not_counted_snapshot(frame.copy(), obj, obj_id)
-                del self.tracked_objects[obj_id]
-                continue
-
-            if obj_id not in matched_ids:
-                obj['lost_frames'] += 1
-                if obj['lost_frames'] > self.max_lost:
-                    if obj.get('counted', 0) == 0:
-                        self._save_not_counted_snapshot(frame.copy(), obj, obj_id)
-                    del self.tracked_objects[obj_id]
-                    continue
-
-            # Desenha a Bounding Box, ID e DEBUG!
-
-            x1, y1, x2, y2 = map(int, [obj['x1'], obj['y1'], obj['x2'], obj['y2']])
-
-            cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
-
-            # DEBUG de Contagem e Status
-
-            status_text = f"ID: {obj_id} Dir:{obj['direction']} Count:{obj['counted']}"
-
-            cv2.putText(frame, status_text, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
-
-            # Marca o ponto usado como referencia para a passagem nas linhas
-
-            try:
-
-                cx = int(obj['cx'])
-
-                if self.cross_point_mode == 'inicio':
-
-                    py = y1
-
-                    label = 'I'
-
-                elif self.cross_point_mode == 'fim':
-
-                    py = y2
-
-                    label = 'F'
-
-                else:
-
-                    py = int(obj['cy'])
-
-                    label = 'M'
-
-                cv2.circle(frame, (cx, int(py)), 4, (255, 0, 255), -1)
-
-                cv2.putText(frame, label, (cx+6, int(py)+4), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 255), 1)
-
-            except Exception:
-
-                pass
-
-            prev_cy = obj.get('prev_cy', obj['cy'])
-
-            curr_cy = obj['cy']
-
+            out_roi = np.zeros(len(tracker), dtype=bool)
+        expired = tracker.age_unmatched() & ~out_roi
+        drop = out_roi | expired
+        if drop.any():
+            if frame is not None:
+                for i in np.flatnonzero(drop & (tracker.counted == 0)):
+                    self._save_not_counted_snapshot(frame, tracker.box(i), int(tracker.ids[i]))
+            tracker.remove(drop)
+
+        # 4. Contagem (maquina de estados por rastro)
+        for i in range(len(tracker)):
+            obj_id = int(tracker.ids[i])
+            prev_cy = float(tracker.prev_cy[i])
+            curr_cy = float(tracker.cy[i])
+            direction = int(tracker.direction[i])
+            counted = int(tracker.counted[i])
             if flow_mode == "sem_fluxo":
-
-                if obj['counted'] == 0:
-
+                if counted == 0:
                     self.counter += 1
-
-                    obj['counted'] = 1
-
-                    self._log(f"RECONHECIMENTO SEM FLUXO +1 {datetime.now().strftime('%d/%m/%Y %H:%M:%S')} (ID: {obj_id})")
-
+                    counted = 1
+                    self._count_event(events, obj_id, +1, "RECONHECIMENTO",
+                                      f"RECONHECIMENTO SEM FLUXO +1 {datetime.now().strftime('%d/%m/%Y %H:%M:%S')} (ID: {obj_id})")
             elif is_roi_active and add_primary_line is not None:
-
-                if obj['direction'] == 0 and crossed(prev_cy, curr_cy, add_primary_line, add_primary_dir):
-
-                    obj['direction'] = 1
-
-                if (
-
-                    obj['direction'] == 1
-
-                    and obj['counted'] == 0
-
-                    and crossed(prev_cy, curr_cy, add_secondary_line, add_secondary_dir)
-
-                ):
-
+                if direction == 0 and _crossed(prev_cy, curr_cy, add_primary_line, add_primary_dir):
+                    direction = 1
+                if direction == 1 and counted == 0 and _crossed(prev_cy, curr_cy, add_secondary_line, add_secondary_dir):
                     self.counter += 1
-
-                    obj['counted'] = 1
-
-                    obj['direction'] = 0
-
-                    self._log(
-
+                    counted = 1
+                    direction = 0
+                    self._count_event(
+                        events, obj_id, +1, "RECONHECIMENTO",
                         f"RECONHECIMENTO {flow_mode.upper()} +1 {datetime.now().strftime('%d/%m/%Y %H:%M:%S')} (ID: {obj_id})"
-
                     )
-
-                if obj['direction'] == 0 and crossed(prev_cy, curr_cy, sub_primary_line, sub_primary_dir):
-
-                    obj['direction'] = -1
-
-                if obj['direction'] == -1 and crossed(prev_cy, curr_cy, sub_secondary_line, sub_secondary_dir):
-
+                if direction == 0 and _crossed(prev_cy, curr_cy, sub_primary_line, sub_primary_dir):
+                    direction = -1
+                if direction == -1 and _crossed(prev_cy, curr_cy, sub_secondary_line, sub_secondary_dir):
                     if self.counter > 0:
-
                         self.counter -= 1
-
-                        self._log(
-
+                        self._count_event(
+                            events, obj_id, -1, "RECONHECIMENTO",
                             f"RECONHECIMENTO {flow_mode.upper()} -1 {datetime.now().strftime('%d/%m/%Y %H:%M:%S')} (ID: {obj_id})"
-
                         )
-
                     else:
-
-                        self._log(
-
+                        self._count_event(
+                            events, obj_id, 0, "CICLO",
                             f"CICLO {flow_mode.upper()} RETORNO (contador 0) {datetime.now().strftime('%d/%m/%Y %H:%M:%S')} (ID: {obj_id})"
-
                         )
-
-                    obj['counted'] = -1
-
-                    obj['direction'] = 0
-
-                if obj['direction'] == 1 and reversed_cross(prev_cy, curr_cy, add_primary_line, add_primary_dir, self.reset_margin):
-
-                    obj['direction'] = 0
-
-                    self._log(
-
+                    counted = -1
+                    direction = 0
+                if direction == 1 and _reversed_cross(prev_cy, curr_cy, add_primary_line, add_primary_dir, self.reset_margin):
+                    direction = 0
+                    self._count_event(
+                        events, obj_id, 0, "CANCELAMENTO",
                         f"CANCELAMENTO {flow_mode.upper()} (linha primaria, margem {self.reset_margin}) (ID: {obj_id})"
-
                     )
-
-                if obj['direction'] == -1 and reversed_cross(prev_cy, curr_cy, sub_primary_line, sub_primary_dir, self.reset_margin):
-
-                    obj['direction'] = 0
-
-                    self._log(
-
+                if direction == -1 and _reversed_cross(prev_cy, curr_cy, sub_primary_line, sub_primary_dir, self.reset_margin):
+                    direction = 0
+                    self._count_event(
+                        events, obj_id, 0, "CANCELAMENTO",
                         f"CANCELAMENTO {flow_mode.upper()} (linha secundaria, margem {self.reset_margin}) (ID: {obj_id})"
-
                     )
-
-            elif not is_roi_active and obj['counted'] == 0:
-
+            elif not is_roi_active and counted == 0:
                 crossing_line_x = int(w_frame * 0.50)
-
-                if obj['cx'] >= crossing_line_x:
-
+                if tracker.cx[i] >= crossing_line_x:
                     self.counter += 1
-
-                    obj['counted'] = 1
-
-                    self._log(
-
+                    counted = 1
+                    self._count_event(
+                        events, obj_id, +1, "RECONHECIMENTO",
                         f"RECONHECIMENTO SEM ROI +1 {datetime.now().strftime('%d/%m/%Y %H:%M:%S')} (ID: {obj_id})"
-
                     )
+            tracker.direction[i] = direction
+            tracker.counted[i] = counted
+
+        result = DetectionResult(
+            counter=self.counter,
+            detections=filtered_detections,
+            track_ids=tracker.ids.copy(),
+            track_boxes=np.stack((tracker.x1, tracker.y1, tracker.x2, tracker.y2), axis=1),
+            track_centers=np.stack((tracker.cx, tracker.cy), axis=1),
+            track_counted=tracker.counted.copy(),
+            track_direction=tracker.direction.copy(),
+            events=events,
+            frame_shape=frame_shape,
+        )
+
+        # CRITICO: Atualiza prev_cy APENAS NO FINAL (somente rastros vistos neste frame)
+        tracker.commit()
+        return result
+
+    def _static_overlay(self, frame_shape):
+        """
+        ROI, linhas e rotulos de debug renderizados uma unica vez por tamanho de frame.
+        Guarda apenas os pixels desenhados: opacos (copia direta) e de borda
+        suavizada (mistura com o frame usando a cobertura como alfa).
+        """
+        key = tuple(frame_shape[:2])
+        cached = self._overlay_cache.get(key)
+        if cached is not None:
+            return cached
+        h_frame, w_frame = key
+        canvas = np.zeros((h_frame, w_frame, 3), dtype=np.uint8)
+        coverage = np.zeros((h_frame, w_frame), dtype=np.uint8)
+        x_roi, y_roi, w_roi, h_roi = self.roi
+        x_final, y_final = x_roi + w_roi, y_roi + h_roi
+        for img, solid in ((canvas, None), (coverage, 255)):
+            def color(c):
+                return c if solid is None else solid
+            if w_roi > 0 and h_roi > 0:
+                cv2.rectangle(img, (x_roi, y_roi), (x_final, y_final), color((0, 255, 0)), 2)
+                cv2.line(img, (x_roi, self.line_red_y), (x_final, self.line_red_y), color((0, 0, 0)), 1) # Vermelho (INVISIVEL)
+                cv2.line(img, (x_roi, self.line_blue_y), (x_final, self.line_blue_y), color((0, 0, 0)), 1) # Azul (INVISIVEL)
+                # DEBUG: Mostra os valores das linhas
+                cv2.putText(img, f"Red Y: {self.line_red_y}", (x_final + 10, self.line_red_y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.4, color((0, 0, 255)), 1)
+                cv2.putText(img, f"Blue Y: {self.line_blue_y}", (x_final + 10, self.line_blue_y + 15), cv2.FONT_HERSHEY_SIMPLEX, 0.4, color((255, 0, 0)), 1)
+            else:
+                crossing_line_x = int(w_frame * 0.50)
+                cv2.line(img, (crossing_line_x, 0), (crossing_line_x, h_frame), color((0, 255, 255)), 2)
+        ys_full, xs_full = np.nonzero(coverage == 255)
+        ys_part, xs_part = np.nonzero((coverage > 0) & (coverage < 255))
+        cached = {
+            "full": (ys_full, xs_full, canvas[ys_full, xs_full]),
+            "part": (ys_part, xs_part, canvas[ys_part, xs_part].astype(np.float32),
+                     (1.0 - coverage[ys_part, xs_part].astype(np.float32) / 255.0)[:, None]),
+        }
+        self._overlay_cache[key] = cached
+        return cached
+
+    def _apply_static_overlay(self, frame):
+        overlay = self._static_overlay(frame.shape)
+        ys, xs, colors = overlay["full"]
+        frame[ys, xs] = colors
+        ys, xs, colors, keep = overlay["part"]
+        if ys.size:
+            # canvas foi desenhado sobre preto: cor ja vem multiplicada pela cobertura
+            frame[ys, xs] = np.clip(frame[ys, xs] * keep + colors + 0.5, 0, 255).astype(np.uint8)
+
+    def annotate(self, frame, result: DetectionResult):
+        """Desenha ROI/linhas (overlay em cache), caixas, IDs e ponto de cruzamento no frame."""
+        if not frame.flags.writeable:
+            # View do anel do VideoSource: desenha em uma copia
+            frame = frame.copy()
+        self._apply_static_overlay(frame)
+        for i in range(len(result.track_ids)):
+            obj_id = int(result.track_ids[i])
+            # Desenha a Bounding Box, ID e DEBUG!
+            x1, y1, x2, y2 = (int(v) for v in result.track_boxes[i])
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (255, 0, 0), 2)
+            # DEBUG de Contagem e Status
+            status_text = f"ID: {obj_id} Dir:{int(result.track_direction[i])} Count:{int(result.track_counted[i])}"
+            cv2.putText(frame, status_text, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 2)
+            # Marca o ponto usado como referencia para a passagem nas linhas
+            cx = int(result.track_centers[i, 0])
+            if self.cross_point_mode == 'inicio':
+                py, label = y1, 'I'
+            elif self.cross_point_mode == 'fim':
+                py, label = y2, 'F'
+            else:
+                py, label = int(result.track_centers[i, 1]), 'M'
+            cv2.circle(frame, (cx, int(py)), 4, (255, 0, 255), -1)
+            cv2.putText(frame, label, (cx+6, int(py)+4), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 255), 1)
+        return frame
 
-            # CRaTICO: Atualiza prev_cy APENAS NO FINAL
-
-            if obj_id in matched_ids:
-
-                 obj['prev_cy'] = obj['cy']
-
-        return frame, self.counter
+    def detect_and_tag(self, frame):
+        """Executa a detecao, rastreamento, contagem e desenha no frame."""
+        if self.model is None:
+             return frame, 0
+        result = self.process(frame)
+        return self.annotate(frame, result), result.counter
 
     def get_current_count(self):
 
@@ -0,0 +1,340 @@
+# services/inference_backends.py
+"""
+Backends de inferencia atras do IndustrialTagDetector.
+
+Todos expoem `predict(images, size) -> list[np.ndarray]`, com uma matriz Nx6
+(x1, y1, x2, y2, conf, cls) em coordenadas da imagem original para cada
+imagem de entrada, e podem ser chamados de varias threads.
+"""
+import os
+import threading
+import logging
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+YOLO_DIR = os.path.join(PROJECT_ROOT, 'third_party', 'yolov5')
+
+# Mesmos padroes do AutoShape do YOLOv5 (usados pelo backend PyTorch)
+CONF_THRES = 0.25
+IOU_THRES = 0.45
+MAX_DET = 1000
+LETTERBOX_COLOR = 114
+
+
+def letterbox(image: np.ndarray, new_shape, color=LETTERBOX_COLOR):
+    """Redimensiona mantendo proporcao e completa com borda; retorna (img, ganho, (pad_x, pad_y))."""
+    import cv2
+    h, w = image.shape[:2]
+    new_h, new_w = new_shape
+    gain = min(new_h / h, new_w / w)
+    resized_w, resized_h = int(round(w * gain)), int(round(h * gain))
+    if (resized_w, resized_h) != (w, h):
+        image = cv2.resize(image, (resized_w, resized_h), interpolation=cv2.INTER_LINEAR)
+    pad_x = (new_w - resized_w) / 2
+    pad_y = (new_h - resized_h) / 2
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(color, color, color))
+    return image, gain, (left, top)
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_thres: float) -> np.ndarray:
+    """Non-maximum suppression (boxes xyxy); retorna indices mantidos em ordem de score."""
+    order = scores.argsort()[::-1]
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        if order.size == 1:
+            break
+        rest = order[1:]
+        w = (np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest])).clip(0)
+        h = (np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest])).clip(0)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_thres]
+    return np.asarray(keep, dtype=np.intp)
+
+
+def yolov5_postprocess(pred: np.ndarray, conf_thres=CONF_THRES, iou_thres=IOU_THRES, max_det=MAX_DET) -> np.ndarray:
+    """Saida bruta (N, 5+nc: cx, cy, w, h, obj, classes...) -> Nx6 xyxy/conf/cls apos NMS por classe."""
+    pred = pred[pred[:, 4] > conf_thres]
+    if not pred.shape[0]:
+        return np.empty((0, 6), dtype=np.float32)
+    cls_scores = pred[:, 5:] * pred[:, 4:5]
+    cls_ids = cls_scores.argmax(axis=1)
+    conf = cls_scores[np.arange(cls_scores.shape[0]), cls_ids]
+    mask = conf > conf_thres
+    if not mask.any():
+        return np.empty((0, 6), dtype=np.float32)
+    xywh = pred[mask, :4]
+    conf = conf[mask]
+    cls_ids = cls_ids[mask].astype(np.float32)
+    boxes = np.empty_like(xywh)
+    boxes[:, 0] = xywh[:, 0] - xywh[:, 2] / 2
+    boxes[:, 1] = xywh[:, 1] - xywh[:, 3] / 2
+    boxes[:, 2] = xywh[:, 0] + xywh[:, 2] / 2
+    boxes[:, 3] = xywh[:, 1] + xywh[:, 3] / 2
+    # Desloca por classe para que o NMS nao suprima caixas de classes diferentes
+    offsets = cls_ids[:, None] * 7680.0
+    keep = nms(boxes + offsets, conf, iou_thres)[:max_det]
+    return np.concatenate((boxes[keep], conf[keep, None], cls_ids[keep, None]), axis=1).astype(np.float32)
+
+
+def autoshape_input_shape(images: list, size: int):
+    """Forma (h, w) que o AutoShape usaria para o lote: lado maior = size, multiplos de 32."""
+    h_max = w_max = 0
+    for im in images:
+        h, w = im.shape[:2]
+        g = size / max(h, w)
+        h_max = max(h_max, int(h * g))
+        w_max = max(w_max, int(w * g))
+    return (int(np.ceil(h_max / 32) * 32), int(np.ceil(w_max / 32) * 32))
+
+
+def to_blob(image: np.ndarray, shape, dtype=np.float32):
+    """Letterbox + HWC->CHW normalizado em [0, 1]; retorna (blob, ganho, pad)."""
+    img, gain, pad = letterbox(image, shape)
+    blob = img.transpose(2, 0, 1).astype(dtype) / 255.0
+    return blob, gain, pad
+
+
+def scale_boxes(dets: np.ndarray, gain: float, pad, original_shape) -> np.ndarray:
+    """Desfaz o letterbox: coordenadas da entrada do modelo -> imagem original."""
+    if not dets.shape[0]:
+        return dets
+    dets = dets.copy()
+    dets[:, [0, 2]] = (dets[:, [0, 2]] - pad[0]) / gain
+    dets[:, [1, 3]] = (dets[:, [1, 3]] - pad[1]) / gain
+    h, w = original_shape[:2]
+    dets[:, [0, 2]] = dets[:, [0, 2]].clip(0, w)
+    dets[:, [1, 3]] = dets[:, [1, 3]].clip(0, h)
+    return dets
+
+
+class InferenceBackend:
+    """Interface comum; subclasses implementam `predict`."""
+
+    name = "base"
+    device = "cpu"
+
+    def predict(self, images: list, size: int = 640) -> list:
+        raise NotImplementedError
+
+    def parameter_bytes(self) -> int | None:
+        return None
+
+
+class TorchHubBackend(InferenceBackend):
+    """Modelo .pt carregado pelo hubconf local do YOLOv5 (AutoShape: letterbox + NMS internos)."""
+
+    name = "torch"
+
+    def __init__(self, path_for_load: str):
+        import torch
+        # Evita qualquer tentativa de auto-instalacao de dependencias pelo YOLOv5
+        os.environ.setdefault('YOLOV5_NO_AUTOINSTALL', '1')
+        if not os.path.isdir(YOLO_DIR):
+            raise FileNotFoundError(f"Diretorio YOLOv5 nao encontrado: {YOLO_DIR}")
+        # Requer que exista um 'hubconf.py' em YOLO_DIR (ja presente no repo oficial)
+        self.model = torch.hub.load(YOLO_DIR, 'custom', path=path_for_load, source='local', force_reload=False)
+        self.model.eval()
+        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.lock = threading.Lock()
+
+    def predict(self, images: list, size: int = 640) -> list:
+        with self.lock:
+            results = self.model(list(images), size=size)
+        return [p.cpu().numpy() for p in results.pred]
+
+    def parameter_bytes(self) -> int | None:
+        try:
+            return int(sum(p.numel() * p.element_size() for p in self.model.parameters()))
+        except Exception:
+            return None
+
+
+class TorchScriptBackend(InferenceBackend):
+    """
+    Modelo .pt servido pelo cache TorchScript (services/model_cache.py).
+
+    Se ja existem artefatos para o hash dos pesos, carrega apenas eles (sem
+    importar o YOLOv5). Todo frame entra com letterbox quadrado size x size,
+    entao cada `size` e rastreado uma unica vez (com lote 1; lotes maiores
+    seguem frame a frame se o artefato nao aceitar). Sem artefato, carrega o
+    modelo pelo torch.hub uma unica vez, rastreia e grava o arquivo.
+    """
+
+    name = "torchscript"
+
+    def __init__(self, path_for_load: str):
+        import torch
+        from services import model_cache
+        self._torch = torch
+        self._cache = model_cache
+        self.path = path_for_load
+        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.digest = model_cache.weights_hash(path_for_load)
+        self.modules = {}           # (h, w) -> ScriptModule
+        self.per_image = set()      # formas cujo artefato nao aceita lote > 1
+        self.untraceable = set()    # formas que falharam no trace (usam o modelo do hub)
+        self.cold_load = False
+        self._eager = None
+        self.lock = threading.Lock()
+        for shape, artifact in sorted(model_cache.find_artifacts(path_for_load, self.digest, self.device).items()):
+            try:
+                self.modules[shape], _meta = model_cache.load_artifact(artifact, self.device)
+            except Exception as err:
+                log.warning("[ModelCache] Artefato invalido '%s' (%s); sera recriado.", artifact, err)
+        if not self.modules:
+            # Nada em cache: carga fria agora (mesmo custo de antes) para nao atrasar o 1o frame
+            self._load_eager()
+
+    def _load_eager(self):
+        if self._eager is None:
+            self._eager = TorchHubBackend(self.path)
+            self.cold_load = True
+        return self._eager
+
+    def _module_for(self, shape):
+        module = self.modules.get(shape)
+        if module is not None or shape in self.untraceable:
+            return module
+        with self.lock:
+            module = self.modules.get(shape)
+            if module is None and shape not in self.untraceable:
+                eager = self._load_eager()
+                try:
+                    module, _meta = self._cache.export_artifact(eager.model, self.path, self.digest, self.device, shape)
+                    self.modules[shape] = module
+                except Exception as err:
+                    log.error("[ModelCache] Falha ao rastrear '%s' em %s: %s (usando torch.hub)", self.path, shape, err)
+                    self.untraceable.add(shape)
+        return module
+
+    def _forward(self, module, batch):
+        out = module(batch)
+        return out[0] if isinstance(out, (list, tuple)) else out
+
+    @staticmethod
+    def input_shape(size: int):
+        """Entrada fixa do artefato: quadrado no multiplo de 32 (independe da resolucao do frame)."""
+        side = int(np.ceil(size / 32) * 32)
+        return (side, side)
+
+    def predict(self, images: list, size: int = 640) -> list:
+        torch = self._torch
+        shape = self.input_shape(size)
+        module = self._module_for(shape)
+        if module is None:
+            return self._load_eager().predict(images, size)
+        prepared = [to_blob(im, shape) for im in images]
+        blobs = torch.from_numpy(np.stack([blob for blob, _gain, _pad in prepared])).to(self.device)
+        raw = None
+        with torch.no_grad():
+            if len(prepared) > 1 and shape not in self.per_image:
+                try:
+                    raw = self._forward(module, blobs)
+                except RuntimeError:
+                    # Rastreado com lote 1 e sem suporte a lote variavel: segue frame a frame
+                    self.per_image.add(shape)
+            if raw is None:
+                raw = torch.cat([self._forward(module, blobs[i:i + 1]) for i in range(blobs.shape[0])])
+        raw = raw.float().cpu().numpy()
+        results = []
+        for pred, (_blob, gain, pad), image in zip(raw, prepared, images):
+            results.append(scale_boxes(yolov5_postprocess(pred), gain, pad, image.shape))
+        return results
+
+    def parameter_bytes(self) -> int | None:
+        try:
+            return int(sum(p.numel() * p.element_size() for m in self.modules.values() for p in m.parameters()))
+        except Exception:
+            return None
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+    """
+    Modelo exportado para ONNX (scripts/export_onnx.py) executado no ONNX Runtime (CPU).
+    Faz o letterbox e o NMS em NumPy, com os mesmos limiares do AutoShape.
+    Assim como no backend PyTorch, o frame e enviado na ordem de canais em que chega.
+    """
+
+    name = "onnx"
+
+    def __init__(self, path_for_load: str, providers=None, session_options=None):
+        import onnxruntime as ort
+        if not os.path.isfile(path_for_load):
+            raise FileNotFoundError(f"Modelo ONNX nao encontrado: {path_for_load}")
+        self.session = ort.InferenceSession(
+            path_for_load,
+            sess_options=session_options,
+            providers=providers or ["CPUExecutionProvider"],
+        )
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        self.input_type = np.float16 if "float16" in inp.type else np.float32
+        shape = list(inp.shape)
+        # Dimensoes simbolicas (export --dynamic) chegam como str/None
+        self.static_batch = shape[0] if isinstance(shape[0], int) else None
+        self.static_hw = (shape[2], shape[3]) if all(isinstance(v, int) for v in shape[2:4]) else None
+        self.device = "cpu"
+        self._warned_size = False
+
+    def _input_shape(self, size: int, images: list):
+        if self.static_hw is not None:
+            if not self._warned_size and self.static_hw != (size, size):
+                log.warning("[ONNX] Modelo exportado com entrada fixa %s; ignorando tamanho %s.", self.static_hw, size)
+                self._warned_size = True
+            return self.static_hw
+        # Export dinamico: mesma forma retangular que o AutoShape usaria
+        return autoshape_input_shape(images, size)
+
+    def predict(self, images: list, size: int = 640) -> list:
+        shape = self._input_shape(size, images)
+        prepared = [to_blob(im, shape, self.input_type) for im in images]
+        outputs = []
+        if self.static_batch == 1 or len(prepared) == 1:
+            for blob, _gain, _pad in prepared:
+                outputs.append(self.session.run(None, {self.input_name: blob[None]})[0][0])
+        else:
+            batch = np.stack([blob for blob, _gain, _pad in prepared])
+            outputs = list(self.session.run(None, {self.input_name: batch})[0])
+        results = []
+        for raw, (_blob, gain, pad), image in zip(outputs, prepared, images):
+            dets = yolov5_postprocess(np.asarray(raw, dtype=np.float32))
+            results.append(scale_boxes(dets, gain, pad, image.shape))
+        return results
+
+
+BACKENDS = {
+    "torch": TorchHubBackend,
+    "torchscript": TorchScriptBackend,
+    "onnx": OnnxRuntimeBackend,
+}
+
+
+def backend_name_for(model_path: str | None) -> str:
+    """
+    Escolhe o backend pela extensao do arquivo do modelo: .onnx -> ONNX Runtime;
+    .pt existente -> cache TorchScript (se MODEL_CACHE_ENABLED); demais -> torch.hub.
+    """
+    from services.model_cache import model_cache_enabled
+    ext = os.path.splitext(model_path or "")[1].lower()
+    if ext == ".onnx":
+        return "onnx"
+    if ext == ".pt" and os.path.isfile(model_path) and model_cache_enabled():
+        return "torchscript"
+    return "torch"
+
+
+def load_backend(path_for_load: str) -> InferenceBackend:
+    name = backend_name_for(path_for_load)
+    backend = BACKENDS[name](path_for_load)
+    log.info("[Backend] '%s' carregado com %s (%s)", path_for_load, name, backend.device)
+    return backend
@@ -0,0 +1,281 @@
+# services/inference_engine.py
+import os
+import threading
+import time
+import logging
+
+from services.cpu_budget import get_cpu_budget
+
+log = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except Exception:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except Exception:
+        return default
+
+
+CPU_BUDGET_KEY = "lote"
+
+
+class _InferenceRequest:
+    __slots__ = ("key", "model", "frame", "size", "submitted_at", "done", "result", "error")
+
+    def __init__(self, key, model, frame, size):
+        self.key = key
+        self.model = model
+        self.frame = frame
+        self.size = size
+        self.submitted_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BatchInferenceEngine:
+    """
+    Servico unico de inferencia por processo.
+
+    Cada CapturePoint entrega o frame mais recente (um pedido pendente por TC) e
+    aguarda o resultado. Uma thread dedicada junta os pedidos que usam o mesmo
+    modelo/tamanho e executa uma unica passada em lote, limitada por
+    `max_batch` frames e por `max_wait_ms` de espera a partir do pedido mais antigo.
+    Com uma unica TC ativa o pedido segue na hora, sem espera de lote.
+
+    O cliente desiste apos `timeout_s` ou, se for maior, `TIMEOUT_LATENCY_FACTOR`
+    vezes a latencia media medida do lote (CPU lenta ou modelo grande nao gera
+    TimeoutError falso).
+    """
+
+    TIMEOUT_LATENCY_FACTOR = 4.0
+    LATENCY_EMA_ALPHA = 0.2
+
+    def __init__(self, max_batch: int = 8, max_wait_ms: float = 15.0, timeout_s: float = 5.0):
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait_s = max(0.0, float(max_wait_ms)) / 1000.0
+        self.timeout_s = max(0.1, float(timeout_s))
+        self._latency_s = None      # media movel do tempo de inferencia por lote
+        self._pending = {}          # key -> _InferenceRequest (so o mais recente por TC)
+        self._clients = set()       # TCs com loop de captura ativo
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stop = False
+        # contadores para ajuste fino
+        self._batches = 0
+        self._frames = 0
+        self._replaced = 0
+        self._errors = 0
+        self._wait_total_s = 0.0
+        self._wait_max_s = 0.0
+        self._infer_total_s = 0.0
+
+    # ---------- clientes ----------
+    def register(self, key):
+        """Marca a TC como ativa; o lote so espera por clientes registrados."""
+        with self._cond:
+            self._clients.add(key)
+            self._cond.notify_all()
+
+    def unregister(self, key):
+        with self._cond:
+            self._clients.discard(key)
+            req = self._pending.pop(key, None)
+            if req is not None:
+                req.error = "cliente removido"
+                req.done.set()
+            self._cond.notify_all()
+
+    # ---------- API ----------
+    def infer(self, key, model, frame, size: int = 640, timeout: float | None = None):
+        """
+        Submete o frame da TC `key` e bloqueia ate o resultado (array Nx6: x1,y1,x2,y2,conf,cls).
+        timeout None = espera atual do motor (ver current_timeout()).
+        """
+        req = _InferenceRequest(key, model, frame, size)
+        with self._cond:
+            if timeout is None:
+                timeout = self._timeout_locked()
+            old = self._pending.get(key)
+            if old is not None:
+                # Mantem apenas o frame mais recente de cada TC
+                old.error = "substituido por frame mais recente"
+                old.done.set()
+                self._replaced += 1
+            self._pending[key] = req
+            self._ensure_worker()
+            self._cond.notify_all()
+        if not req.done.wait(timeout):
+            with self._cond:
+                if self._pending.get(key) is req:
+                    del self._pending[key]
+            raise TimeoutError(f"Inferencia em lote excedeu {timeout:.1f}s (TC {key})")
+        if req.error is not None:
+            raise RuntimeError(req.error)
+        return req.result
+
+    def current_timeout(self) -> float:
+        """Espera maxima de um cliente, em segundos."""
+        with self._cond:
+            return self._timeout_locked()
+
+    def _timeout_locked(self) -> float:
+        if self._latency_s is None:
+            return self.timeout_s
+        # Fila de um lote em andamento + o proprio lote + folga
+        return max(self.timeout_s, self.TIMEOUT_LATENCY_FACTOR * self._latency_s + self.max_wait_s)
+
+    def stats(self) -> dict:
+        with self._cond:
+            batches = self._batches
+            frames = self._frames
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": round(self.max_wait_s * 1000.0, 2),
+                "timeout_s": round(self._timeout_locked(), 3),
+                "active_clients": len(self._clients),
+                "pending": len(self._pending),
+                "batches": batches,
+                "frames": frames,
+                "avg_batch_size": round(frames / batches, 3) if batches else 0.0,
+                "batch_fill_ratio": round(frames / (batches * self.max_batch), 3) if batches else 0.0,
+                "queue_wait_avg_ms": round(self._wait_total_s * 1000.0 / frames, 3) if frames else 0.0,
+                "queue_wait_max_ms": round(self._wait_max_s * 1000.0, 3),
+                "infer_avg_ms": round(self._infer_total_s * 1000.0 / batches, 3) if batches else 0.0,
+                "replaced": self._replaced,
+                "errors": self._errors,
+            }
+
+    def shutdown(self):
+        with self._cond:
+            self._stop = True
+            for req in self._pending.values():
+                req.error = "motor de inferencia encerrado"
+                req.done.set()
+            self._pending.clear()
+            self._cond.notify_all()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    # ---------- worker ----------
+    def _ensure_worker(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="inference-engine", daemon=True)
+        self._thread.start()
+
+    def _target_fill(self) -> int:
+        # Nao faz sentido esperar por mais frames do que TCs ativas
+        return max(1, min(self.max_batch, len(self._clients) or 1))
+
+    def _take_batch(self):
+        oldest = min(self._pending.values(), key=lambda r: r.submitted_at)
+        group = (id(oldest.model), oldest.size)
+        same = [r for r in self._pending.values() if (id(r.model), r.size) == group]
+        same.sort(key=lambda r: r.submitted_at)
+        batch = same[:self.max_batch]
+        for req in batch:
+            del self._pending[req.key]
+        return batch
+
+    def _run(self):
+        # Toda a inferencia passa por esta thread: ela recebe o orcamento de CPU inteiro
+        budget = get_cpu_budget()
+        budget.register(CPU_BUDGET_KEY)
+        try:
+            self._loop(budget)
+        finally:
+            budget.unregister(CPU_BUDGET_KEY)
+
+    def _loop(self, budget):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stop:
+                    self._cond.wait(0.5)
+                if self._stop:
+                    return
+                oldest = min(r.submitted_at for r in self._pending.values())
+                deadline = oldest + self.max_wait_s
+                while not self._stop and self._pending and len(self._pending) < self._target_fill():
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._stop:
+                    return
+                if not self._pending:
+                    continue
+                batch = self._take_batch()
+            budget.apply(CPU_BUDGET_KEY)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        started = time.perf_counter()
+        model = batch[0].model
+        size = batch[0].size
+        try:
+            preds = model.predict([req.frame for req in batch], size=size)
+            for req, pred in zip(batch, preds):
+                req.result = pred
+            error = None
+        except Exception as err:
+            log.error("[InferenceEngine] Falha na inferencia em lote (%d frames): %s", len(batch), err)
+            error = str(err) or err.__class__.__name__
+        finished = time.perf_counter()
+        with self._cond:
+            self._batches += 1
+            self._frames += len(batch)
+            self._infer_total_s += finished - started
+            latency = finished - started
+            if self._latency_s is None:
+                self._latency_s = latency
+            else:
+                self._latency_s += self.LATENCY_EMA_ALPHA * (latency - self._latency_s)
+            if error is not None:
+                self._errors += 1
+            for req in batch:
+                wait = started - req.submitted_at
+                self._wait_total_s += wait
+                if wait > self._wait_max_s:
+                    self._wait_max_s = wait
+        for req in batch:
+            if error is not None:
+                req.error = error
+            elif req.result is None:
+                req.error = "resultado ausente no lote"
+            req.frame = None
+            req.done.set()
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def inference_engine_enabled() -> bool:
+    return (os.getenv("INFERENCE_BATCH_ENABLED", "0").strip().lower() not in ("0", "false", "nao", "no", "off"))
+
+
+def get_inference_engine():
+    """Retorna o motor compartilhado do processo (ou None se desativado por ambiente)."""
+    global _engine
+    if not inference_engine_enabled():
+        return None
+    with _engine_lock:
+        if _engine is None:
+            _engine = BatchInferenceEngine(
+                max_batch=_env_int("INFERENCE_BATCH_MAX", 8),
+                max_wait_ms=_env_float("INFERENCE_BATCH_WAIT_MS", 15.0),
+                timeout_s=_env_float("INFERENCE_BATCH_TIMEOUT_S", 5.0),
+            )
+            log.info("[InferenceEngine] Ativo (max_batch=%d, max_wait_ms=%.1f, timeout_s=%.1f)",
+                     _engine.max_batch, _engine.max_wait_s * 1000.0, _engine.timeout_s)
+        return _engine
@@ -0,0 +1,154 @@
+# services/model_cache.py
+"""
+Cache de modelos serializados (TorchScript) ao lado dos pesos .pt.
+
+Opcional (MODEL_CACHE_ENABLED=1). O primeiro carregamento de um .pt passa pelo
+torch.hub (importa o repositorio YOLOv5 inteiro e reconstroi o modelo); em
+seguida uma copia da rede e rastreada (torch.jit.trace) uma unica vez, na
+entrada fixa size x size (letterbox quadrado), e salva como
+`<nome>.<hash>.<device>.s<size>x<size>.torchscript` no mesmo diretorio.
+Os carregamentos seguintes usam apenas `torch.jit.load`, sem importar o YOLOv5.
+O hash e calculado sobre o conteudo do .pt: se o arquivo for trocado, os
+artefatos antigos deixam de casar e sao removidos na proxima exportacao.
+"""
+import copy
+import glob
+import hashlib
+import json
+import os
+import re
+import logging
+
+log = logging.getLogger(__name__)
+
+ARTIFACT_SUFFIX = ".torchscript"
+HASH_CHARS = 16
+_META_FILE = "sacaria_meta.json"
+
+
+def model_cache_enabled() -> bool:
+    return (os.getenv("MODEL_CACHE_ENABLED", "0").strip().lower() not in ("0", "false", "nao", "no", "off"))
+
+
+def weights_hash(path: str) -> str:
+    """sha256 (prefixo) do arquivo de pesos."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:HASH_CHARS]
+
+
+def _stem(weights_path: str) -> str:
+    return os.path.splitext(os.path.abspath(weights_path))[0]
+
+
+def artifact_path(weights_path: str, digest: str, device: str, shape) -> str:
+    h, w = shape
+    return f"{_stem(weights_path)}.{digest}.{device}.s{int(h)}x{int(w)}{ARTIFACT_SUFFIX}"
+
+
+def find_artifacts(weights_path: str, digest: str, device: str) -> dict:
+    """Artefatos existentes para estes pesos/dispositivo: {(h, w): caminho}."""
+    prefix = f"{_stem(weights_path)}.{digest}.{device}.s"
+    pattern = re.compile(re.escape(prefix) + r"(\d+)x(\d+)" + re.escape(ARTIFACT_SUFFIX) + "$")
+    found = {}
+    for candidate in glob.glob(glob.escape(prefix) + "*" + ARTIFACT_SUFFIX):
+        match = pattern.match(candidate)
+        if match:
+            found[(int(match.group(1)), int(match.group(2)))] = candidate
+    return found
+
+
+def prune_stale(weights_path: str, digest: str) -> int:
+    """Remove artefatos gerados a partir de versoes anteriores do mesmo .pt."""
+    removed = 0
+    current = f"{_stem(weights_path)}.{digest}."
+    for candidate in glob.glob(glob.escape(_stem(weights_path)) + ".*" + ARTIFACT_SUFFIX):
+        if candidate.startswith(current):
+            continue
+        try:
+            os.remove(candidate)
+            removed += 1
+            log.info("[ModelCache] Artefato obsoleto removido: %s", candidate)
+        except OSError as err:
+            log.warning("[ModelCache] Nao foi possivel remover '%s': %s", candidate, err)
+    return removed
+
+
+def remove_artifacts(weights_path: str) -> int:
+    """Apaga todos os artefatos deste .pt (forca um carregamento frio)."""
+    removed = 0
+    for candidate in glob.glob(glob.escape(_stem(weights_path)) + ".*" + ARTIFACT_SUFFIX):
+        try:
+            os.remove(candidate)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def load_artifact(path: str, device: str):
+    import torch
+    extra = {_META_FILE: ""}
+    module = torch.jit.load(path, map_location=device, _extra_files=extra)
+    module.eval()
+    try:
+        meta = json.loads(extra[_META_FILE] or "{}")
+    except ValueError:
+        meta = {}
+    return module, meta
+
+
+def _detection_net(autoshape):
+    """Rede de deteccao dentro do AutoShape do hub (DetectMultiBackend -> DetectionModel)."""
+    net = autoshape.model
+    if type(net).__name__ == "DetectMultiBackend":
+        net = net.model
+    return net
+
+
+def export_artifact(autoshape, weights_path: str, digest: str, device: str, shape):
+    """Rastreia a rede em (1, 3, h, w) e grava o artefato; retorna (modulo, meta)."""
+    import torch
+    # Copia: o AutoShape do registro segue em uso (modo eager) por outras TCs
+    net = copy.deepcopy(_detection_net(autoshape))
+    # Mesmo ajuste do export.py do YOLOv5: Detect devolve apenas a saida de inferencia
+    for module in net.modules():
+        if type(module).__name__ == "Detect":
+            module.inplace = False
+            module.export = True
+            if hasattr(module, "dynamic"):
+                module.dynamic = False
+    param = next(net.parameters())
+    h, w = int(shape[0]), int(shape[1])
+    sample = torch.zeros((1, 3, h, w), dtype=param.dtype, device=param.device)
+    with torch.no_grad():
+        for _ in range(2):
+            net(sample)
+        traced = torch.jit.trace(net, sample, strict=False)
+    stride = getattr(autoshape, "stride", 32)
+    stride = int(stride.max()) if hasattr(stride, "max") else int(stride)
+    meta = {
+        "weights": os.path.basename(weights_path),
+        "sha256": digest,
+        "shape": [h, w],
+        "device": device,
+        "names": getattr(autoshape, "names", None),
+        "stride": stride,
+    }
+    path = artifact_path(weights_path, digest, device, (h, w))
+    tmp = path + ".tmp"
+    try:
+        torch.jit.save(traced, tmp, _extra_files={_META_FILE: json.dumps(meta)})
+        os.replace(tmp, path)
+        log.info("[ModelCache] Artefato TorchScript gravado: %s", path)
+        prune_stale(weights_path, digest)
+    except OSError as err:
+        # Pasta sem permissao de escrita: segue com o modulo em memoria
+        log.warning("[ModelCache] Falha ao gravar '%s': %s", path, err)
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+    return traced, meta
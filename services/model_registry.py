@@ -0,0 +1,164 @@
+# services/model_registry.py
+import gc
+import os
+import threading
+import time
+import logging
+
+from services.inference_backends import PROJECT_ROOT, load_backend
+
+log = logging.getLogger(__name__)
+
+
+def resolve_model_path(model_path: str | None):
+    """
+    Resolve o caminho do modelo como o detector sempre fez:
+    absoluto, relativo a raiz do projeto, relativo ao cwd ou referencia literal.
+    Retorna (resolvido, existe, caminho_para_carregar).
+    """
+    model_candidate = model_path or ""
+    search_candidates = []
+    if model_candidate:
+        if os.path.isabs(model_candidate):
+            search_candidates.append(model_candidate)
+        else:
+            search_candidates.append(os.path.join(PROJECT_ROOT, model_candidate))
+            search_candidates.append(os.path.abspath(model_candidate))
+            search_candidates.append(model_candidate)
+    else:
+        search_candidates.append(model_candidate)
+    resolved_path = None
+    for candidate in search_candidates:
+        if candidate and os.path.isfile(candidate):
+            resolved_path = candidate
+            break
+    if resolved_path is None:
+        resolved_path = search_candidates[0] if search_candidates else model_candidate
+    if resolved_path:
+        resolved_path = os.path.normpath(resolved_path)
+    exists = bool(resolved_path and os.path.isfile(resolved_path))
+    for_load = resolved_path if exists else (model_path or resolved_path or "")
+    return resolved_path, exists, for_load
+
+
+def _process_rss() -> int | None:
+    try:
+        import psutil
+        return int(psutil.Process(os.getpid()).memory_info().rss)
+    except Exception:
+        return None
+
+
+class ModelHandle:
+    """Referencia obtida no registro; devolva com `release()` quando nao precisar mais."""
+
+    def __init__(self, registry, entry):
+        self._registry = registry
+        self._entry = entry
+        self.released = False
+
+    @property
+    def model(self):
+        """Backend de inferencia compartilhado (ver services/inference_backends.py)."""
+        return self._entry.backend
+
+    @property
+    def device(self):
+        return self._entry.backend.device
+
+    @property
+    def key(self):
+        return self._entry.key
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self._registry._release(self._entry)
+
+
+class _ModelEntry:
+    def __init__(self, key, path_for_load):
+        self.key = key
+        self.path_for_load = path_for_load
+        self.backend = None
+        self.refs = 0
+        self.load_time_s = None
+        self.rss_delta_bytes = None
+        self.param_bytes = None
+        self.loaded_at = None
+
+
+class ModelRegistry:
+    """
+    Registro de modelos do processo, com contagem de referencias.
+
+    A chave e (caminho resolvido, mtime do arquivo): TCs que usam o mesmo
+    arquivo compartilham os pesos; se o arquivo for substituido, novos
+    pedidos carregam a versao nova enquanto a antiga vive ate o ultimo release.
+    """
+
+    def __init__(self, loader=load_backend):
+        self._loader = loader
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(path_for_load: str):
+        if path_for_load and os.path.isfile(path_for_load):
+            path = os.path.normcase(os.path.abspath(path_for_load))
+            return (path, os.path.getmtime(path))
+        return (path_for_load, None)
+
+    def acquire(self, model_path: str | None) -> ModelHandle:
+        _resolved, _exists, path_for_load = resolve_model_path(model_path)
+        key = self.make_key(path_for_load)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _ModelEntry(key, path_for_load)
+                rss_before = _process_rss()
+                started = time.perf_counter()
+                backend = self._loader(path_for_load)
+                entry.load_time_s = time.perf_counter() - started
+                rss_after = _process_rss()
+                if rss_before is not None and rss_after is not None:
+                    entry.rss_delta_bytes = max(0, rss_after - rss_before)
+                entry.param_bytes = backend.parameter_bytes()
+                entry.backend = backend
+                entry.loaded_at = time.time()
+                self._entries[key] = entry
+                log.info("[ModelRegistry] Modelo carregado '%s' em %.2fs (RSS +%s MB)",
+                         path_for_load, entry.load_time_s,
+                         f"{entry.rss_delta_bytes / 1048576:.1f}" if entry.rss_delta_bytes is not None else "?")
+            entry.refs += 1
+            return ModelHandle(self, entry)
+
+    def _release(self, entry: _ModelEntry):
+        with self._lock:
+            entry.refs -= 1
+            if entry.refs > 0:
+                return
+            if self._entries.get(entry.key) is entry:
+                del self._entries[entry.key]
+            entry.backend = None
+        log.info("[ModelRegistry] Modelo liberado '%s' (sem referencias)", entry.path_for_load)
+        gc.collect()
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            return [
+                {
+                    "path": e.path_for_load,
+                    "backend": e.backend.name if e.backend is not None else None,
+                    "mtime": e.key[1],
+                    "refs": e.refs,
+                    "load_time_s": round(e.load_time_s, 3) if e.load_time_s is not None else None,
+                    "rss_delta_bytes": e.rss_delta_bytes,
+                    "param_bytes": e.param_bytes,
+                    "loaded_at": e.loaded_at,
+                }
+                for e in self._entries.values()
+            ]
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,171 @@
+# services/model_warmup.py
+"""
+Pre-carregamento e aquecimento dos modelos das TCs no boot (opcional).
+
+Com MODEL_WARMUP_ON_BOOT=1 o create_app dispara uma thread que, para cada TC
+cadastrada, carrega o modelo no registro (services/model_registry.py) e roda
+algumas inferencias com uma imagem vazia do tamanho que a TC usa. A primeira
+inferencia depois de carregar o modelo e bem mais lenta (alocacoes e kernels);
+assim ela acontece no boot e nao no primeiro frame apos o START.
+
+O aquecimento guarda uma referencia ao modelo de cada TC: o START encontra os
+pesos ja carregados no registro e apenas incrementa a referencia. Ao editar a
+TC o modelo anterior e devolvido (`forget`) e o novo e aquecido; ao remover,
+apenas devolvido.
+"""
+import os
+import threading
+import time
+import logging
+
+from services.tc_repository import normalize_infer_settings
+
+log = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def warmup_enabled() -> bool:
+    return (os.getenv("MODEL_WARMUP_ON_BOOT", "0").strip().lower() not in ("0", "false", "nao", "no", "off", ""))
+
+
+def _frame_size() -> tuple[int, int]:
+    """(largura, altura) assumida para TCs em modo 'quadro' (MODEL_WARMUP_FRAME, padrao 1920x1080)."""
+    raw = (os.getenv("MODEL_WARMUP_FRAME") or "1920x1080").lower()
+    try:
+        w, h = (int(v) for v in raw.split("x", 1))
+        if w > 0 and h > 0:
+            return w, h
+    except ValueError:
+        pass
+    log.warning("[Warmup] MODEL_WARMUP_FRAME invalido ('%s'); usando 1920x1080", raw)
+    return 1920, 1080
+
+
+def model_for_tc(tc: dict) -> tuple[str, str]:
+    """(caminho para carregar, precisao) com a mesma escolha do detector (int8 so se liberado)."""
+    from services.model_registry import resolve_model_path
+    resolved, exists, path_for_load = resolve_model_path(tc.get("model_path") or "sacaria_yolov5n.pt")
+    if (tc.get("model_precision") or "fp32").strip().lower() == "int8" and exists:
+        from services.quantization import approved_int8_model
+        int8_path, _reason = approved_int8_model(resolved, tc.get("id"))
+        if int8_path:
+            return int8_path, "int8"
+    return path_for_load, "fp32"
+
+
+def input_shape(tc: dict, frame_size: tuple[int, int]) -> tuple[int, int]:
+    """(altura, largura) da imagem entregue ao modelo: recorte da ROI + margem ou o frame inteiro."""
+    infer_mode, infer_margin, _size = normalize_infer_settings(
+        tc.get("infer_mode"), tc.get("infer_margin", 32), tc.get("infer_size", 640))
+    w_frame, h_frame = frame_size
+    if infer_mode == "roi":
+        try:
+            x, y, w, h = (int(v) for v in str(tc.get("roi") or "").split(","))
+        except ValueError:
+            x = y = w = h = 0
+        if w > 0 and h > 0:
+            # Mesmo recorte do detector; o frame real pode ser maior que o assumido
+            x0, y0 = max(0, x - infer_margin), max(0, y - infer_margin)
+            return (y + h + infer_margin) - y0, (x + w + infer_margin) - x0
+    return h_frame, w_frame
+
+
+class ModelWarmup:
+    """Estado de prontidao por TC e referencias aos modelos aquecidos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._status = {}    # tc_id -> dict
+        self._handles = {}   # tc_id -> ModelHandle
+
+    def start(self, tcs: list[dict], runs: int | None = None):
+        """Aquece os modelos das TCs em uma thread de fundo (nao bloqueia o boot)."""
+        runs = max(1, runs if runs is not None else _env_int("MODEL_WARMUP_RUNS", 3))
+        frame_size = _frame_size()
+        tcs = [dict(tc) for tc in tcs]
+        with self._lock:
+            for tc in tcs:
+                self._status[tc["id"]] = {"state": "pendente"}
+        threading.Thread(target=self._run, args=(tcs, runs, frame_size), name="model-warmup", daemon=True).start()
+        log.info("[Warmup] Aquecendo modelos de %d TC(s) em segundo plano (%d inferencias cada)", len(tcs), runs)
+
+    def _run(self, tcs, runs, frame_size):
+        started = time.perf_counter()
+        for tc in tcs:
+            self.warm_tc(tc, runs, frame_size)
+        ready = sum(1 for s in self.status().values() if s.get("state") == "pronto")
+        log.info("[Warmup] Concluido em %.1fs: %d/%d TC(s) prontas", time.perf_counter() - started, ready, len(tcs))
+
+    def warm_tc(self, tc: dict, runs: int = 3, frame_size=(1920, 1080)):
+        import numpy as np
+        from services.model_registry import model_registry
+
+        tc_id = tc["id"]
+        _mode, _margin, infer_size = normalize_infer_settings(
+            tc.get("infer_mode"), tc.get("infer_margin", 32), tc.get("infer_size", 640))
+        handle = None
+        try:
+            path, precision = model_for_tc(tc)
+            self._set(tc_id, state="carregando", model=path, precision=precision)
+            t0 = time.perf_counter()
+            handle = model_registry.acquire(path)
+            load_s = time.perf_counter() - t0
+            shape = input_shape(tc, frame_size)
+            self._set(tc_id, state="aquecendo", load_s=round(load_s, 3), input_shape=list(shape), infer_size=infer_size)
+            image = np.zeros((shape[0], shape[1], 3), dtype=np.uint8)
+            times_ms = []
+            for _ in range(runs):
+                t0 = time.perf_counter()
+                handle.model.predict([image], size=infer_size)
+                times_ms.append(round((time.perf_counter() - t0) * 1000.0, 1))
+        except Exception as e:
+            if handle is not None:
+                handle.release()
+            self._set(tc_id, state="erro", error=str(e))
+            log.warning("[Warmup] TC %s: falha ao aquecer o modelo (%s)", tc_id, e)
+            return
+        with self._lock:
+            previous = self._handles.pop(tc_id, None)
+            self._handles[tc_id] = handle
+            self._status.setdefault(tc_id, {}).update(state="pronto", warmup_ms=times_ms, ready_at=time.time())
+        if previous is not None:
+            previous.release()
+        log.info("[Warmup] TC %s pronta: modelo '%s' (%s) carregado em %.2fs | inferencias %s ms (%dx%d -> %d)",
+                 tc_id, path, precision, load_s, times_ms, shape[1], shape[0], infer_size)
+
+    def _set(self, tc_id, **fields):
+        with self._lock:
+            self._status.setdefault(tc_id, {}).update(fields)
+
+    def forget(self, tc_id):
+        """Devolve o modelo aquecido da TC (cadastro alterado ou removido)."""
+        with self._lock:
+            handle = self._handles.pop(tc_id, None)
+            self._status.pop(tc_id, None)
+        if handle is not None:
+            handle.release()
+
+    def release_all(self):
+        with self._lock:
+            handles = list(self._handles.values())
+            self._handles.clear()
+            self._status.clear()
+        for handle in handles:
+            handle.release()
+
+    def status(self, tc_id=None):
+        """Prontidao de uma TC (None se nao foi aquecida) ou de todas ({tc_id: estado})."""
+        with self._lock:
+            if tc_id is not None:
+                entry = self._status.get(tc_id)
+                return dict(entry) if entry is not None else None
+            return {k: dict(v) for k, v in self._status.items()}
+
+
+model_warmup = ModelWarmup()
@@ -0,0 +1,78 @@
+# services/motion_gate.py
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Portao de movimento barato na frente do detector.
+
+    Compara uma versao reduzida e em tons de cinza da regiao monitorada (ROI +
+    margem, ou o quadro inteiro sem ROI) com a referencia guardada na ultima
+    inferencia. Se o percentual de pixels que mudaram mais de `pixel_delta`
+    niveis ficar abaixo de `threshold_pct`, o frame pode ser pulado.
+    A referencia so e trocada quando ha inferencia, entao mudancas lentas
+    (sacaria entrando devagar) acumulam ate disparar o portao.
+    """
+
+    def __init__(self, threshold_pct: float, pixel_delta: int = 25, width: int = 160, keepalive_s: float = 2.0):
+        self.threshold_pct = max(0.0, float(threshold_pct))
+        self.pixel_delta = max(1, min(255, int(pixel_delta)))
+        self.width = max(16, int(width))
+        # Inferencia forcada de tempos em tempos (ajuste de iluminacao, seguranca)
+        self.keepalive_s = max(0.0, float(keepalive_s))
+        self._reference = None
+        self._last_open = 0.0
+        self.last_score = 0.0
+        self.skipped = 0
+        self.inferred = 0
+
+    def reset(self):
+        self._reference = None
+
+    def _thumbnail(self, frame, box):
+        region = frame if box is None else frame[box[1]:box[3], box[0]:box[2]]
+        h, w = region.shape[:2]
+        scale = self.width / float(max(1, w))
+        size = (self.width, max(1, int(round(h * scale))))
+        small = cv2.resize(region, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def check(self, frame, box=None, force: bool = False) -> bool:
+        """
+        True quando o frame deve ir para o modelo. `force` (ex.: ha rastros vivos)
+        sempre libera a inferencia, mas mantem a referencia atualizada.
+        """
+        thumb = self._thumbnail(frame, box)
+        now = time.monotonic()
+        reference = self._reference
+        if reference is None or reference.shape != thumb.shape:
+            self.last_score = 100.0
+            is_open = True
+        else:
+            diff = cv2.absdiff(thumb, reference)
+            self.last_score = 100.0 * float(np.count_nonzero(diff > self.pixel_delta)) / diff.size
+            is_open = (force or self.last_score >= self.threshold_pct
+                       or (self.keepalive_s > 0 and now - self._last_open >= self.keepalive_s))
+        if is_open:
+            self._reference = thumb
+            self._last_open = now
+            self.inferred += 1
+        else:
+            self.skipped += 1
+        return is_open
+
+    def stats(self) -> dict:
+        total = self.inferred + self.skipped
+        return {
+            "threshold_pct": self.threshold_pct,
+            "pixel_delta": self.pixel_delta,
+            "frames_inferred": self.inferred,
+            "frames_skipped": self.skipped,
+            "skipped_ratio": round(self.skipped / total, 4) if total else 0.0,
+            "last_score_pct": round(self.last_score, 3),
+        }
@@ -0,0 +1,219 @@
+# services/quantization.py
+"""
+Modelo int8 (ONNX Runtime, quantizacao estatica) e a liberacao por TC.
+
+O arquivo quantizado fica ao lado do modelo configurado na TC
+(`<modelo>.int8.onnx`) junto com o relatorio `<modelo>.int8.json`, gerados por
+scripts/quantize_int8.py. O relatorio guarda o hash do modelo fp32 de origem e,
+por TC, o resultado da comparacao com o fp32 no mesmo video. Uma TC so usa o
+int8 quando existe uma validacao aprovada para ela e para o modelo atual.
+"""
+import json
+import os
+import logging
+from datetime import datetime
+
+import numpy as np
+
+from services.tc_repository import MODEL_PRECISIONS  # noqa: F401  (precisoes aceitas pela TC)
+
+log = logging.getLogger(__name__)
+
+
+def int8_paths(model_path: str):
+    """(modelo int8, relatorio) derivados do modelo fp32 configurado."""
+    stem = os.path.splitext(model_path)[0]
+    return f"{stem}.int8.onnx", f"{stem}.int8.json"
+
+
+def load_report(model_path: str) -> dict | None:
+    _onnx, report_path = int8_paths(model_path)
+    try:
+        with open(report_path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+    except Exception as err:
+        log.warning("[INT8] Relatorio invalido '%s': %s", report_path, err)
+        return None
+
+
+def save_report(model_path: str, report: dict):
+    _onnx, report_path = int8_paths(model_path)
+    tmp = report_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, ensure_ascii=False, indent=2)
+    os.replace(tmp, report_path)
+
+
+def approved_int8_model(model_path: str, tc_id) -> tuple[str | None, str]:
+    """
+    Caminho do int8 liberado para a TC, ou (None, motivo). `model_path` e o
+    modelo fp32 resolvido da TC (o hash dele precisa bater com o do relatorio).
+    """
+    from services.model_cache import weights_hash
+    int8_path, _report_path = int8_paths(model_path)
+    if not os.path.isfile(model_path):
+        return None, "modelo fp32 nao encontrado"
+    if not os.path.isfile(int8_path):
+        return None, f"modelo int8 inexistente ({os.path.basename(int8_path)})"
+    report = load_report(model_path)
+    if not report:
+        return None, "sem relatorio de validacao"
+    if report.get("source_hash") != weights_hash(model_path):
+        return None, "modelo fp32 mudou depois da quantizacao"
+    validation = (report.get("validations") or {}).get(str(tc_id))
+    if not validation:
+        return None, f"nao validado para a TC {tc_id}"
+    if not validation.get("passed"):
+        return None, f"validacao reprovada para a TC {tc_id}"
+    if validation.get("int8_hash") != weights_hash(int8_path):
+        return None, "modelo int8 mudou depois da validacao"
+    return int8_path, "ok"
+
+
+def record_validation(model_path: str, tc_id, validation: dict, source_hash: str):
+    report = load_report(model_path) or {}
+    if report.get("source_hash") != source_hash:
+        # Novo modelo de origem: validacoes anteriores deixam de valer
+        report = {"validations": {}}
+    report["source_hash"] = source_hash
+    report["source"] = os.path.basename(model_path)
+    report.setdefault("validations", {})[str(tc_id)] = dict(validation, validated_at=datetime.now().isoformat(timespec="seconds"))
+    save_report(model_path, report)
+
+
+# ---------- quantizacao ----------
+def detect_head_nodes(model) -> list[str]:
+    """
+    Nos do pos-processamento da camada Detect (depois das ultimas convolucoes).
+    Ficam em float: caixas em pixels e confiancas em [0, 1] na mesma saida
+    perdem muita precisao com uma unica escala int8.
+    """
+    graph = model.graph
+    consumers = {}
+    for node in graph.node:
+        for name in node.input:
+            consumers.setdefault(name, []).append(node)
+
+    def descendants(node):
+        seen, stack = [], list(node.output)
+        visited = set()
+        while stack:
+            for child in consumers.get(stack.pop(), []):
+                if id(child) in visited:
+                    continue
+                visited.add(id(child))
+                seen.append(child)
+                stack.extend(child.output)
+        return seen
+
+    head = []
+    for node in graph.node:
+        if node.op_type != "Conv":
+            continue
+        below = descendants(node)
+        if not any(child.op_type == "Conv" for child in below):
+            head.extend(child for child in below if child.op_type != "Conv")
+    names = []
+    for node in head:
+        if node.name and node.name not in names:
+            names.append(node.name)
+    return names
+
+
+def quantize_onnx(fp32_path: str, int8_path: str, blobs, per_channel: bool = True) -> dict:
+    """Quantizacao estatica QDQ (pesos int8, ativacoes uint8) calibrada com `blobs` (CHW float32)."""
+    import onnx
+    from onnxruntime.quantization import (
+        CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType, quantize_static,
+    )
+
+    model = onnx.load(fp32_path)
+    input_name = model.graph.input[0].name
+    excluded = detect_head_nodes(model)
+    unnamed = [n for n in model.graph.node if not n.name]
+    if unnamed:
+        log.warning("[INT8] %d no(s) sem nome no grafo; a camada Detect pode nao ficar toda em float.", len(unnamed))
+
+    class _Reader(CalibrationDataReader):
+        def __init__(self):
+            self._iter = iter(blobs)
+            self.count = 0
+
+        def get_next(self):
+            blob = next(self._iter, None)
+            if blob is None:
+                return None
+            self.count += 1
+            return {input_name: blob[None].astype(np.float32)}
+
+    reader = _Reader()
+    tmp = int8_path + ".tmp"
+    quantize_static(
+        fp32_path,
+        tmp,
+        reader,
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=per_channel,
+        calibrate_method=CalibrationMethod.MinMax,
+        nodes_to_exclude=excluded,
+    )
+    os.replace(tmp, int8_path)
+    return {"calibration_frames": reader.count, "excluded_nodes": len(excluded), "per_channel": per_channel}
+
+
+# ---------- comparacao fp32 x int8 ----------
+def _iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+class DetectionComparison:
+    """Acumula a concordancia frame a frame entre deteccoes de referencia (fp32) e de teste (int8)."""
+
+    def __init__(self, min_conf: float = 0.0, iou_thres: float = 0.5):
+        self.min_conf = float(min_conf)
+        self.iou_thres = float(iou_thres)
+        self.ref_total = 0
+        self.test_total = 0
+        self.matched = 0
+        self._iou_sum = 0.0
+        self._conf_delta_sum = 0.0
+        self.frames = 0
+
+    def add(self, ref: np.ndarray, test: np.ndarray):
+        from scipy.optimize import linear_sum_assignment
+        ref = ref[ref[:, 4] >= self.min_conf] if ref.shape[0] else ref
+        test = test[test[:, 4] >= self.min_conf] if test.shape[0] else test
+        self.frames += 1
+        self.ref_total += ref.shape[0]
+        self.test_total += test.shape[0]
+        if not ref.shape[0] or not test.shape[0]:
+            return
+        iou = _iou_matrix(ref[:, :4], test[:, :4])
+        r_idx, t_idx = linear_sum_assignment(-iou)
+        keep = iou[r_idx, t_idx] >= self.iou_thres
+        r_idx, t_idx = r_idx[keep], t_idx[keep]
+        self.matched += int(r_idx.size)
+        self._iou_sum += float(iou[r_idx, t_idx].sum())
+        self._conf_delta_sum += float(np.abs(ref[r_idx, 4] - test[t_idx, 4]).sum())
+
+    def summary(self) -> dict:
+        return {
+            "frames": self.frames,
+            "fp32_detections": self.ref_total,
+            "int8_detections": self.test_total,
+            "recall": round(self.matched / self.ref_total, 4) if self.ref_total else 1.0,
+            "precision": round(self.matched / self.test_total, 4) if self.test_total else 1.0,
+            "mean_iou": round(self._iou_sum / self.matched, 4) if self.matched else None,
+            "mean_conf_delta": round(self._conf_delta_sum / self.matched, 4) if self.matched else None,
+        }
@@ -0,0 +1,421 @@
+# services/shm_source.py
+"""
+Fonte de video decodificada em um processo separado (um por camera).
+
+O processo filho abre a camera/arquivo (OpenCV ou ffmpeg, como na TC) e
+decodifica direto em um anel de frames em memoria compartilhada
+(`multiprocessing.shared_memory`). O processo web so recebe pelo pipe o
+indice do slot pronto e publica esse slot para os leitores: detector,
+video ao vivo e gravacao leem views do mesmo buffer, sem copia, com o
+numero de sequencia do anel (mesma interface do VideoSource: reader(),
+get_frame(), release()).
+
+Posse dos slots: cada slot pertence ao filho (livre para decodificar) ou ao
+processo web (publicado). Quando nenhum leitor segura um slot publicado e ele
+deixa de ser o mais recente, o processo web devolve o indice ao filho. Sem
+slot livre, arquivo espera o consumidor; stream descarta o frame mais antigo
+das filas 'todos' ou, sem fila, le e descarta o frame novo.
+
+Um crash do decodificador (erro nativo do OpenCV/FFmpeg, camera travada)
+derruba so o filho: o processo web registra, mantem o ultimo frame e
+reinicia o decodificador com espera crescente (1 s ate 30 s).
+
+Configuracao:
+  - VIDEO_PROCESS_SLOTS: slots do anel (padrao 6; a fila 'todos' soma o seu tamanho)
+  - VIDEO_PROCESS_STALL_S: segundos sem frame ate reiniciar o decodificador (padrao 15)
+  - VIDEO_PROCESS_OPEN_TIMEOUT_S: espera pelo primeiro frame ao abrir (padrao 30)
+"""
+import os
+import signal
+import threading
+import time
+import logging
+import multiprocessing as mp
+from collections import deque
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from services.video_source import VideoSource, _Slot
+
+log = logging.getLogger(__name__)
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return max(0.0, float(os.getenv(name, default)))
+    except (TypeError, ValueError):
+        return default
+
+
+def default_slots() -> int:
+    try:
+        return max(3, int(os.getenv("VIDEO_PROCESS_SLOTS", "6")))
+    except (TypeError, ValueError):
+        return 6
+
+
+class _ShmSlot(_Slot):
+    """Slot do anel compartilhado: indice no segmento e se o filho pode decodificar nele."""
+    __slots__ = ("index", "in_child")
+
+    def __init__(self, index, buffer):
+        super().__init__()
+        self.index = index
+        self.buffer = buffer
+        self.in_child = True
+
+
+# ---------- processo filho ----------
+
+class _ChildDecoder:
+    """Decodificador sincrono do filho, sobre o VideoSource/FfmpegVideoSource sem thread."""
+
+    def __init__(self, source_path, backend, crop, fps):
+        self.backend = backend
+        self.delay = 0.0
+        if backend == "ffmpeg":
+            from services.ffmpeg_source import FfmpegVideoSource
+            # paced: arquivo no ritmo nativo e em loop pelo proprio ffmpeg
+            self.source = FfmpegVideoSource(source_path, realtime=False, crop=crop, fps=fps, paced=True)
+        else:
+            self.source = VideoSource(source_path, realtime=False)
+            if self.source.is_file and self.source.is_opened():
+                self.delay = self.source._file_delay()
+        self.offset = self.source.offset
+
+    def is_opened(self) -> bool:
+        return self.source.is_opened()
+
+    def read(self, buffer):
+        if self.backend == "ffmpeg":
+            return self.source._read_into(buffer)
+        return self.source.cap.read(buffer) if buffer is not None else self.source.cap.read()
+
+    def rewind(self) -> bool:
+        """Arquivo no OpenCV: volta ao inicio no fim do video (o ffmpeg ja faz o loop)."""
+        if self.backend == "ffmpeg" or not self.source.is_file:
+            return False
+        self.source.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return True
+
+    def release(self):
+        try:
+            self.source.release()
+        except Exception:
+            pass
+
+
+def _decoder_main(events, control, source_path, backend, crop, fps):
+    """Entrada do processo filho: decodifica no anel ate receber 'parar' ou o pai sumir."""
+    # Ctrl+C no console chega ao grupo todo: quem encerra o filho e o processo web
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    decoder = _ChildDecoder(source_path, backend, crop, fps)
+    try:
+        _decode_loop(events, control, decoder)
+    except (EOFError, OSError):
+        pass        # pipe fechado: o processo web encerrou
+    finally:
+        decoder.release()
+
+
+def _decode_loop(events, control, decoder):
+    if not decoder.is_opened():
+        events.send(("erro", "fonte nao abriu"))
+        return
+    ok, first = decoder.read(None)
+    if not ok:
+        events.send(("erro", "nenhum frame decodificado"))
+        return
+    events.send(("aberto", first.shape, decoder.offset))
+    msg = control.recv()
+    if msg[0] != "anel":
+        return
+    shm = shared_memory.SharedMemory(name=msg[1])
+    frames = target = None
+    try:
+        frames = np.ndarray((msg[2],) + first.shape, dtype=np.uint8, buffer=shm.buf)
+        free = deque(msg[3])
+        pending, scratch, dropped = first, None, 0
+        while True:
+            # Slots devolvidos pelo processo web; arquivo sem slot livre espera o consumidor
+            wait = 0.1 if not free and decoder.source.is_file else 0
+            while control.poll(wait):
+                msg = control.recv()
+                if msg[0] == "parar":
+                    return
+                free.append(msg[1])
+                wait = 0
+            if not free:
+                if decoder.source.is_file:
+                    continue
+                # Stream sem slot livre: le e descarta para nao acumular atraso na camera
+                ok, scratch = decoder.read(scratch)
+                if not ok:
+                    break
+                dropped += 1
+                continue
+            index = free.popleft()
+            target = frames[index]
+            if pending is not None:
+                target[...] = pending
+                ok, pending = True, None
+            else:
+                ok, frame = decoder.read(target)
+                if ok and frame.ctypes.data != target.ctypes.data:
+                    # Decodificador alocou outro buffer (ex.: resolucao mudou)
+                    if frame.shape != target.shape:
+                        events.send(("erro", f"resolucao mudou para {frame.shape[1]}x{frame.shape[0]}"))
+                        return
+                    target[...] = frame
+            if not ok:
+                free.appendleft(index)
+                if decoder.rewind():
+                    continue
+                break
+            events.send(("frame", index, dropped))
+            if decoder.delay > 0:
+                time.sleep(decoder.delay)
+        events.send(("erro", "leitura falhou (stream encerrado)"))
+    finally:
+        frames = target = None
+        try:
+            shm.close()
+        except BufferError:
+            pass
+
+
+# ---------- processo web ----------
+
+class ProcessVideoSource(VideoSource):
+    """
+    VideoSource cujo decodificador roda em um processo filho com anel em memoria compartilhada.
+
+    backend: 'opencv' ou 'ffmpeg' (crop/fps valem so para o ffmpeg, como no FfmpegVideoSource).
+    slots:   tamanho do anel (None = VIDEO_PROCESS_SLOTS).
+    """
+
+    def __init__(self, source_path, backend="opencv", crop=None, fps=None, slots=None):
+        self._init_state(source_path, True, slots)
+        self._on_slots_released = self._return_slots_locked
+        self.backend = backend
+        self.crop = crop
+        self.fps = fps
+        self.slot_count = max(3, int(slots or default_slots()))
+        self.stall_s = _env_float("VIDEO_PROCESS_STALL_S", 15.0) or 15.0
+        self.open_timeout_s = _env_float("VIDEO_PROCESS_OPEN_TIMEOUT_S", 30.0) or 30.0
+        self.shm = None
+        self.frame_shape = None
+        self._retired = []          # segmentos antigos (resolucao mudou) que leitores ainda podem ver
+        self.proc = None
+        self.events = None          # filho -> web: ('aberto' | 'frame' | 'erro', ...)
+        self.control = None         # web -> filho: ('anel' | 'livre' | 'parar', ...)
+        self.restarts = 0
+        self.decoder_dropped = 0
+        self.last_error = None
+        self._backoff = 1.0
+        self._opened = False
+        self._opened = self._start_child()
+        if not self._opened:
+            print(f"[ERRO] Não foi possível abrir a fonte de vídeo (processo): {source_path} ({self.last_error})")
+            self._stop_child()
+            return
+        log.info("[decoder] '%s' em processo separado (pid=%s, %s, anel=%d x %dx%d)", source_path,
+                 self.proc.pid, backend, len(self._slots), self.frame_shape[1], self.frame_shape[0])
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def is_opened(self) -> bool:
+        return self._opened
+
+    # ----- ciclo de vida do filho -----
+    def _start_child(self) -> bool:
+        ctx = mp.get_context("spawn")
+        events_r, events_w = ctx.Pipe(duplex=False)
+        control_r, control_w = ctx.Pipe(duplex=False)
+        proc = ctx.Process(target=_decoder_main, name="decoder",
+                           args=(events_w, control_r, self.source_path, self.backend, self.crop, self.fps),
+                           daemon=True)
+        try:
+            proc.start()
+        except Exception as err:
+            self.last_error = f"falha ao iniciar o processo: {err}"
+            return False
+        finally:
+            events_w.close()
+            control_r.close()
+        self.proc, self.events = proc, events_r
+        msg = ("erro", "tempo esgotado ao abrir")
+        deadline = time.monotonic() + self.open_timeout_s
+        try:
+            while time.monotonic() < deadline and not self.stop_event.is_set():
+                if events_r.poll(0.5):
+                    msg = events_r.recv()
+                    break
+        except (EOFError, OSError):
+            msg = ("erro", f"processo encerrou ao abrir (exitcode={proc.exitcode})")
+        if msg[0] != "aberto" or self.stop_event.is_set():
+            self.last_error = msg[1]
+            control_w.close()
+            return False
+        shape, offset = tuple(msg[1]), tuple(msg[2])
+        with self.lock:
+            if self._opened and offset != self.offset:
+                log.warning("[decoder] '%s': recorte mudou de %s para %s", self.source_path, self.offset, offset)
+            self.offset = offset
+            self._setup_ring(shape)
+            free = [slot.index for slot in self._slots if slot.in_child]
+            control_w.send(("anel", self.shm.name, len(self._slots), free))
+            self.control = control_w
+        return True
+
+    def _setup_ring(self, shape):
+        """Cria o segmento compartilhado (ou reaproveita, mesma resolucao) e define a posse dos slots."""
+        if self.shm is not None and self.frame_shape == shape:
+            # Decodificador reiniciado: o que nenhum leitor segura volta para o filho
+            for slot in self._slots:
+                slot.in_child = slot is not self._latest and slot.pins == 0
+            return
+        if self.shm is not None:
+            self._retired.append(self.shm)
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slot_count * int(np.prod(shape)))
+        frames = np.ndarray((self.slot_count,) + shape, dtype=np.uint8, buffer=self.shm.buf)
+        self._slots = [_ShmSlot(i, frames[i]) for i in range(self.slot_count)]
+        self.frame_shape = shape
+
+    def _stop_child(self):
+        with self.lock:
+            control, self.control = self.control, None
+        proc, self.proc = self.proc, None
+        events, self.events = self.events, None
+        if control is not None:
+            try:
+                control.send(("parar",))
+            except (OSError, ValueError):
+                pass
+        if proc is not None:
+            proc.join(timeout=1.0)
+            if proc.is_alive():
+                proc.kill()
+                proc.join(timeout=2.0)
+        for conn in (control, events):
+            if conn is not None:
+                conn.close()
+
+    # ----- recepcao dos frames -----
+    def _receive(self):
+        """Proxima mensagem do filho; None se ele morreu ou ficou sem frames por stall_s."""
+        events = self.events
+        if events is None:
+            return None
+        deadline = time.monotonic() + self.stall_s
+        while not self.stop_event.is_set():
+            try:
+                if events.poll(0.5):
+                    return events.recv()
+            except (EOFError, OSError):
+                self.last_error = self.last_error or "processo encerrou"
+                return None
+            if time.monotonic() > deadline:
+                self.last_error = f"sem frames por {self.stall_s:g}s"
+                return None
+        return None
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            msg = self._receive()
+            if msg is None:
+                if not self.stop_event.is_set():
+                    self._restart()
+                continue
+            if msg[0] == "frame":
+                with self.lock:
+                    while self._queue_full_locked() and not self.stop_event.is_set():
+                        self.cond.wait(0.1)
+                    slot = self._slots[msg[1]]
+                    slot.in_child = False
+                    self.decoder_dropped = msg[2]
+                    self.ret = True
+                    self._publish_locked(slot, slot.buffer)
+                    if not self.is_file and not any(s.in_child for s in self._slots):
+                        # Stream com o anel todo preso nas filas 'todos': descarta o mais antigo
+                        # para o filho ter onde decodificar (em vez de descartar o frame novo)
+                        self._drop_queued_locked()
+                    self._return_slots_locked()
+                self._backoff = 1.0
+                self.last_error = None
+            elif msg[0] == "erro":
+                self.last_error = msg[1]
+
+    def _restart(self):
+        proc = self.proc
+        self._stop_child()
+        exitcode = proc.exitcode if proc is not None else None
+        with self.lock:
+            self.ret = False
+        self.restarts += 1
+        print(f"[decoder] Decodificador de '{self.source_path}' parou ({self.last_error or 'sem mensagem'}, "
+              f"exitcode={exitcode}); reiniciando em {self._backoff:g}s.")
+        if self.stop_event.wait(self._backoff):
+            return
+        self._backoff = min(30.0, self._backoff * 2)
+        if not self._start_child():
+            self._stop_child()
+
+    def _return_slots_locked(self):
+        """Devolve ao filho os slots publicados que nenhum leitor segura (exceto o mais recente)."""
+        if self.control is None:
+            return
+        for slot in self._slots:
+            if not slot.in_child and slot is not self._latest and slot.pins == 0:
+                try:
+                    self.control.send(("livre", slot.index))
+                except (OSError, ValueError):
+                    return
+                slot.in_child = True
+
+    def stats(self) -> dict:
+        """Estado do decodificador: pid, reinicios, frames descartados no filho (stream sem slot livre)."""
+        proc = self.proc
+        return {
+            "mode": "processo",
+            "backend": self.backend,
+            "pid": proc.pid if proc is not None else None,
+            "alive": bool(proc is not None and proc.is_alive()),
+            "restarts": self.restarts,
+            "slots": len(self._slots),
+            "decoder_dropped": self.decoder_dropped,
+            "last_error": self.last_error,
+        }
+
+    def release(self):
+        try:
+            self.stop_event.set()
+            with self.cond:
+                self.cond.notify_all()
+        except Exception:
+            pass
+        try:
+            if self.thread and self.thread.is_alive():
+                self.thread.join(timeout=1.0)
+        except Exception:
+            pass
+        self._stop_child()
+        # Views ainda em uso por leitores impedem o close(); o unlink libera o nome mesmo assim
+        with self.lock:
+            self._slots = []
+            self._latest = None
+        for shm in [self.shm] + self._retired:
+            if shm is None:
+                continue
+            try:
+                shm.close()
+            except BufferError:
+                pass
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        self.shm = None
+        self._retired = []
@@ -0,0 +1,222 @@
+# services/snapshot_writer.py
+import itertools
+import os
+import queue
+import threading
+import time
+import logging
+
+import cv2
+
+log = logging.getLogger(__name__)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except Exception:
+        return default
+
+
+class _SnapshotJob:
+    __slots__ = ("directory", "name", "frame", "box", "decorate", "submitted_at")
+
+    def __init__(self, directory, name, frame, box, decorate):
+        self.directory = directory
+        self.name = name
+        self.frame = frame
+        self.box = box
+        self.decorate = decorate
+        self.submitted_at = time.perf_counter()
+
+
+class SnapshotWriter:
+    """
+    Gravacao de snapshots fora da thread de deteccao.
+
+    `submit()` nunca bloqueia: o frame entra em uma fila limitada (`max_pending`)
+    e, se ela estiver cheia, o snapshot e descartado e contado em `dropped`.
+    Os workers desenham no frame recebido (overlay + caixa), codificam o JPEG e
+    gravam com criacao exclusiva. O nome recebe um sufixo com o pid e um
+    sequencial do processo (unico tambem entre reinicios do servico), entao
+    nao ha varredura de `os.path.exists` para achar nome livre.
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 16, jpeg_quality: int = 95):
+        self.workers = max(1, int(workers))
+        self.max_pending = max(1, int(max_pending))
+        self.jpeg_quality = max(1, min(100, int(jpeg_quality)))
+        self._queue = queue.Queue(maxsize=self.max_pending)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        # pid: o sequencial e os IDs dos rastros recomecam em 1 quando o servico reinicia
+        self._prefix = f"{os.getpid()}-"
+        self._known_dirs = set()
+        self._stop = False
+        # contadores
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._write_total_s = 0.0
+        self._write_max_s = 0.0
+        self._lag_max_s = 0.0
+
+    # ---------- API ----------
+    def next_name(self, base_name: str) -> str:
+        """Nome unico (pid + sequencial do processo), sem consultar o sistema de arquivos."""
+        return f"{base_name}_{self._prefix}{next(self._seq):05d}"
+
+    def submit(self, directory: str, name: str, frame, box=None, decorate=None) -> bool:
+        """
+        Agenda `frame` para `directory/name.jpg`. O escritor passa a ser dono do frame
+        (desenha nele sem copiar): entregue uma copia. Retorna False se descartado.
+        """
+        job = _SnapshotJob(directory, name, frame, box, decorate)
+        self._ensure_workers()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                dropped = self.dropped
+            if dropped == 1 or dropped % 50 == 0:
+                log.warning("[Snapshots] Fila cheia (%d); snapshot descartado (%d descartes ate agora).",
+                            self.max_pending, dropped)
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Espera a fila esvaziar (ex.: fim de sessao); False se o tempo acabar."""
+        deadline = time.monotonic() + max(0.0, timeout)
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            written = self.written
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._queue.qsize(),
+                "submitted": self.submitted,
+                "written": written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "write_avg_ms": round(self._write_total_s * 1000.0 / written, 3) if written else 0.0,
+                "write_max_ms": round(self._write_max_s * 1000.0, 3),
+                "queue_lag_max_ms": round(self._lag_max_s * 1000.0, 3),
+            }
+
+    def shutdown(self, timeout: float = 2.0):
+        self.flush(timeout)
+        self._stop = True
+        for _ in self._threads:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+        for thread in self._threads:
+            thread.join(timeout=0.5)
+        self._threads = []
+
+    # ---------- workers ----------
+    def _ensure_workers(self):
+        if self._threads and all(t.is_alive() for t in self._threads):
+            return
+        with self._lock:
+            self._stop = False
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f"snapshot-writer-{len(self._threads) + 1}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _run(self):
+        while not self._stop:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._write(job)
+            finally:
+                self._queue.task_done()
+
+    def _ensure_dir(self, directory: str):
+        """makedirs so na primeira gravacao em cada pasta (esquecida apos uma falha de gravacao)."""
+        if directory in self._known_dirs:
+            return
+        os.makedirs(directory, exist_ok=True)
+        self._known_dirs.add(directory)
+
+    @staticmethod
+    def _store(path_file: str, encoded):
+        # 'xb': criacao exclusiva, nunca sobrescreve um arquivo existente
+        with open(path_file, "xb") as fh:
+            fh.write(encoded.tobytes())
+
+    def _write(self, job: _SnapshotJob):
+        started = time.perf_counter()
+        path_file = os.path.join(job.directory, f"{job.name}.jpg")
+        try:
+            image, job.frame = job.frame, None
+            if job.decorate is not None:
+                try:
+                    job.decorate(image)
+                except Exception:
+                    pass
+            if job.box is not None:
+                x1, y1, x2, y2 = job.box
+                cv2.rectangle(image, (x1, y1), (x2, y2), (255, 0, 0), 2)
+            ok, encoded = cv2.imencode(".jpg", image, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+            if not ok:
+                raise RuntimeError("falha ao codificar JPEG")
+            self._ensure_dir(job.directory)
+            try:
+                self._store(path_file, encoded)
+            except FileNotFoundError:
+                # Pasta apagada ou compartilhamento remontado depois de criada: recria e tenta de novo
+                self._known_dirs.discard(job.directory)
+                self._ensure_dir(job.directory)
+                self._store(path_file, encoded)
+            finished = time.perf_counter()
+            with self._lock:
+                self.written += 1
+                self._write_total_s += finished - started
+                self._write_max_s = max(self._write_max_s, finished - started)
+                self._lag_max_s = max(self._lag_max_s, started - job.submitted_at)
+            log.info("Snapshot nao contado salvo: %s", path_file)
+        except PermissionError as err:
+            self._known_dirs.discard(job.directory)
+            with self._lock:
+                self.failed += 1
+            log.error("Sem permissao para gravar snapshots (%s): %s", path_file, err)
+        except Exception as err:
+            # Proxima gravacao nesta pasta volta a conferir/criar o diretorio
+            self._known_dirs.discard(job.directory)
+            with self._lock:
+                self.failed += 1
+            log.warning("Falha ao salvar imagem de sacaria nao contada (%s): %s", path_file, err)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_snapshot_writer() -> SnapshotWriter:
+    """Escritor compartilhado do processo (workers/fila via ambiente)."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = SnapshotWriter(
+                workers=_env_int("SNAPSHOT_WORKERS", 2),
+                max_pending=_env_int("SNAPSHOT_QUEUE_MAX", 16),
+                jpeg_quality=_env_int("SNAPSHOT_JPEG_QUALITY", 95),
+            )
+        return _writer
@@ -0,0 +1,200 @@
+# services/source_pool.py
+"""
+Pool de fontes de video do processo, com contagem de referencias.
+
+TCs que apontam para a mesma camera (ex.: duas pistas vistas por uma camera,
+cada uma com a sua ROI) compartilham um unico decodificador: uma conexao RTSP
+por stream fisico, com os frames distribuidos pelo anel de frames da fonte
+(cada CapturePoint com o seu reader() e a sua politica de frames). O stream
+e fechado quando o ultimo assinante devolve a referencia.
+
+Chave: URL normalizada + backend (opencv/ffmpeg) + processo separado. A fonte
+do pool sempre decodifica o frame inteiro, sem recorte nem limite de fps no
+decodificador: a ROI de cada TC (inferencia na ROI) e a politica de frames
+('fps', 'cada_n'...) sao aplicadas no consumidor, pelo detector e pelo
+reader() da TC. Assim TCs com ROIs diferentes dividem a mesma conexao e o
+video ao vivo, os snapshots e a gravacao mostram a cena inteira. Com backend
+ou modo de processo diferentes para a mesma URL cada TC abre o seu
+decodificador e o pool registra um aviso (muitas cameras recusam o segundo
+cliente): alinhe a decodificacao das TCs.
+
+O anel de frames e dimensionado por quem abre (`slots`): com varias TCs na
+mesma camera, VIDEO_RING_SLOTS/VIDEO_PROCESS_SLOTS devem cobrir todos os leitores.
+"""
+import os
+import threading
+import time
+import logging
+from urllib.parse import urlsplit, urlunsplit
+
+log = logging.getLogger(__name__)
+
+_DEFAULT_PORTS = {"rtsp": 554, "rtsps": 322, "http": 80, "https": 443, "rtmp": 1935}
+
+
+def normalize_source(source_path: str) -> str:
+    """
+    Identidade do stream fisico: esquema/host em minusculas, sem porta padrao
+    nem barra final; arquivos pelo caminho absoluto (normcase no Windows).
+    """
+    path = (source_path or "").strip()
+    parts = urlsplit(path)
+    scheme = parts.scheme.lower()
+    if scheme not in _DEFAULT_PORTS:
+        return os.path.normcase(os.path.abspath(path)) if path else path
+    try:
+        port = parts.port
+    except ValueError:
+        return path
+    host = parts.hostname or ""
+    if ":" in host:
+        host = f"[{host}]"      # IPv6
+    if port is not None and port != _DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+    if parts.username is not None:
+        userinfo = parts.username if parts.password is None else f"{parts.username}:{parts.password}"
+        host = f"{userinfo}@{host}"
+    return urlunsplit((scheme, host, parts.path.rstrip("/"), parts.query, ""))
+
+
+def open_video_source(source_path, decode_backend="opencv", decode_process=False, slots=None):
+    """
+    Abre a fonte (frame inteiro) conforme a configuracao da TC: processo separado
+    (anel em memoria compartilhada), ffmpeg ou OpenCV, caindo para a opcao seguinte se nao abrir.
+    """
+    # Imports tardios: OpenCV/NumPy so entram quando uma TC abre a camera
+    from services.video_source import VideoSource
+    if decode_process:
+        from services.shm_source import ProcessVideoSource
+        source = ProcessVideoSource(source_path, backend=decode_backend, slots=slots)
+        if source.is_opened():
+            return source
+        log.warning("[SourcePool] decodificacao em processo indisponivel para '%s'; usando thread local", source_path)
+    if decode_backend == "ffmpeg":
+        from services.ffmpeg_source import FfmpegVideoSource
+        source = FfmpegVideoSource(source_path, slots=slots)
+        if source.is_opened():
+            return source
+        log.warning("[SourcePool] ffmpeg indisponivel para '%s'; usando OpenCV", source_path)
+    return VideoSource(source_path, slots=slots)
+
+
+class SourceHandle:
+    """Referencia obtida no pool; devolva com `release()` quando nao precisar mais."""
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+        self.released = False
+
+    @property
+    def source(self):
+        """Fonte compartilhada (VideoSource/FfmpegVideoSource/ProcessVideoSource)."""
+        return self._entry.source
+
+    @property
+    def key(self):
+        return self._entry.key
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self._pool._release(self._entry)
+
+
+class _SourceEntry:
+    def __init__(self, key, source_path):
+        self.key = key
+        self.source_path = source_path
+        self.source = None
+        self.refs = 0
+        self.ready = threading.Event()      # abertura concluida (outros assinantes esperam)
+        self.opened_at = None
+        self.open_time_s = None
+
+
+class SourcePool:
+    """
+    Pool de fontes de video com contagem de referencias (ver docstring do modulo).
+
+    A abertura (conexao RTSP, processo do decodificador) acontece fora do lock do
+    pool: cameras diferentes abrem em paralelo e quem pede a mesma chave espera.
+    Fonte que nao abriu sai do pool na hora, para o proximo pedido tentar de novo.
+    """
+
+    def __init__(self, opener=open_video_source):
+        self._opener = opener
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(source_path, decode_backend="opencv", decode_process=False):
+        return normalize_source(source_path), decode_backend, bool(decode_process)
+
+    def acquire(self, source_path, decode_backend="opencv", decode_process=False, slots=None) -> SourceHandle:
+        """Assina a fonte; `slots` (tamanho do anel) so vale para quem abre."""
+        key = self.make_key(source_path, decode_backend, decode_process)
+        with self._lock:
+            entry = self._entries.get(key)
+            opener = entry is None
+            if opener:
+                others = [e for e in self._entries.values() if e.key[0] == key[0]]
+                if others:
+                    log.warning("[SourcePool] '%s' ja aberta com outra configuracao de decodificacao; "
+                                "abrindo uma segunda conexao", source_path)
+                entry = _SourceEntry(key, source_path)
+                self._entries[key] = entry
+            entry.refs += 1
+        if not opener:
+            entry.ready.wait()
+            return SourceHandle(self, entry)
+        started = time.perf_counter()
+        try:
+            entry.source = self._opener(source_path, decode_backend, decode_process, slots)
+        except Exception:
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            entry.ready.set()
+            raise
+        entry.open_time_s = time.perf_counter() - started
+        entry.opened_at = time.time()
+        if not entry.source.is_opened():
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+        entry.ready.set()
+        log.info("[SourcePool] Fonte aberta '%s' em %.2fs", source_path, entry.open_time_s)
+        return SourceHandle(self, entry)
+
+    def _release(self, entry: _SourceEntry):
+        with self._lock:
+            entry.refs -= 1
+            if entry.refs > 0:
+                return
+            if self._entries.get(entry.key) is entry:
+                del self._entries[entry.key]
+            source, entry.source = entry.source, None
+        if source is not None:
+            try:
+                source.release()
+            except Exception:
+                pass
+        log.info("[SourcePool] Fonte fechada '%s' (sem assinantes)", entry.source_path)
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            return [
+                {
+                    "source": e.source_path,
+                    "decode_backend": e.key[1],
+                    "decode_process": e.key[2],
+                    "refs": e.refs,
+                    "open_time_s": round(e.open_time_s, 3) if e.open_time_s is not None else None,
+                    "opened_at": e.opened_at,
+                }
+                for e in self._entries.values()
+            ]
+
+
+source_pool = SourcePool()
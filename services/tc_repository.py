@@ -1,25 +1,120 @@
 from services.db import query_all, query_one, execute, execute_returning
 
+TC_COLUMNS = (
+    "id, name, source_path, roi, model_path, line_offset_red, line_offset_blue, flow_mode, "
+    "max_lost, match_dist, min_conf, missed_frame_dir, infer_mode, infer_margin, infer_size, "
+    "motion_threshold, motion_pixel_delta, idle_fps, max_fps, tracker_mode, model_precision, record_detections, "
+    "frame_policy, frame_policy_param, decode_backend, decode_process"
+)
+
+INFER_MODES = ("quadro", "roi")
+
+def normalize_infer_settings(infer_mode, infer_margin, infer_size):
+    """Modo de inferencia: 'quadro' (frame inteiro) ou 'roi' (recorte ROI + margem)."""
+    mode = (infer_mode or "quadro").strip().lower()
+    if mode not in INFER_MODES:
+        mode = "quadro"
+    try:
+        margin = max(0, int(infer_margin))
+    except (TypeError, ValueError):
+        margin = 32
+    try:
+        size = int(infer_size)
+    except (TypeError, ValueError):
+        size = 640
+    # YOLOv5 trabalha com multiplos de 32 (stride maximo)
+    size = max(160, min(1280, int(round(size / 32.0)) * 32))
+    return mode, margin, size
+
+def normalize_motion_settings(motion_threshold, motion_pixel_delta):
+    """Portao de movimento: % de pixels alterados na ROI (0 = desativado) e diferenca minima de cinza."""
+    try:
+        threshold = float(motion_threshold)
+    except (TypeError, ValueError):
+        threshold = 0.0
+    threshold = max(0.0, min(100.0, threshold))
+    try:
+        delta = int(motion_pixel_delta)
+    except (TypeError, ValueError):
+        delta = 25
+    delta = max(1, min(255, delta))
+    return threshold, delta
+
+def normalize_rate_settings(idle_fps, max_fps):
+    """Ritmo de inferencia: fps com a esteira ociosa (0 = desativado) e maximo (0 = sem limite)."""
+    try:
+        idle = max(0.0, float(idle_fps))
+    except (TypeError, ValueError):
+        idle = 0.0
+    try:
+        top = max(0.0, float(max_fps))
+    except (TypeError, ValueError):
+        top = 0.0
+    if top > 0 and idle > top:
+        idle = top
+    return idle, top
+
+# Definidos aqui (e nao em services.tracker/services.quantization) para validar a TC sem NumPy/SciPy
+TRACKER_MODES = ("centroide", "kalman")
+MODEL_PRECISIONS = ("fp32", "int8")
+
+def normalize_tracker_mode(tracker_mode):
+    """Rastreador: 'centroide' (ultima posicao vista) ou 'kalman' (posicao prevista pela velocidade)."""
+    mode = (tracker_mode or "centroide").strip().lower()
+    return mode if mode in TRACKER_MODES else "centroide"
+
+def normalize_model_precision(model_precision):
+    """Precisao do modelo: 'fp32' (padrao) ou 'int8' (exige validacao aprovada para a TC)."""
+    precision = (model_precision or "fp32").strip().lower()
+    return precision if precision in MODEL_PRECISIONS else "fp32"
+
 def list_tcs():
-    return query_all(
-        "SELECT id, name, source_path, roi, model_path, line_offset_red, line_offset_blue, flow_mode, "
-        "max_lost, match_dist, min_conf, missed_frame_dir "
-        "FROM tc ORDER BY id"
-    )
+    return query_all(f"SELECT {TC_COLUMNS} FROM tc ORDER BY id")
 
 def get_tc(tc_id:int):
-    return query_one(
-        "SELECT id, name, source_path, roi, model_path, line_offset_red, line_offset_blue, flow_mode, "
-        "max_lost, match_dist, min_conf, missed_frame_dir "
-        "FROM tc WHERE id=%s",
-        [tc_id],
-    )
+    return query_one(f"SELECT {TC_COLUMNS} FROM tc WHERE id=%s", [tc_id])
+
+FRAME_POLICIES = ("ultimo", "cada_n", "fps", "todos")
+# Parametro padrao de cada politica: N (cada_n), fps alvo (fps), tamanho da fila (todos)
+FRAME_POLICY_DEFAULTS = {"ultimo": 0, "cada_n": 2, "fps": 5.0, "todos": 30}
+
+def normalize_frame_policy(frame_policy, frame_policy_param):
+    """Frames enviados ao detector quando ele e mais lento que a camera: 'ultimo', 'cada_n', 'fps' ou 'todos'."""
+    policy = (frame_policy or "ultimo").strip().lower()
+    if policy not in FRAME_POLICIES:
+        policy = "ultimo"
+    try:
+        param = float(frame_policy_param)
+    except (TypeError, ValueError):
+        param = 0.0
+    if policy == "ultimo":
+        return policy, 0.0
+    if param <= 0:
+        param = FRAME_POLICY_DEFAULTS[policy]
+    if policy == "cada_n":
+        param = max(1, int(round(param)))
+    elif policy == "todos":
+        param = max(1, min(1000, int(round(param))))
+    return policy, float(param)
+
+DECODE_BACKENDS = ("opencv", "ffmpeg")
+
+def normalize_decode_backend(decode_backend):
+    """Decodificacao do video: 'opencv' (padrao) ou 'ffmpeg' (recorte/fps no decodificador)."""
+    backend = (decode_backend or "opencv").strip().lower()
+    return backend if backend in DECODE_BACKENDS else "opencv"
 
 def create_tc(name:str, source_path:str, roi:str, model_path:str,
               line_offset_red:int = 40, line_offset_blue:int = -40,
               flow_mode:str = "cima", max_lost:int = 2,
               match_dist:float = 150, min_conf:float = 0.8,
-              missed_frame_dir:str | None = None) -> int:
+              missed_frame_dir:str | None = None,
+              infer_mode:str = "quadro", infer_margin:int = 32, infer_size:int = 640,
+              motion_threshold:float = 0.0, motion_pixel_delta:int = 25,
+              idle_fps:float = 0.0, max_fps:float = 0.0, tracker_mode:str = "centroide",
+              model_precision:str = "fp32", record_detections:bool = False,
+              frame_policy:str = "ultimo", frame_policy_param:float = 0.0,
+              decode_backend:str = "opencv", decode_process:bool = False) -> int:
     if max_lost < 0:
         max_lost = 0
     match_dist = int(round(match_dist))
@@ -30,19 +125,36 @@ def create_tc(name:str, source_path:str, roi:str, model_path:str,
     if min_conf > 1:
         min_conf = 1.0
     dir_path = (missed_frame_dir or "").strip()
+    infer_mode, infer_margin, infer_size = normalize_infer_settings(infer_mode, infer_margin, infer_size)
+    motion_threshold, motion_pixel_delta = normalize_motion_settings(motion_threshold, motion_pixel_delta)
+    idle_fps, max_fps = normalize_rate_settings(idle_fps, max_fps)
+    tracker_mode = normalize_tracker_mode(tracker_mode)
+    model_precision = normalize_model_precision(model_precision)
+    frame_policy, frame_policy_param = normalize_frame_policy(frame_policy, frame_policy_param)
+    decode_backend = normalize_decode_backend(decode_backend)
     return execute_returning(
         "INSERT INTO tc (name, source_path, roi, model_path, line_offset_red, line_offset_blue, flow_mode, "
-        "max_lost, match_dist, min_conf, missed_frame_dir) "
-        "VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s) RETURNING id",
+        "max_lost, match_dist, min_conf, missed_frame_dir, infer_mode, infer_margin, infer_size, "
+        "motion_threshold, motion_pixel_delta, idle_fps, max_fps, tracker_mode, model_precision, record_detections, "
+        "frame_policy, frame_policy_param, decode_backend, decode_process) "
+        "VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s) RETURNING id",
         [name, source_path, roi, model_path, line_offset_red, line_offset_blue,
-         flow_mode, max_lost, match_dist, min_conf, dir_path]
+         flow_mode, max_lost, match_dist, min_conf, dir_path,
+         infer_mode, infer_margin, infer_size, motion_threshold, motion_pixel_delta, idle_fps, max_fps, tracker_mode, model_precision,
+         bool(record_detections), frame_policy, frame_policy_param, decode_backend, bool(decode_process)]
     )
 
 def update_tc(tc_id:int, name:str, source_path:str, roi:str, model_path:str,
               line_offset_red:int = 40, line_offset_blue:int = -40,
               flow_mode:str = "cima", max_lost:int = 2,
               match_dist:float = 150, min_conf:float = 0.8,
-              missed_frame_dir:str | None = None):
+              missed_frame_dir:str | None = None,
+              infer_mode:str = "quadro", infer_margin:int = 32, infer_size:int = 640,
+              motion_threshold:float = 0.0, motion_pixel_delta:int = 25,
+              idle_fps:float = 0.0, max_fps:float = 0.0, tracker_mode:str = "centroide",
+              model_precision:str = "fp32", record_detections:bool = False,
+              frame_policy:str = "ultimo", frame_policy_param:float = 0.0,
+              decode_backend:str = "opencv", decode_process:bool = False):
     if max_lost < 0:
         max_lost = 0
     match_dist = int(round(match_dist))
@@ -53,12 +165,25 @@ def update_tc(tc_id:int, name:str, source_path:str, roi:str, model_path:str,
     if min_conf > 1:
         min_conf = 1.0
     dir_path = (missed_frame_dir or "").strip()
+    infer_mode, infer_margin, infer_size = normalize_infer_settings(infer_mode, infer_margin, infer_size)
+    motion_threshold, motion_pixel_delta = normalize_motion_settings(motion_threshold, motion_pixel_delta)
+    idle_fps, max_fps = normalize_rate_settings(idle_fps, max_fps)
+    tracker_mode = normalize_tracker_mode(tracker_mode)
+    model_precision = normalize_model_precision(model_precision)
+    frame_policy, frame_policy_param = normalize_frame_policy(frame_policy, frame_policy_param)
+    decode_backend = normalize_decode_backend(decode_backend)
     execute(
         "UPDATE tc SET name=%s, source_path=%s, roi=%s, model_path=%s, "
         "line_offset_red=%s, line_offset_blue=%s, flow_mode=%s, "
-        "max_lost=%s, match_dist=%s, min_conf=%s, missed_frame_dir=%s WHERE id=%s",
+        "max_lost=%s, match_dist=%s, min_conf=%s, missed_frame_dir=%s, "
+        "infer_mode=%s, infer_margin=%s, infer_size=%s, "
+        "motion_threshold=%s, motion_pixel_delta=%s, idle_fps=%s, max_fps=%s, tracker_mode=%s, "
+        "model_precision=%s, record_detections=%s, frame_policy=%s, frame_policy_param=%s, "
+        "decode_backend=%s, decode_process=%s WHERE id=%s",
         [name, source_path, roi, model_path, line_offset_red, line_offset_blue,
-         flow_mode, max_lost, match_dist, min_conf, dir_path, tc_id]
+         flow_mode, max_lost, match_dist, min_conf, dir_path,
+         infer_mode, infer_margin, infer_size, motion_threshold, motion_pixel_delta, idle_fps, max_fps, tracker_mode, model_precision,
+         bool(record_detections), frame_policy, frame_policy_param, decode_backend, bool(decode_process), tc_id]
     )
 
 def delete_tc(tc_id:int):
@@ -0,0 +1,316 @@
+# services/tracker.py
+import time
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from services.tc_repository import TRACKER_MODES  # noqa: F401  (modos aceitos pela TC)
+
+# Campos por rastro (struct-of-arrays): nome -> dtype
+_FIELDS = (
+    ("ids", np.int64),
+    ("x1", np.float32),
+    ("y1", np.float32),
+    ("x2", np.float32),
+    ("y2", np.float32),
+    ("cx", np.float32),
+    ("cy", np.float32),
+    ("prev_cx", np.float32),
+    ("prev_cy", np.float32),
+    ("conf", np.float32),
+    ("lost", np.int32),
+    ("counted", np.int8),     # 0 = Nao contado / 1 = Contado / -1 = Contagem Anulada
+    ("direction", np.int8),   # 0 = Neutro, 1 = Esperando segunda linha de soma, -1 = Esperando segunda linha de subtracao
+    ("matched", np.bool_),    # associado a uma deteccao no frame corrente
+)
+
+# Custo usado para pares fora do portao de distancia (nunca aceitos)
+_GATE_COST = 1e9
+
+
+class CentroidTracker:
+    """
+    Rastreador por centroide com associacao otima (algoritmo hungaro).
+
+    Os rastros ficam em arrays NumPy paralelos (um por campo). A cada frame
+    `update()` monta a matriz de distancias deteccao x rastro, resolve a
+    atribuicao com `linear_sum_assignment` e so aceita pares abaixo de
+    `match_dist`. Deteccoes sem par viram rastros novos (nenhuma e descartada).
+    """
+
+    def __init__(self, match_dist: float = 150.0, max_lost: int = 2):
+        self.match_dist = float(match_dist)
+        self.max_lost = int(max_lost)
+        self.next_id = 1
+        for name, dtype in _FIELDS:
+            setattr(self, name, np.empty(0, dtype=dtype))
+
+    def __len__(self):
+        return int(self.ids.shape[0])
+
+    def reset(self):
+        for name, dtype in _FIELDS:
+            setattr(self, name, np.empty(0, dtype=dtype))
+
+    def index_of(self, track_id: int) -> int | None:
+        hits = np.flatnonzero(self.ids == track_id)
+        return int(hits[0]) if hits.size else None
+
+    def expected_centers(self) -> np.ndarray:
+        """Posicao esperada de cada rastro no frame corrente (aqui, a ultima vista)."""
+        return np.stack((self.cx, self.cy), axis=1)
+
+    def gate_radius(self):
+        """Distancia maxima aceita por rastro (escalar ou array por rastro)."""
+        return self.match_dist
+
+    def distances(self, centers: np.ndarray) -> np.ndarray:
+        """Matriz deteccao x rastro das distancias ate a posicao esperada."""
+        diff = centers[:, None, :] - self.expected_centers()[None, :, :]
+        return np.sqrt(np.einsum("ijk,ijk->ij", diff, diff))
+
+    def associate(self, centers: np.ndarray):
+        """Retorna (indices_deteccao, indices_rastro) dos pares aceitos."""
+        n_tracks = len(self)
+        if centers.shape[0] == 0 or n_tracks == 0:
+            empty = np.empty(0, dtype=np.intp)
+            return empty, empty
+        dist = self.distances(centers)
+        gated = dist < self.gate_radius()
+        cost = np.where(gated, dist, _GATE_COST)
+        det_idx, trk_idx = linear_sum_assignment(cost)
+        keep = gated[det_idx, trk_idx]
+        return det_idx[keep], trk_idx[keep]
+
+    def update(self, detections: np.ndarray, timestamp: float | None = None):
+        """
+        Atualiza os rastros com as deteccoes do frame (array Mx5+: x1, y1, x2, y2, conf).
+        Apos a chamada, `matched` indica os rastros vistos neste frame e
+        `prev_cy`/`prev_cx` guardam a posicao anterior para o teste de cruzamento.
+        `timestamp` (captura do frame, em segundos) so e usado pelo modelo de movimento.
+        """
+        dets = np.asarray(detections, dtype=np.float32)
+        self.matched[:] = False
+        if dets.ndim != 2 or dets.shape[0] == 0:
+            return
+        centers = np.stack(((dets[:, 0] + dets[:, 2]) / 2, (dets[:, 1] + dets[:, 3]) / 2), axis=1)
+        det_idx, trk_idx = self.associate(centers)
+
+        if trk_idx.size:
+            self.prev_cx[trk_idx] = self.cx[trk_idx]
+            self.prev_cy[trk_idx] = self.cy[trk_idx]
+            self.x1[trk_idx] = dets[det_idx, 0]
+            self.y1[trk_idx] = dets[det_idx, 1]
+            self.x2[trk_idx] = dets[det_idx, 2]
+            self.y2[trk_idx] = dets[det_idx, 3]
+            self.conf[trk_idx] = dets[det_idx, 4]
+            self.cx[trk_idx] = centers[det_idx, 0]
+            self.cy[trk_idx] = centers[det_idx, 1]
+            self.lost[trk_idx] = 0
+            self.matched[trk_idx] = True
+
+        new_mask = np.ones(dets.shape[0], dtype=bool)
+        new_mask[det_idx] = False
+        if new_mask.any():
+            self._append(dets[new_mask], centers[new_mask])
+
+    def _append(self, dets: np.ndarray, centers: np.ndarray):
+        k = dets.shape[0]
+        new = {
+            "ids": np.arange(self.next_id, self.next_id + k, dtype=np.int64),
+            "x1": dets[:, 0], "y1": dets[:, 1], "x2": dets[:, 2], "y2": dets[:, 3],
+            "cx": centers[:, 0], "cy": centers[:, 1],
+            "prev_cx": centers[:, 0], "prev_cy": centers[:, 1],
+            "conf": dets[:, 4],
+            "lost": np.zeros(k, dtype=np.int32),
+            "counted": np.zeros(k, dtype=np.int8),
+            "direction": np.zeros(k, dtype=np.int8),
+            "matched": np.ones(k, dtype=np.bool_),
+        }
+        self.next_id += k
+        for name, dtype in _FIELDS:
+            setattr(self, name, np.concatenate((getattr(self, name), new[name].astype(dtype, copy=False))))
+
+    def age_unmatched(self) -> np.ndarray:
+        """Incrementa `lost` dos rastros nao vistos; retorna a mascara dos que excederam `max_lost`."""
+        unmatched = ~self.matched
+        self.lost[unmatched] += 1
+        return unmatched & (self.lost > self.max_lost)
+
+    def remove(self, mask: np.ndarray):
+        if not mask.any():
+            return
+        keep = ~mask
+        for name, _dtype in _FIELDS:
+            setattr(self, name, getattr(self, name)[keep])
+
+    def commit(self):
+        """Fim do frame: a posicao atual passa a ser a anterior dos rastros vistos."""
+        self.prev_cy[self.matched] = self.cy[self.matched]
+
+    def box(self, i: int):
+        return float(self.x1[i]), float(self.y1[i]), float(self.x2[i]), float(self.y2[i])
+
+    def as_dict(self) -> dict:
+        """Visao {id: campos} (compatibilidade/depuracao; nao usar no laco de frames)."""
+        out = {}
+        for i in range(len(self)):
+            out[int(self.ids[i])] = {
+                'x1': float(self.x1[i]), 'y1': float(self.y1[i]),
+                'x2': float(self.x2[i]), 'y2': float(self.y2[i]),
+                'cx': float(self.cx[i]), 'cy': float(self.cy[i]),
+                'prev_cx': float(self.prev_cx[i]), 'prev_cy': float(self.prev_cy[i]),
+                'conf': float(self.conf[i]),
+                'lost_frames': int(self.lost[i]),
+                'counted': int(self.counted[i]),
+                'direction': int(self.direction[i]),
+            }
+        return out
+
+
+class KalmanTracker(CentroidTracker):
+    """
+    Rastreador com modelo de velocidade constante (filtro de Kalman por rastro).
+
+    Cada rastro guarda o estado [x, y, vx, vy] (px e px/s) e a covariancia 4x4
+    em arrays NumPy. A cada frame o estado e projetado pelo tempo decorrido
+    desde o frame anterior e a associacao usa essa posicao prevista no portao
+    `match_dist`: com poucos fps a sacaria pode andar mais que `match_dist`
+    entre dois frames e ainda assim manter o mesmo ID. Rastros perdidos seguem
+    sendo projetados ate `max_lost`, entao reaparecem onde deveriam estar.
+
+    `cx`/`cy` continuam sendo a posicao medida (teste de cruzamento inalterado).
+    O portao cresce com a incerteza da previsao (ate 3x `match_dist`), para que
+    um rastro recem-criado, ainda sem velocidade medida, seja reencontrado.
+    Rastros novos nascem com a velocidade media da esteira ja observada.
+    """
+
+    def __init__(self, match_dist: float = 150.0, max_lost: int = 2,
+                 pos_std: float = 4.0, accel_std: float = 400.0, max_dt: float = 5.0):
+        super().__init__(match_dist=match_dist, max_lost=max_lost)
+        self.pos_std = float(pos_std)          # ruido da medida (px)
+        self.accel_std = float(accel_std)      # aceleracao nao modelada (px/s^2)
+        self.max_dt = float(max_dt)
+        self.state = np.empty((0, 4), dtype=np.float64)
+        self.cov = np.empty((0, 4, 4), dtype=np.float64)
+        self.hits = np.empty(0, dtype=np.int32)
+        self.belt_velocity = None              # (vx, vy) medio dos rastros confirmados
+        self._last_time = None
+
+    def reset(self):
+        super().reset()
+        self.state = np.empty((0, 4), dtype=np.float64)
+        self.cov = np.empty((0, 4, 4), dtype=np.float64)
+        self.hits = np.empty(0, dtype=np.int32)
+        self._last_time = None
+
+    def expected_centers(self) -> np.ndarray:
+        return self.state[:, :2].astype(np.float32)
+
+    def gate_radius(self):
+        # Portao cresce com a incerteza da previsao (rastros novos, sem velocidade
+        # medida, ou perdidos ha alguns frames), limitado a 3x match_dist
+        spread = 2.0 * np.sqrt(np.maximum(self.cov[:, 0, 0], self.cov[:, 1, 1]))
+        return self.match_dist + np.minimum(spread, 2.0 * self.match_dist)
+
+    def associate(self, centers: np.ndarray):
+        n_tracks = len(self)
+        n_dets = centers.shape[0]
+        if n_dets == 0 or n_tracks == 0:
+            empty = np.empty(0, dtype=np.intp)
+            return empty, empty
+        # Distancia normalizada pelo portao de cada rastro (< 1 = dentro do portao).
+        # Colunas extras: deixar a deteccao sem par custa 1, entao um portao largo
+        # nunca troca dois pares bons por varios pares ruins so para casar mais.
+        norm = self.distances(centers) / self.gate_radius()[None, :]
+        gated = norm < 1.0
+        cost = np.hstack((np.where(gated, norm, _GATE_COST), np.ones((n_dets, n_dets))))
+        det_idx, trk_idx = linear_sum_assignment(cost)
+        keep = trk_idx < n_tracks
+        det_idx, trk_idx = det_idx[keep], trk_idx[keep]
+        keep = gated[det_idx, trk_idx]
+        return det_idx[keep], trk_idx[keep]
+
+    def predict(self, dt: float):
+        if not len(self) or dt <= 0:
+            return
+        F = np.eye(4)
+        F[0, 2] = F[1, 3] = dt
+        q = self.accel_std ** 2
+        Q = np.zeros((4, 4))
+        Q[0, 0] = Q[1, 1] = q * dt ** 4 / 4.0
+        Q[0, 2] = Q[2, 0] = Q[1, 3] = Q[3, 1] = q * dt ** 3 / 2.0
+        Q[2, 2] = Q[3, 3] = q * dt ** 2
+        self.state = self.state @ F.T
+        self.cov = F @ self.cov @ F.T + Q
+
+    def _correct(self, idx: np.ndarray, measured: np.ndarray):
+        P = self.cov[idx]
+        S = P[:, :2, :2] + np.eye(2) * self.pos_std ** 2
+        K = P[:, :, :2] @ np.linalg.inv(S)                       # (k, 4, 2)
+        residual = measured - self.state[idx, :2]
+        self.state[idx] += (K @ residual[:, :, None])[:, :, 0]
+        self.cov[idx] = P - K @ P[:, :2, :]
+        self.hits[idx] += 1
+
+    def _elapsed(self, timestamp: float | None) -> float:
+        now = timestamp if timestamp is not None else time.monotonic()
+        last, self._last_time = self._last_time, now
+        if last is None:
+            return 0.0
+        return min(self.max_dt, max(0.0, now - last))
+
+    def update(self, detections: np.ndarray, timestamp: float | None = None):
+        self.predict(self._elapsed(timestamp))
+        n_old = len(self)
+        super().update(detections, timestamp)
+        seen = np.flatnonzero(self.matched[:n_old])
+        if seen.size:
+            measured = np.stack((self.cx[seen], self.cy[seen]), axis=1).astype(np.float64)
+            self._correct(seen, measured)
+            confirmed = seen[self.hits[seen] >= 3]
+            if confirmed.size:
+                velocity = np.median(self.state[confirmed, 2:], axis=0)
+                self.belt_velocity = velocity if self.belt_velocity is None else 0.8 * self.belt_velocity + 0.2 * velocity
+
+    def _append(self, dets: np.ndarray, centers: np.ndarray):
+        super()._append(dets, centers)
+        k = dets.shape[0]
+        state = np.zeros((k, 4), dtype=np.float64)
+        state[:, :2] = centers
+        cov = np.zeros((k, 4, 4), dtype=np.float64)
+        cov[:, 0, 0] = cov[:, 1, 1] = self.pos_std ** 2
+        if self.belt_velocity is not None:
+            state[:, 2:] = self.belt_velocity
+            vel_var = (0.5 * float(np.hypot(*self.belt_velocity)) + self.match_dist) ** 2
+        else:
+            vel_var = (10.0 * self.match_dist) ** 2
+        cov[:, 2, 2] = cov[:, 3, 3] = vel_var
+        self.state = np.concatenate((self.state, state))
+        self.cov = np.concatenate((self.cov, cov))
+        self.hits = np.concatenate((self.hits, np.ones(k, dtype=np.int32)))
+
+    def remove(self, mask: np.ndarray):
+        if not mask.any():
+            return
+        keep = ~mask
+        super().remove(mask)
+        self.state = self.state[keep]
+        self.cov = self.cov[keep]
+        self.hits = self.hits[keep]
+
+    def as_dict(self) -> dict:
+        out = super().as_dict()
+        for i, track_id in enumerate(self.ids.tolist()):
+            out[track_id]['pred_cx'] = float(self.state[i, 0])
+            out[track_id]['pred_cy'] = float(self.state[i, 1])
+            out[track_id]['vx'] = float(self.state[i, 2])
+            out[track_id]['vy'] = float(self.state[i, 3])
+        return out
+
+
+def make_tracker(mode: str, match_dist: float = 150.0, max_lost: int = 2) -> CentroidTracker:
+    """'kalman' -> KalmanTracker; qualquer outro valor -> CentroidTracker (padrao)."""
+    if (mode or "").strip().lower() == "kalman":
+        return KalmanTracker(match_dist=match_dist, max_lost=max_lost)
+    return CentroidTracker(match_dist=match_dist, max_lost=max_lost)
@@ -2,20 +2,129 @@ import cv2
 import threading
 import time 
 import os
+from collections import deque
+
+
+def queue_size(param) -> int:
+    """Tamanho da fila da política 'todos' (param; 0 = 30 frames)."""
+    try:
+        return max(1, int(param or 30))
+    except (TypeError, ValueError):
+        return 30
+
+
+def ring_slots(policy="ultimo", param=0) -> int:
+    """
+    Slots do anel de frames de cada câmera (VIDEO_RING_SLOTS, padrão 4, mínimo 3),
+    mais a fila da política 'todos' (cada frame na fila segura o seu slot).
+    """
+    try:
+        base = max(3, int(os.getenv("VIDEO_RING_SLOTS", "4")))
+    except (TypeError, ValueError):
+        base = 4
+    return base + (queue_size(param) if policy == "todos" else 0)
+
+
+class _Slot:
+    """Buffer do anel: frame decodificado, número de sequência, horário e leitores que o seguram."""
+    __slots__ = ("buffer", "seq", "ts", "pins")
+
+    def __init__(self):
+        self.buffer = None
+        self.seq = 0
+        self.ts = None
+        self.pins = 0
+
+
+class FrameReader:
+    """
+    Consumidor do anel de frames de um VideoSource (um por thread consumidora).
+
+    next() bloqueia até haver um frame a entregar conforme a política e
+    devolve uma view somente leitura do buffer do anel, sem cópia. A view vale
+    até a próxima chamada de next()/close(): quem precisar guardar ou desenhar
+    no frame deve copiá-lo.
+
+    Políticas (quando o consumidor é mais lento que a câmera):
+      - 'ultimo': sempre o frame mais recente; os intermediários são descartados;
+      - 'cada_n': um a cada `param` frames decodificados (ou o mais recente, se atrasado);
+      - 'fps':    no máximo `param` frames por segundo (pelo horário de captura);
+      - 'todos':  todos os frames, em fila de até `param` frames. Com a fila cheia,
+                  arquivos esperam o consumidor e streams descartam o mais antigo.
+    """
+
+    def __init__(self, source, policy="ultimo", param=0):
+        self.source = source
+        self.policy = policy if policy in ("ultimo", "cada_n", "fps", "todos") else "ultimo"
+        self.param = param
+        self.step = max(1, int(param or 1)) if self.policy == "cada_n" else 1
+        self.interval = 1.0 / float(param) if self.policy == "fps" and param and float(param) > 0 else 0.0
+        self.max_queue = queue_size(param) if self.policy == "todos" else 0
+        self.queue = deque() if self.policy == "todos" else None
+        self.start_seq = source._seq
+        self.last_seq = source._seq
+        self._due = None            # horário de captura do próximo frame na política 'fps'
+        self.processed = 0
+        self.dropped = 0
+        self._slot = None
+        self.closed = False
+
+    def _ready(self, latest) -> bool:
+        if self.queue is not None:
+            return bool(self.queue)
+        if latest is None or latest.seq <= self.last_seq:
+            return False
+        if self.policy == "cada_n":
+            return latest.seq >= self.last_seq + self.step
+        if self.policy == "fps" and self._due is not None:
+            return latest.ts >= self._due
+        return True
+
+    def _delivered(self, slot):
+        if self.queue is None:
+            self.dropped += slot.seq - self.last_seq - 1
+        if self.interval > 0:
+            # Agenda pelo horário previsto (não pelo do frame) para manter a taxa média;
+            # atrasado mais de um intervalo, recomeça a partir deste frame
+            if self._due is None or slot.ts - self._due >= self.interval:
+                self._due = slot.ts + self.interval
+            else:
+                self._due += self.interval
+        self.last_seq = slot.seq
+        self.processed += 1
+        self._slot = slot
+
+    def next(self, timeout=None):
+        """(ok, frame, seq, capturado_em); ok=False se não houve frame a entregar no timeout."""
+        return self.source._wait_newer(self, timeout)
+
+    def stats(self) -> dict:
+        """Frames decodificados desde a criação do leitor, entregues (processados) e descartados."""
+        with self.source.lock:
+            return {
+                "policy": self.policy,
+                "param": self.param,
+                "decoded": self.source._seq - self.start_seq,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "queued": len(self.queue) if self.queue is not None else 0,
+            }
+
+    def close(self):
+        self.source._close_reader(self)
+
 
 class VideoSource:
-    def __init__(self, source_path):
-        """Inicializa a fonte de vídeo (câmera ou arquivo) e o threading."""
-        self.source_path = source_path
-        self.cap = None
-        self.frame = None
-        self.ret = False
-        self.lock = threading.Lock()
-        self.stop_event = threading.Event()
-        self.thread = None
+    def __init__(self, source_path, realtime=True, slots=None):
+        """
+        Inicializa a fonte de vídeo (câmera ou arquivo) e o threading.
+        Com realtime=False (benchmark/replay) não há thread nem delay: cada
+        read_next() decodifica o próximo frame e o arquivo não é reiniciado no fim.
+        slots: tamanho do anel de frames (None = VIDEO_RING_SLOTS).
+        """
+        self._init_state(source_path, realtime, slots)
         
         # === CORREÇÕES PARA RTSP E BUFFER ===
-        self.is_file = not source_path.lower().startswith("rtsp")
         
         if not self.is_file:
             # Tenta usar o backend FFMPEG (mais robusto para RTSP)
@@ -40,34 +149,108 @@ class VideoSource:
 
         # === LÓGICA DE SINCRONIZAÇÃO FPS ===
         self.delay = 0 
+
+        if not realtime:
+            # Leitura sob demanda, sem ritmo (ver read_next)
+            return
         
         if self.is_file:
-            fps = self.cap.get(cv2.CAP_PROP_FPS)
-            
-            # Configuração por ambiente: fator ou delay fixo em ms
-            delay_ms_env = os.getenv('VIDEO_FILE_DELAY_MS')
-            delay_factor_env = os.getenv('VIDEO_FILE_DELAY_FACTOR')
-
-            if delay_ms_env is not None:
-                try:
-                    self.delay = max(0.0, float(delay_ms_env) / 1000.0)
-                except Exception:
-                    self.delay = 0.033
-            elif fps > 0:
-                try:
-                    factor = float(delay_factor_env) if delay_factor_env is not None else 0.9
-                except Exception:
-                    factor = 0.9
-                self.delay = max(0.0, factor / fps)
-                print(f"[FPS] Vídeo FPS: {fps:.2f}. Delay ajustado para: {self.delay:.4f}s")
-            else:
-                # Fallback quando FPS não está disponível
-                self.delay = 0.033
+            self.delay = self._file_delay()
         # ==================================
         
         self.thread = threading.Thread(target=self._run, daemon=True)
         self.thread.start()
 
+    def _file_delay(self):
+        """Pausa entre frames de arquivo para simular a câmera (VIDEO_FILE_DELAY_MS / VIDEO_FILE_DELAY_FACTOR)."""
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        
+        # Configuração por ambiente: fator ou delay fixo em ms
+        delay_ms_env = os.getenv('VIDEO_FILE_DELAY_MS')
+        delay_factor_env = os.getenv('VIDEO_FILE_DELAY_FACTOR')
+
+        if delay_ms_env is not None:
+            try:
+                return max(0.0, float(delay_ms_env) / 1000.0)
+            except Exception:
+                return 0.033
+        elif fps > 0:
+            try:
+                factor = float(delay_factor_env) if delay_factor_env is not None else 0.9
+            except Exception:
+                factor = 0.9
+            delay = max(0.0, factor / fps)
+            print(f"[FPS] Vídeo FPS: {fps:.2f}. Delay ajustado para: {delay:.4f}s")
+            return delay
+        # Fallback quando FPS não está disponível
+        return 0.033
+
+    def _init_state(self, source_path, realtime, slots=None):
+        """Estado comum às fontes (OpenCV e ffmpeg): anel de frames, leitores e thread."""
+        self.source_path = source_path
+        self.realtime = realtime
+        self.cap = None
+        self.frame = None           # frame atual (somente com realtime=False; ver read_next)
+        self.frame_time = None      # horario (epoch) de captura do frame atual
+        self.ret = False
+        self.offset = (0, 0)        # posição do frame entregue no frame original (recorte no decodificador)
+        self.lock = threading.Lock()
+        # Anel fixo de buffers reaproveitados: a captura decodifica direto no buffer livre
+        # mais antigo (nenhum leitor segurando) e avisa os leitores pela condição.
+        # Cada slot aloca o seu buffer no primeiro frame; o anel nunca cresce.
+        self.cond = threading.Condition(self.lock)
+        self._slots = [_Slot() for _ in range(max(3, int(slots or ring_slots())))]
+        self._latest = None
+        self._seq = 0
+        self._scratch = None        # destino dos frames de stream descartados com o anel cheio
+        self.ring_dropped = 0       # frames de stream descartados por falta de slot livre
+        self._queue_readers = []    # leitores com a política 'todos' (recebem todos os frames)
+        # Chamado (com o lock) quando leitores soltam slots. A captura local não precisa:
+        # reaproveita os slots em _free_slot(). O decodificador em outro processo precisa recebê-los de volta.
+        self._on_slots_released = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.is_file = not source_path.lower().startswith("rtsp")
+
+    def _claim_slot(self):
+        """
+        Slot onde a captura decodifica o próximo frame. Arquivo espera a fila 'todos'
+        ter espaço e um slot ser devolvido (None só ao parar); stream com o anel cheio
+        descarta o mais antigo das filas 'todos' ou devolve None (ler e descartar o frame).
+        """
+        with self.lock:
+            while self.is_file and not self.stop_event.is_set():
+                if not self._queue_full_locked():
+                    slot = self._free_slot()
+                    if slot is not None:
+                        return slot
+                self.cond.wait(0.1)
+            if self.is_file:
+                return None
+            slot = self._free_slot()
+            return slot if slot is not None else self._drop_queued_locked()
+
+    def _queue_full_locked(self) -> bool:
+        """Arquivo com leitor 'todos' de fila cheia: a captura espera o consumidor em vez de descartar."""
+        return self.is_file and any(len(r.queue) >= r.max_queue for r in self._queue_readers)
+
+    def _publish_locked(self, slot, frame):
+        """Publica o frame decodificado no slot e acorda os leitores (com o lock)."""
+        slot.buffer = frame
+        self._seq += 1
+        slot.seq = self._seq
+        slot.ts = time.time()
+        self._latest = slot
+        self.frame_time = slot.ts
+        for reader in self._queue_readers:
+            slot.pins += 1
+            reader.queue.append(slot)
+            if len(reader.queue) > reader.max_queue:
+                # Stream com a fila cheia: descarta o frame mais antigo
+                reader.queue.popleft().pins -= 1
+                reader.dropped += 1
+        self.cond.notify_all()
+
     def _run(self):
         """Método executado na thread separada para leitura contínua de frames."""
         # Se self.cap não foi aberto no __init__, a thread não precisa rodar
@@ -75,10 +258,18 @@ class VideoSource:
             return
             
         while not self.stop_event.is_set():
-            
-            # Tenta ler o frame
+
+            slot = self._claim_slot()
+            if slot is None and self.stop_event.is_set():
+                break
+
+            # Tenta ler o frame (decodifica no buffer do slot, sem alocar um frame novo)
             try:
-                ret, frame = self.cap.read()
+                target = slot.buffer if slot is not None else self._scratch
+                if target is not None:
+                    ret, frame = self.cap.read(target)
+                else:
+                    ret, frame = self.cap.read()
             except Exception as e:
                 # Proteção contra race condition: cap pode ser liberado durante read()
                 # ou backend lançar exceção C++ (cv2.error). Encerra a thread com segurança.
@@ -88,11 +279,20 @@ class VideoSource:
                 except Exception:
                     pass
                 break
+
+            if slot is None:
+                # Stream com todos os slots presos: lê e descarta para a câmera não acumular atraso
+                if ret:
+                    self._scratch = frame
+                    self.ring_dropped += 1
+                time.sleep(0.001)
+                continue
             
             with self.lock:
                 self.ret = ret
                 if ret:
-                    self.frame = frame
+                    # OpenCV reaproveita o buffer (ou aloca outro se a resolução mudar)
+                    self._publish_locked(slot, frame)
                 else:
                     # Tratamento de falha (Se 'ret' for False)
                     if self.is_file:
@@ -110,12 +310,100 @@ class VideoSource:
                  # Sleep para liberar CPU (essencial para streams e evitar travamento)
                  time.sleep(0.001) 
 
+    def is_opened(self) -> bool:
+        return self.cap is not None
+
+    def read_next(self):
+        """Decodifica o próximo frame na thread chamadora (somente com realtime=False)."""
+        if self.cap is None:
+            return False, None
+        ret, frame = self.cap.read()
+        self.ret = ret
+        if ret:
+            self.frame = frame
+            self.frame_time = time.time()
+        return ret, frame if ret else None
+
+    def _free_slot(self):
+        """Slot para o próximo frame: o mais antigo sem leitores (nunca o atual); None se todos estiverem em uso."""
+        free = [s for s in self._slots if s is not self._latest and s.pins == 0]
+        return min(free, key=lambda s: s.seq) if free else None
+
+    def _drop_queued_locked(self):
+        """Descarta o frame mais antigo das filas 'todos' até liberar um slot; None se as filas esvaziarem."""
+        while True:
+            queued = [r for r in self._queue_readers if r.queue]
+            if not queued:
+                return None
+            reader = min(queued, key=lambda r: r.queue[0].seq)
+            reader.queue.popleft().pins -= 1
+            reader.dropped += 1
+            slot = self._free_slot()
+            if slot is not None:
+                return slot
+
+    def reader(self, policy="ultimo", param=0) -> FrameReader:
+        """Novo consumidor do anel com a política de frames informada (ver FrameReader)."""
+        with self.lock:
+            reader = FrameReader(self, policy, param)
+            if reader.queue is not None:
+                self._queue_readers.append(reader)
+            return reader
+
+    def _wait_newer(self, reader, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            # O frame entregue antes volta a ficar disponível para a captura
+            self._unpin_locked(reader)
+            if self._on_slots_released is not None:
+                self._on_slots_released()
+            while reader.closed or not reader._ready(self._latest):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if self.stop_event.is_set() or reader.closed or (remaining is not None and remaining <= 0):
+                    return False, None, reader.last_seq, None
+                self.cond.wait(remaining)
+            if reader.queue is not None:
+                # Já segurado pela captura ao entrar na fila; abre espaço para o próximo
+                slot = reader.queue.popleft()
+                self.cond.notify_all()
+            else:
+                slot = self._latest
+                slot.pins += 1
+            reader._delivered(slot)
+            view = slot.buffer.view()
+            view.flags.writeable = False
+            return True, view, slot.seq, slot.ts
+
+    def _unpin_locked(self, reader):
+        if reader._slot is not None:
+            reader._slot.pins -= 1
+            if reader._slot.pins == 0:
+                # Slot livre de novo: acorda a captura que espera por um (arquivo com o anel cheio)
+                self.cond.notify_all()
+            reader._slot = None
+
+    def _close_reader(self, reader):
+        with self.lock:
+            # Leitor fechado não volta a segurar slots (fonte compartilhada continua no ar)
+            reader.closed = True
+            self._unpin_locked(reader)
+            if reader.queue is not None:
+                while reader.queue:
+                    reader.queue.popleft().pins -= 1
+                if reader in self._queue_readers:
+                    self._queue_readers.remove(reader)
+                self.cond.notify_all()
+            if self._on_slots_released is not None:
+                self._on_slots_released()
+
     def get_frame(self):
-        """Retorna o frame mais recente."""
+        """Retorna uma cópia do frame mais recente (prefira reader(), que não copia nem repete frames)."""
         with self.lock:
             ret = self.ret
-            # Garante que frame.copy() só é chamado se frame não for None
-            frame = self.frame.copy() if self.frame is not None else None
+            if not self.realtime:
+                frame = self.frame.copy() if self.frame is not None else None
+            else:
+                frame = self._latest.buffer.copy() if self._latest is not None else None
 
         return ret, frame
 
@@ -125,6 +413,9 @@ class VideoSource:
         # 1) sinaliza parada, 2) aguarda thread sair do loop, 3) libera cap
         try:
             self.stop_event.set()
+            # Acorda leitores bloqueados em FrameReader.next()
+            with self.cond:
+                self.cond.notify_all()
         except Exception:
             pass
         try:
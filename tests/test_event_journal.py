@@ -0,0 +1,86 @@
+# tests/test_event_journal.py
+"""
+Diario de eventos por sessao (services/event_journal.py): gravacao em lote, flush e close.
+
+Rodar na raiz do projeto: python -m pytest tests
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from services.event_journal import EventJournal
+
+
+def _lines(path):
+    with open(path, encoding="utf-8") as fh:
+        return fh.read().splitlines()
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_write_only_buffers_until_flush_bytes(tmp_path):
+    path = str(tmp_path / "tc1.jsonl")
+    journal = EventJournal(path, flush_bytes=400, flush_interval_s=60, context={"tc": 1})
+    try:
+        journal.write("primeiro", captured_at=1700000000.0, obj=np.int64(3))   # ids de rastro sao escalares NumPy
+        time.sleep(0.1)
+        assert _lines(path) == []                           # abaixo de flush_bytes: nada no disco
+        for i in range(10):
+            journal.write(f"evento {i}")
+        assert _wait_for(lambda: len(_lines(path)) > 0)   # passou de flush_bytes: grava sem esperar o intervalo
+    finally:
+        journal.close()
+    assert len(_lines(path)) == 11
+    first = json.loads(_lines(path)[0])
+    assert (first["ts"], first["tc"], first["obj"], first["msg"]) == (1700000000.0, 1, 3, "primeiro")
+
+
+def test_interval_flush(tmp_path):
+    path = str(tmp_path / "tc1.log")
+    journal = EventJournal(path, fmt="text", flush_interval_s=0.05)
+    try:
+        journal.write("linha")
+        assert _wait_for(lambda: _lines(path) == ["linha"])
+    finally:
+        journal.close()
+
+
+def test_close_flushes_everything_and_counts_late_writes(tmp_path):
+    path = str(tmp_path / "tc1.log")
+    journal = EventJournal(path, fmt="text", flush_interval_s=60)
+    stop = threading.Event()
+
+    def producer():
+        i = 0
+        while not stop.is_set():
+            journal.write(f"e{i}")
+            i += 1
+
+    thread = threading.Thread(target=producer)
+    thread.start()
+    time.sleep(0.05)
+    journal.close()
+    time.sleep(0.02)
+    stop.set()
+    thread.join(5)
+    stats = journal.stats()
+    # Tudo o que foi aceito esta no arquivo; o que chegou depois do close foi contado, nao perdido em silencio
+    assert len(_lines(path)) == stats["events"]
+    assert stats["pending"] == 0 and stats["late"] > 0
+    journal.write("depois")
+    assert journal.stats()["late"] == stats["late"] + 1
@@ -0,0 +1,99 @@
+# tests/test_inference_engine.py
+"""
+Motor de inferencia em lote (services/inference_engine.py) com um modelo falso.
+
+Rodar na raiz do projeto: python -m pytest tests
+"""
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from services.inference_engine import BatchInferenceEngine
+
+
+class _FakeModel:
+    """Backend falso com uma deteccao por frame; conf = valor do pixel (0,0) identifica o frame de origem."""
+
+    def __init__(self, delay=0.0, gate=None):
+        self.delay = delay
+        self.gate = gate
+        self.batches = []
+
+    def predict(self, frames, size=640):
+        if self.gate is not None:
+            self.gate.wait()
+        time.sleep(self.delay)
+        self.batches.append(len(frames))
+        return [np.array([[0, 0, 1, 1, float(f[0, 0, 0]), 0]], dtype=np.float32) for f in frames]
+
+
+def _frame(value):
+    return np.full((8, 8, 3), value, dtype=np.uint8)
+
+
+def test_batch_results_go_back_to_each_tc():
+    engine = BatchInferenceEngine(max_batch=4, max_wait_ms=2000)
+    model = _FakeModel()
+    keys = (1, 2, 3)
+    for key in keys:
+        engine.register(key)
+    results = {}
+
+    def client(key):
+        results[key] = engine.infer(key, model, _frame(10 * key))
+
+    threads = [threading.Thread(target=client, args=(key,)) for key in keys]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+    finally:
+        engine.shutdown()
+    assert model.batches == [3]                         # uma passada para as tres TCs
+    assert {key: float(res[0, 4]) for key, res in results.items()} == {1: 10.0, 2: 20.0, 3: 30.0}
+    assert engine.stats()["frames"] == 3
+
+
+def test_single_tc_does_not_wait_for_batch():
+    engine = BatchInferenceEngine(max_batch=8, max_wait_ms=2000)
+    engine.register(1)
+    try:
+        started = time.perf_counter()
+        engine.infer(1, _FakeModel(), _frame(1))
+        assert time.perf_counter() - started < 1.0
+    finally:
+        engine.shutdown()
+
+
+def test_timeout_raises_and_drops_pending_request():
+    engine = BatchInferenceEngine(max_batch=2, max_wait_ms=0, timeout_s=0.2)
+    gate = threading.Event()
+    model = _FakeModel(gate=gate)
+    try:
+        with pytest.raises(TimeoutError):
+            engine.infer(1, model, _frame(1))
+        # O lote preso no modelo nao deixa pedido pendente para a TC
+        assert engine.stats()["pending"] == 0
+    finally:
+        gate.set()
+        engine.shutdown()
+
+
+def test_timeout_follows_measured_latency():
+    engine = BatchInferenceEngine(max_batch=1, max_wait_ms=0, timeout_s=0.1)
+    assert engine.current_timeout() == pytest.approx(0.1)
+    try:
+        engine.infer(1, _FakeModel(delay=0.2), _frame(1), timeout=5.0)
+    finally:
+        engine.shutdown()
+    # 4x a latencia medida (~0.2 s) passa a valer no lugar do minimo configurado
+    assert engine.current_timeout() >= BatchInferenceEngine.TIMEOUT_LATENCY_FACTOR * 0.2
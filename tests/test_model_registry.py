@@ -0,0 +1,74 @@
+# tests/test_model_registry.py
+"""
+Contagem de referencias do registro de modelos (services/model_registry.py) com um carregador falso.
+
+Rodar na raiz do projeto: python -m pytest tests
+"""
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from services.model_registry import ModelRegistry
+
+
+class _FakeBackend:
+    name = "falso"
+    device = "cpu"
+
+    def parameter_bytes(self):
+        return None
+
+
+class _FakeLoader:
+    def __init__(self):
+        self.loads = []
+
+    def __call__(self, path_for_load):
+        self.loads.append(path_for_load)
+        return _FakeBackend()
+
+
+def _weights(tmp_path, name="modelo.pt"):
+    path = tmp_path / name
+    path.write_bytes(b"pesos")
+    return str(path)
+
+
+def test_same_file_loads_once_and_unloads_on_last_release(tmp_path):
+    loader = _FakeLoader()
+    registry = ModelRegistry(loader=loader)
+    path = _weights(tmp_path)
+    first = registry.acquire(path)
+    second = registry.acquire(path)
+    assert len(loader.loads) == 1
+    assert first.model is second.model
+    assert [e["refs"] for e in registry.stats()] == [2]
+
+    first.release()
+    first.release()                                 # release repetido nao desconta de novo
+    assert [e["refs"] for e in registry.stats()] == [1]
+    second.release()
+    assert registry.stats() == []
+
+    registry.acquire(path).release()                # sem referencias: carrega de novo
+    assert len(loader.loads) == 2
+
+
+def test_replaced_file_gets_new_entry_while_old_one_lives(tmp_path):
+    loader = _FakeLoader()
+    registry = ModelRegistry(loader=loader)
+    path = _weights(tmp_path)
+    old = registry.acquire(path)
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    new = registry.acquire(path)
+    assert len(loader.loads) == 2
+    assert old.model is not new.model
+    assert sorted(e["refs"] for e in registry.stats()) == [1, 1]
+    old.release()
+    assert len(registry.stats()) == 1
+    new.release()
+    assert registry.stats() == []
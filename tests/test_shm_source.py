@@ -0,0 +1,56 @@
+# tests/test_shm_source.py
+"""
+Decodificador em processo separado (services/shm_source.py) sobre um video sintetico (sem camera).
+
+Rodar na raiz do projeto: python -m pytest tests
+"""
+import os
+import sys
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from services.shm_source import ProcessVideoSource
+
+
+@pytest.fixture
+def clip(tmp_path, monkeypatch):
+    """Arquivo de 30 frames 64x48, cada um com um tom de cinza diferente."""
+    path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30.0, (64, 48))
+    for i in range(30):
+        writer.write(np.full((48, 64, 3), 8 * i, dtype=np.uint8))
+    writer.release()
+    monkeypatch.setenv("VIDEO_FILE_DELAY_MS", "2")     # herdado pelo processo filho
+    return path
+
+
+def test_frames_arrive_from_child_and_slots_go_back(clip):
+    source = ProcessVideoSource(clip, slots=4)
+    assert source.is_opened(), source.last_error
+    name = source.shm.name
+    reader = source.reader()
+    try:
+        last = 0
+        for _ in range(60):                                 # mais que o anel e o arquivo: slots voltam ao filho
+            ok, view, seq, _ts = reader.next(timeout=5)
+            assert ok and seq > last
+            assert view.shape == (48, 64, 3) and not view.flags.writeable
+            last = seq
+        stats = source.stats()
+        assert stats["alive"] and stats["restarts"] == 0 and stats["slots"] == 4
+        with source.lock:
+            # Somente o slot entregue ao leitor fica preso
+            assert sum(slot.pins for slot in source._slots) == 1
+    finally:
+        reader.close()
+        source.release()
+    assert source.proc is None
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)              # segmento removido no release
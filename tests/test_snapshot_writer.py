@@ -0,0 +1,68 @@
+# tests/test_snapshot_writer.py
+"""
+Escritor de snapshots em segundo plano (services/snapshot_writer.py): fila limitada e pastas.
+
+Rodar na raiz do projeto: python -m pytest tests
+"""
+import os
+import shutil
+import sys
+import threading
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from services.snapshot_writer import SnapshotWriter
+
+
+def _frame():
+    return np.zeros((32, 32, 3), dtype=np.uint8)
+
+
+def test_full_queue_drops_without_blocking(tmp_path):
+    writer = SnapshotWriter(workers=1, max_pending=2)
+    busy, release = threading.Event(), threading.Event()
+
+    def hold(_image):
+        busy.set()
+        release.wait(5)
+
+    try:
+        assert writer.submit(str(tmp_path), "a", _frame(), decorate=hold)
+        assert busy.wait(5)                                 # worker ocupado com o 1o snapshot
+        assert writer.submit(str(tmp_path), "b", _frame())
+        assert writer.submit(str(tmp_path), "c", _frame())
+        assert not writer.submit(str(tmp_path), "d", _frame())   # fila cheia: descarta
+        stats = writer.stats()
+        assert (stats["submitted"], stats["dropped"], stats["pending"]) == (3, 1, 2)
+    finally:
+        release.set()
+    assert writer.flush(5)
+    writer.shutdown()
+    assert sorted(os.listdir(tmp_path)) == ["a.jpg", "b.jpg", "c.jpg"]
+    assert writer.stats()["written"] == 3
+
+
+def test_names_carry_pid_and_sequence():
+    writer = SnapshotWriter()
+    first, second = writer.next_name("lote_120000_id7"), writer.next_name("lote_120000_id7")
+    assert first == f"lote_120000_id7_{os.getpid()}-00001"
+    assert second.endswith("-00002")
+
+
+def test_folder_removed_after_first_write_is_created_again(tmp_path):
+    target = tmp_path / "lote"
+    writer = SnapshotWriter(workers=1)
+    try:
+        writer.submit(str(target), "a", _frame())
+        assert writer.flush(5)
+        shutil.rmtree(target)                               # ex.: compartilhamento remontado
+        writer.submit(str(target), "b", _frame())
+        assert writer.flush(5)
+    finally:
+        writer.shutdown()
+    assert os.listdir(target) == ["b.jpg"]
+    assert writer.stats()["failed"] == 0
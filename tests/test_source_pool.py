@@ -0,0 +1,85 @@
+# tests/test_source_pool.py
+"""
+Pool de fontes de video (services/source_pool.py) com um abridor falso (sem camera).
+
+Rodar na raiz do projeto: python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from services.source_pool import SourcePool, normalize_source
+
+
+class _FakeSource:
+    def __init__(self, opened=True):
+        self.opened = opened
+        self.released = 0
+
+    def is_opened(self):
+        return self.opened
+
+    def release(self):
+        self.released += 1
+
+
+class _FakeOpener:
+    def __init__(self, opened=True, error=None):
+        self.opened = opened
+        self.error = error
+        self.calls = []
+
+    def __call__(self, source_path, decode_backend, decode_process, slots):
+        self.calls.append((source_path, decode_backend, decode_process, slots))
+        if self.error is not None:
+            raise self.error
+        return _FakeSource(self.opened)
+
+
+def test_same_camera_shares_one_source_until_last_release():
+    opener = _FakeOpener()
+    pool = SourcePool(opener=opener)
+    first = pool.acquire("rtsp://CAM1:554/stream/", slots=4)
+    second = pool.acquire("rtsp://cam1/stream", slots=9)    # mesma camera (URL normalizada)
+    assert len(opener.calls) == 1 and opener.calls[0][3] == 4  # anel de quem abriu
+    source = first.source
+    assert second.source is source
+    assert [e["refs"] for e in pool.stats()] == [2]
+
+    first.release()
+    first.release()                                         # release repetido nao desconta de novo
+    assert source.released == 0 and [e["refs"] for e in pool.stats()] == [1]
+    second.release()
+    assert source.released == 1                             # stream fecha com o ultimo assinante
+    assert pool.stats() == []
+
+
+def test_key_is_url_backend_and_process_only():
+    opener = _FakeOpener()
+    pool = SourcePool(opener=opener)
+    # A ROI/politica de cada TC nao entra na chave: a fonte decodifica o frame inteiro
+    assert SourcePool.make_key("rtsp://cam1/s") == (normalize_source("rtsp://cam1/s"), "opencv", False)
+    handles = [pool.acquire("rtsp://cam1/s"), pool.acquire("rtsp://cam1/s", "ffmpeg"),
+               pool.acquire("rtsp://cam1/s", "ffmpeg", True)]
+    assert len(opener.calls) == 3                           # decodificacao diferente: outra conexao
+    for handle in handles:
+        handle.release()
+    assert pool.stats() == []
+
+
+def test_failed_open_leaves_the_pool_for_a_retry():
+    pool = SourcePool(opener=_FakeOpener(opened=False))
+    handle = pool.acquire("rtsp://cam1/s")
+    assert not handle.source.is_opened()
+    assert pool.stats() == []                               # proximo START tenta abrir de novo
+    handle.release()
+
+    pool = SourcePool(opener=_FakeOpener(error=RuntimeError("sem rede")))
+    with pytest.raises(RuntimeError):
+        pool.acquire("rtsp://cam1/s")
+    assert pool.stats() == []
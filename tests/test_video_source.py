@@ -0,0 +1,153 @@
+# tests/test_video_source.py
+"""
+Anel de frames do VideoSource (services/video_source.py) sobre um video sintetico (sem camera).
+
+Rodar na raiz do projeto: python -m pytest tests
+"""
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from services.video_source import VideoSource, ring_slots
+
+
+@pytest.fixture
+def clip(tmp_path, monkeypatch):
+    """Arquivo de 30 frames 64x48, cada um com um tom de cinza diferente."""
+    path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30.0, (64, 48))
+    for i in range(30):
+        writer.write(np.full((48, 64, 3), 8 * i, dtype=np.uint8))
+    writer.release()
+    monkeypatch.setenv("VIDEO_FILE_DELAY_MS", "2")
+    return path
+
+
+def _pins(source):
+    with source.lock:
+        return sum(slot.pins for slot in source._slots)
+
+
+def test_readers_get_increasing_seq_and_ring_never_grows(clip):
+    source = VideoSource(clip, slots=4)
+    fast, slow = source.reader(), source.reader()
+    try:
+        last = {id(fast): 0, id(slow): 0}
+        for i in range(60):
+            for reader in (fast,) if i % 3 else (fast, slow):
+                ok, view, seq, ts = reader.next(timeout=2)
+                assert ok and ts is not None
+                assert seq > last[id(reader)]                   # nunca repete nem volta
+                assert not view.flags.writeable
+                last[id(reader)] = seq
+        assert len(source._slots) == 4
+        assert _pins(source) == 2                               # um slot por leitor, o da ultima entrega
+    finally:
+        fast.close()
+        slow.close()
+        assert _pins(source) == 0
+        source.release()
+
+
+def test_held_view_is_not_overwritten(clip):
+    source = VideoSource(clip, slots=3)
+    holder, other = source.reader(), source.reader()
+    try:
+        ok, held, seq, _ts = holder.next(timeout=2)
+        assert ok
+        expected = held.copy()
+        # O outro leitor consome o arquivo inteiro (e mais) enquanto o primeiro segura a view
+        for _ in range(45):
+            assert other.next(timeout=2)[0]
+        assert np.array_equal(held, expected)
+    finally:
+        holder.close()
+        other.close()
+        source.release()
+
+
+def _wait_seq_above(source, seq, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while source._seq <= seq and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def test_file_waits_when_every_slot_is_held(clip):
+    source = VideoSource(clip, slots=3)
+    readers = [source.reader() for _ in range(3)]
+    try:
+        seqs = []
+        for reader in readers:
+            # Cada leitor segura um frame diferente: os 3 slots ficam presos
+            _wait_seq_above(source, seqs[-1] if seqs else 0)
+            ok, _view, seq, _ts = reader.next(timeout=2)
+            assert ok
+            seqs.append(seq)
+        assert len(set(seqs)) == 3
+        stalled = source._seq
+        time.sleep(0.2)
+        # Sem slot livre a captura de arquivo espera (nao aloca nem descarta)
+        assert source._seq == stalled
+        assert len(source._slots) == 3 and source.ring_dropped == 0
+        # next() devolve o slot antigo do leitor (recebe o mais recente, ja preso): a captura continua
+        assert readers[0].next(timeout=2)[0]
+        _wait_seq_above(source, stalled)
+        assert source._seq > stalled
+    finally:
+        for reader in readers:
+            reader.close()
+        source.release()
+
+
+def _wait_decoded(source, reader, count, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while reader.stats()["decoded"] < count and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def test_todos_queue_on_file_waits_for_consumer(clip):
+    source = VideoSource(clip, slots=ring_slots("todos", 3))
+    reader = source.reader("todos", 3)
+    try:
+        _wait_decoded(source, reader, 3)
+        time.sleep(0.1)
+        # Fila cheia: o arquivo espera o consumidor, nenhum frame e descartado
+        stats = reader.stats()
+        assert (stats["decoded"], stats["queued"], stats["dropped"]) == (3, 3, 0)
+        seqs = [reader.next(timeout=2)[2] for _ in range(10)]
+        assert seqs == list(range(seqs[0], seqs[0] + 10))
+    finally:
+        reader.close()
+        assert _pins(source) == 0
+        source.release()
+
+
+@pytest.mark.parametrize("slots, queue", [(8, 2), (3, 5)])
+def test_todos_queue_on_stream_drops_oldest(clip, slots, queue):
+    source = VideoSource(clip, slots=slots)
+    source.is_file = False                                  # comporta-se como RTSP: nao espera o consumidor
+    reader = source.reader("todos", queue)
+    try:
+        _wait_decoded(source, reader, 10)
+        time.sleep(0.1)                                     # o restante do arquivo (30 frames) e decodificado
+        stats = reader.stats()
+        # Fila limitada pelo parametro ou pelo anel: com o anel cheio a captura ja libera
+        # (descartando o mais antigo da fila) o slot do proximo frame antes de ler
+        queued = min(queue, slots - 1)
+        assert stats["queued"] == queued
+        assert stats["dropped"] == stats["decoded"] - queued
+        assert len(source._slots) == slots and source.ring_dropped == 0
+        seqs = [reader.next(timeout=2)[2] for _ in range(queued)]
+        assert seqs == list(range(source._seq - queued + 1, source._seq + 1))   # os mais recentes, em ordem
+    finally:
+        reader.close()
+        assert _pins(source) == 0
+        source.release()